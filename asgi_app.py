@@ -0,0 +1,770 @@
+"""
+Async (ASGI) serving mode for the memory API.
+
+Serves /remember, /recall-or-search, /query, /context, /delete, /edit, /memory/<id>, /stats, /changes, /health and /metrics with the same JSON
+contracts as the Flask app in main.py, on an event loop backed by psycopg 3's
+async driver and AsyncConnectionPool, so a request waiting on Postgres no
+longer occupies a thread (nor does an open /changes stream). Validation, SQL and serialization are shared with
+main.py; only the I/O differs. /remember/batch, /export and /docs are only served
+by main.py, which is why gunicorn.conf.py launches the Flask app unless SERVER_MODE=asgi.
+
+    uvicorn asgi_app:app --port 10000             # single process
+    SERVER_MODE=asgi gunicorn -c gunicorn.conf.py # multi-worker (see gunicorn.conf.py)
+"""
+
+import asyncio
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from types import SimpleNamespace
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import main
+
+pool = AsyncConnectionPool(
+    main.DATABASE_URL or "",
+    min_size=main.DB_POOL_MIN_SIZE,
+    max_size=main.DB_POOL_MAX_SIZE,
+    timeout=main.DB_POOL_TIMEOUT,
+    max_idle=main.DB_POOL_HEALTHCHECK_IDLE * 10,
+    check=AsyncConnectionPool.check_connection,
+    open=False,
+)
+
+# One pool per READ_REPLICA_URLS entry; main.replica_router decides which serves a read
+replica_pools = {
+    replica.name: AsyncConnectionPool(
+        replica.url,
+        min_size=main.DB_POOL_MIN_SIZE,
+        max_size=main.DB_POOL_MAX_SIZE,
+        timeout=main.DB_POOL_TIMEOUT,
+        max_idle=main.DB_POOL_HEALTHCHECK_IDLE * 10,
+        check=AsyncConnectionPool.check_connection,
+        open=False,
+    )
+    for replica in main.replica_router.replicas
+}
+
+
+def error(message, status):
+    return JSONResponse({"error": message}, status_code=status)
+
+
+def authorized(request):
+    # check_api_key() only needs .headers and .args
+    return main.check_api_key(SimpleNamespace(headers=request.headers, args=request.query_params))
+
+
+def monitoring_authorized(request):
+    return main.check_monitoring_access(SimpleNamespace(headers=request.headers, args=request.query_params))
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def client_key(request):
+    return main.read_client_key(request.headers, request.client.host if request.client else None)
+
+
+@asynccontextmanager
+async def read_connection(request, primary=False):
+    """
+    A connection for read-only queries: a replica in rotation (see
+    main.ReplicaRouter), else the primary, which also covers a replica that
+    fails to hand out a connection.
+    """
+    replica = None if primary else main.replica_router.choose(client_key(request),
+                                                              main.wants_primary_read(request.headers))
+    conn = None
+    if replica is not None:
+        try:
+            conn = await replica_pools[replica.name].getconn()
+        except Exception as e:
+            main.replica_router.mark_down(replica, e)
+    if conn is None:
+        async with pool.connection() as conn:
+            yield conn
+        return
+    request.state.read_replica = replica.name
+    try:
+        yield conn
+    finally:
+        try:
+            await conn.rollback()  # end the read transaction before it goes back to the pool
+        finally:
+            await replica_pools[replica.name].putconn(conn)
+
+
+class ReadRoutingMiddleware:
+    """Pins a client that just wrote to the primary and reports where reads were served (X-Served-By)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not main.replica_router.enabled:
+            await self.app(scope, receive, send)
+            return
+        scope.setdefault("state", {})["read_replica"] = "primary"
+
+        async def send_with_routing(message):
+            if message["type"] == "http.response.start":
+                if message["status"] < 400 and main.is_write_request(scope["method"], scope["path"]):
+                    main.replica_router.note_write(client_key(Request(scope)))
+                served_by = scope["state"]["read_replica"].encode()
+                message["headers"] = [*message.get("headers", []), (b"x-served-by", served_by)]
+            await send(message)
+
+        await self.app(scope, receive, send_with_routing)
+
+
+class MetricsMiddleware:
+    """
+    Records every request in main's histograms and counters, like the Flask
+    app's after_request hook, and adds the opt-in Server-Timing header. Shared
+    code timed with main.timed_phase reports into the request's phases.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        phases = {}
+        token = main.request_phases.set(phases)
+        recorded = False
+
+        def record(status):
+            # At the response start, as in Flask: a /changes stream isn't timed to its end
+            nonlocal recorded
+            recorded = True
+            total = time.perf_counter() - started
+            main.observe_request(ROUTE_LABELS.get(scope.get("endpoint"), "unmatched"), scope["method"],
+                                 status, total, phases)
+            return total
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start" and not recorded:
+                total = record(message["status"])
+                timing = main.server_timing(Headers(scope=scope), total, phases)
+                if timing:
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        except Exception:
+            if not recorded:
+                record(500)
+            raise
+        finally:
+            main.request_phases.reset(token)
+
+
+async def publish_invalidation(cursor, tags):
+    statement = main.cache_invalidation_statement(tags)
+    if statement:
+        await cursor.execute(*statement)
+
+
+###############################################################################
+#                             MEMORY HANDLERS                                  #
+###############################################################################
+
+async def remember(request):
+    """Store a memory with title, details, and multiple categories (see main.remember)."""
+    if not authorized(request):
+        return error("Unauthorized", 403)
+
+    key = request.headers.get("idempotency-key", "").strip()
+    if not key:
+        return await store_memory(request)
+    if len(key) > 255:
+        return error("Idempotency-Key must be at most 255 characters", 400)
+    fingerprint = main.request_fingerprint(request.method, request.url.path, request.query_params.multi_items(),
+                                           await request.body())
+    stored, message = await run_in_threadpool(main.lookup_idempotent_response, key, fingerprint)
+    if message:
+        return error(message, 422)
+    if stored is not None:
+        status, body = stored
+        return Response(body, status_code=status, media_type="application/json",
+                        headers={"Idempotent-Replayed": "true"})
+
+    response = await store_memory(request)
+    if response.status_code < 500:
+        await run_in_threadpool(main.save_idempotent_response, key, fingerprint, response.status_code,
+                                response.body.decode())
+    return response
+
+
+async def store_memory(request):
+    data = await read_json(request)
+    if not data:
+        return error("No JSON data provided", 400)
+
+    memory, message = main.validate_new_memory(data)
+    if message:
+        return error(message, 400)
+    on_duplicate, message = main.parse_duplicate_policy(request.query_params)
+    if message:
+        return error(message, 400)
+    title = memory["title"]
+    categories = memory["categories"]
+
+    timestamp = datetime.now(main.DISPLAY_TZ)
+    if main.WRITE_BUFFER_ENABLED:
+        # The journal fsync blocks, so keep it off the event loop
+        try:
+            memory_id = await run_in_threadpool(main.write_buffer.append, memory, timestamp)
+        except main.WriteBufferUnavailable as e:
+            return JSONResponse({"error": str(e)}, status_code=503, headers={"Retry-After": "5"})
+        return JSONResponse({
+            "message": f"Memory accepted: '{title}'",
+            "id": memory_id,
+            "categories": categories,
+            "status": "queued"
+        }, status_code=202)
+
+    try:
+        with main.timed_phase("query"):
+            async with pool.connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(main.build_insert_query(on_duplicate, main.INSERT_VALUES_TEMPLATE),
+                                         main.insert_query_params([memory], timestamp)[0])
+                    stored = await cursor.fetchone()
+                    tags = main.write_invalidation_tags(categories, stored[3])
+                    await publish_invalidation(cursor, tags)
+    except Exception as e:
+        return error(str(e), 500)
+
+    main.invalidate_cache(tags)
+    if stored[6]:
+        main.record_memory_change("insert", row=stored)
+    elif on_duplicate != "skip":
+        main.record_memory_change("update", row=stored)
+
+    if not stored[6]:
+        return JSONResponse({
+            "message": f"Memory already stored: '{title}'",
+            "id": stored[0],
+            "categories": list(stored[3]),
+            "duplicate": True,
+            "on_duplicate": on_duplicate
+        })
+    return JSONResponse({
+        "message": f"Memory stored: '{title}'",
+        "id": stored[0],
+        "categories": categories,
+        "duplicate": False
+    })
+
+
+async def recall_or_search(request):
+    """Retrieve memories by title, details, or categories (see main.recall_or_search)."""
+    if not authorized(request):
+        return error("Unauthorized", 403)
+
+    spec, message = main.parse_recall_args(request.query_params)
+    if message:
+        return error(message, 400)
+
+    cache_key = spec["cache_key"]
+    if main.CACHE_ENABLED:
+        if main.CACHE_LISTEN:
+            main.cache_listener.start()
+        cached = main.query_cache.get(cache_key)
+        if cached is not None and not main.CACHE_LISTEN:
+            # Without LISTEN other processes' writes never reach this cache: check the store version
+            try:
+                async with pool.connection() as conn:
+                    if (await fetch_store_validators(conn))[0] != cached[2][0]:
+                        cached = None
+            except Exception:
+                cached = None
+        if cached is not None:
+            body, status, validators = cached
+            if main.is_not_modified(request.headers, *validators):
+                return not_modified(validators)
+            return Response(body, status_code=status, media_type="application/json",
+                            headers={"X-Cache": "HIT", **validator_headers(validators)})
+
+    # Read before the query, so a write landing while it runs keeps the result out of the cache
+    generation = main.query_cache.generation
+    try:
+        # Version and rows come from the same server, so the ETag describes the rows
+        with main.timed_phase("query"):
+            async with read_connection(request, primary=spec["mode"] == "semantic") as conn:
+                validators = await fetch_store_validators(conn)
+                if main.is_not_modified(request.headers, *validators):
+                    return not_modified(validators)
+                if spec["mode"] == "semantic":
+                    # The embedding index syncs over the shared psycopg2 pool; keep it off the event loop
+                    columns, rows = await run_in_threadpool(semantic_recall, spec)
+                    total = None
+                else:
+                    columns, rows, total = await fetch_recall_rows(spec, conn)
+        if spec["archive"] != "none":
+            # Archive months are read and decompressed from disk
+            with main.timed_phase("archive"):
+                rows, total = await run_in_threadpool(main.merge_archive_recall, spec, columns, rows, total)
+    except Exception as e:
+        logging.error(f"❌ ERROR in /recall-or-search: {str(e)}")
+        return error(str(e), 500)
+
+    with main.timed_phase("serialize"):
+        body, status = main.render_recall_body(spec, columns, rows, total)
+    response = Response(body, status_code=status, media_type="application/json", headers=validator_headers(validators))
+    # A lagging replica may still miss the latest write, which has already invalidated the cache
+    served_by = getattr(request.state, "read_replica", "primary")
+    if main.CACHE_ENABLED and (served_by == "primary" or main.replica_router.settled()):
+        tags = {f"category:{spec['category']}"} if spec["category"] and not spec["search_term"] else {"all"}
+        if main.query_cache.put(cache_key, (body, status, validators), tags, generation):
+            response.headers["X-Cache"] = "MISS"
+    return response
+
+
+async def fetch_store_validators(conn):
+    """(ETag, Last-Modified) for the current store version; read before the rows they describe."""
+    async with conn.cursor() as cursor:
+        await cursor.execute(main.STORE_VERSION_SQL)
+        return main.store_validators(*await cursor.fetchone())
+
+
+def validator_headers(validators):
+    etag, last_modified = validators
+    return {"ETag": etag, "Last-Modified": last_modified} if last_modified else {"ETag": etag}
+
+
+def not_modified(validators):
+    return Response(status_code=304, headers=validator_headers(validators))
+
+
+def semantic_recall(spec):
+    """Blocking semantic search over a psycopg2 connection (run in a worker thread)."""
+    conn = main.get_db_connection()
+    if not conn:
+        raise RuntimeError("Database connection failed")
+    try:
+        cursor = conn.cursor()
+        columns, rows = main.semantic_recall(cursor, spec)
+        cursor.close()
+        return columns, rows
+    finally:
+        main.release_db_connection(conn)
+
+
+async def fetch_recall_rows(spec, conn):
+    """Run the recall query (and optional count); returns (columns, rows, total)."""
+    sql_json = main.RECALL_SQL_JSON and spec["archive"] == "none"
+    if sql_json:
+        query, params, _ = main.build_recall_json_query(spec)
+    else:
+        query, params, _ = main.build_recall_query(**spec["query"])
+    async with conn.cursor() as cursor:
+        if sql_json:
+            await cursor.execute(main.RECALL_JSON_TIMEZONE_SQL)
+        await cursor.execute(query, params)
+        columns = [column.name for column in cursor.description]
+        rows = await cursor.fetchall()
+
+        total = None
+        if spec["count_mode"]:
+            estimate = spec["count_mode"] == "estimate"
+            await cursor.execute(*main.build_count_query(
+                spec["search_term"], spec["category"], spec["mode"], estimate))
+            total = main.count_from_result(await cursor.fetchone(), estimate)
+    return columns, rows, total
+
+
+async def delete_memories(query, params):
+    """Async counterpart of main.delete_memories; returns the deleted ids."""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(query, params)
+            deleted_rows = await cursor.fetchall()
+            tags = main.write_invalidation_tags(*(row[1] for row in deleted_rows))
+            if deleted_rows:
+                await publish_invalidation(cursor, tags)
+
+    main.invalidate_cache(tags)
+    for row in deleted_rows:
+        main.record_memory_change("delete", memory_id=row[0])
+    return [row[0] for row in deleted_rows]
+
+
+async def update_memories(query, params):
+    """Async counterpart of main.update_memories; returns the updated rows."""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(query, params)
+            updated_rows = await cursor.fetchall()
+            for statement in main.embedding_update_statements(updated_rows):
+                await cursor.execute(*statement)
+            tags = main.write_invalidation_tags(*(row[3] for row in updated_rows),
+                                                *(row[6] for row in updated_rows))
+            if updated_rows:
+                await publish_invalidation(cursor, tags)
+
+    main.invalidate_cache(tags)
+    for row in updated_rows:
+        main.record_memory_change("update", row=row)
+    return updated_rows
+
+
+async def delete_memory(request):
+    """Delete a specific memory by title. If multiple exist, deletes the most recent one."""
+    if not authorized(request):
+        return error("Unauthorized", 403)
+
+    title = request.query_params.get("title")
+    if not title:
+        return error("Missing title", 400)
+
+    try:
+        deleted_ids = await delete_memories(main.DELETE_LATEST_BY_TITLE_SQL, (title,))
+    except Exception as e:
+        return error(str(e), 500)
+
+    if deleted_ids:
+        return JSONResponse({"message": f"Memory deleted: '{title}'", "id": deleted_ids[0]})
+    return error("Memory not found", 404)
+
+
+async def edit_memory(request):
+    """Edit an existing memory (see main.edit_memory for parameters)."""
+    if not authorized(request):
+        return error("Unauthorized", 403)
+
+    original_title = request.query_params.get("original_title")
+    original_timestamp_str = request.query_params.get("original_timestamp")  # optional
+
+    if not original_title:
+        return error("Missing original title to identify the memory", 400)
+
+    if original_timestamp_str:
+        try:
+            datetime.fromisoformat(original_timestamp_str)
+        except ValueError:
+            return error("Invalid original timestamp format", 400)
+
+    update_parts, values, message = main.parse_memory_update(await read_json(request))
+    if message:
+        return error(message, 400)
+
+    if original_timestamp_str:
+        query = main.build_edit_query(update_parts, "title_timestamp")
+        values.extend([original_title, original_timestamp_str])
+        not_found = "Memory not found or no changes made"
+    else:
+        query = main.build_edit_query(update_parts, "title_latest")
+        values.append(original_title)
+        not_found = "Memory not found for the given title"
+
+    try:
+        updated_rows = await update_memories(query, tuple(values))
+    except psycopg.errors.UniqueViolation:
+        return error(main.DUPLICATE_EDIT_ERROR, 409)
+    except Exception as e:
+        return error(str(e), 500)
+    if not updated_rows:
+        return error(not_found, 404)
+
+    return JSONResponse({"message": "Memory updated successfully", "id": updated_rows[0][0]})
+
+
+async def get_memory(request):
+    """Fetch one memory by id."""
+    if not authorized(request):
+        return error("Unauthorized", 403)
+
+    try:
+        async with read_connection(request) as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(main.SELECT_BY_ID_SQL, (request.path_params["memory_id"],))
+                columns = [column.name for column in cursor.description]
+                row = await cursor.fetchone()
+    except Exception as e:
+        return error(str(e), 500)
+
+    if not row:
+        record = await run_in_threadpool(main.memory_archive.get, request.path_params["memory_id"]) \
+            if main.ARCHIVE_ENABLED else None
+        if record is None:
+            return error("Memory not found", 404)
+        memory = main.serialize_memory_row([record[column] for column in main.ARCHIVE_COLUMNS],
+                                           main.ARCHIVE_COLUMNS, main.DISPLAY_TZ)
+        return JSONResponse({**memory, "archived": True})
+    return JSONResponse(main.serialize_memory_row(row, columns, main.DISPLAY_TZ))
+
+
+async def update_memory(request):
+    """Update one memory by id; the JSON body takes the same fields as /edit."""
+    if not authorized(request):
+        return error("Unauthorized", 403)
+
+    memory_id = request.path_params["memory_id"]
+    update_parts, values, message = main.parse_memory_update(await read_json(request))
+    if message:
+        return error(message, 400)
+
+    try:
+        updated_rows = await update_memories(main.build_edit_query(update_parts, "id"), tuple(values) + (memory_id,))
+    except psycopg.errors.UniqueViolation:
+        return error(main.DUPLICATE_EDIT_ERROR, 409)
+    except Exception as e:
+        return error(str(e), 500)
+    if not updated_rows:
+        return error("Memory not found", 404)
+    return JSONResponse({"message": "Memory updated successfully", "id": memory_id})
+
+
+async def delete_memory_by_id(request):
+    """Delete one memory by id."""
+    if not authorized(request):
+        return error("Unauthorized", 403)
+
+    memory_id = request.path_params["memory_id"]
+    try:
+        deleted_ids = await delete_memories(main.DELETE_BY_ID_SQL, (memory_id,))
+    except Exception as e:
+        return error(str(e), 500)
+    if not deleted_ids:
+        return error("Memory not found", 404)
+    return JSONResponse({"message": "Memory deleted", "id": memory_id})
+
+
+async def structured_query(request):
+    """Structured recall with AND-ed criteria, one or many queries per request (see main.structured_query)."""
+    if not authorized(request):
+        return error("Unauthorized", 403)
+
+    specs, batched, message = main.parse_structured_request(await read_json(request))
+    if message:
+        return error(message, 400)
+
+    try:
+        async with read_connection(request) as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(*main.build_structured_batch(specs))
+                columns = [column.name for column in cursor.description]
+                rows = await cursor.fetchall()
+    except Exception as e:
+        logging.error(f"❌ ERROR in /query: {str(e)}")
+        return error(str(e), 500)
+
+    return JSONResponse(main.build_structured_payload(specs, batched, columns, rows))
+
+
+async def context_bundle(request):
+    """Memories for a prompt, packed into a size budget (see main.context_bundle)."""
+    if not authorized(request):
+        return error("Unauthorized", 403)
+
+    spec, message = main.parse_context_args(request.query_params)
+    if message:
+        return error(message, 400)
+
+    try:
+        async with read_connection(request) as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(*main.build_context_query(spec))
+                columns = [column.name for column in cursor.description]
+                rows = await cursor.fetchall()
+    except Exception as e:
+        logging.error(f"❌ ERROR in /context: {str(e)}")
+        return error(str(e), 500)
+
+    return JSONResponse(main.pack_context(spec, columns, rows))
+
+
+async def memory_stats(request):
+    """Per-category counts and histograms from the memory_stats_daily summary."""
+    if not authorized(request):
+        return error("Unauthorized", 403)
+
+    spec, message = main.parse_stats_args(request.query_params)
+    if message:
+        return error(message, 400)
+
+    try:
+        async with read_connection(request) as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(main.STATS_CATEGORY_SQL)
+                category_rows = await cursor.fetchall()
+                await cursor.execute(*main.build_stats_histogram_query(spec))
+                day_rows = await cursor.fetchall()
+    except Exception as e:
+        return error(str(e), 500)
+
+    return JSONResponse(main.build_stats_payload(spec, category_rows, day_rows, main.STATS_TZ))
+
+
+class AsyncChangeSubscription(main.ChangeSubscription):
+    """A ChangeSubscription whose batches are handed from the feed thread to an event loop."""
+
+    def __init__(self, loop, maxsize=main.CHANGES_QUEUE_SIZE):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.lagged = False
+        self.replayed_at = self.position = None
+
+    def push(self, batch):
+        if not self.lagged:
+            self.loop.call_soon_threadsafe(self._put, batch)
+        return not self.lagged
+
+    def _put(self, batch):
+        if batch is None:
+            self.lagged = True
+        try:
+            self.queue.put_nowait(batch)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+
+async def changes_stream(request):
+    """Server-Sent Events stream of memory changes (see main.changes_stream)."""
+    if not authorized(request):
+        return error("Unauthorized", 403)
+
+    since, message = main.parse_changes_since(request.headers, request.query_params)
+    if message:
+        return error(message, 400)
+
+    subscription = AsyncChangeSubscription(asyncio.get_running_loop())
+    main.change_feed.subscribe(subscription)
+    try:
+        events, position, reset = await run_in_threadpool(main.replay_changes, since)
+    except Exception as e:
+        main.change_feed.unsubscribe(subscription)
+        logging.error(f"❌ ERROR in /changes: {str(e)}")
+        return error(str(e), 500)
+    subscription.start(position)
+
+    async def stream():
+        try:
+            for frame in main.changes_preamble(events, position, reset):
+                yield frame
+            while True:
+                try:
+                    batch = await asyncio.wait_for(subscription.queue.get(), main.CHANGES_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    batch = None
+                frames = subscription.frames(batch) if batch else []
+                if subscription.lagged:
+                    return
+                yield "".join(frames) if frames else ": keepalive\n\n"
+        finally:
+            main.change_feed.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=main.CHANGES_STREAM_HEADERS)
+
+
+async def metrics(request):
+    """Prometheus metrics (see main.metrics) plus the async pool's gauges."""
+    if not monitoring_authorized(request):
+        return error("Unauthorized", 403)
+    stats = pool.get_stats()
+    lines = main.render_metrics()
+    lines += main._render_gauges("memory_api_async_db_pool", "Async database pool gauges.", "gauge", "stat",
+                                 {k: stats.get(k, 0) for k in ("pool_size", "pool_available", "pool_max",
+                                                                "requests_waiting")})
+    return Response("\n".join(lines) + "\n", media_type=main.METRICS_CONTENT_TYPE)
+
+
+async def health(request):
+    """Report service health and async pool statistics."""
+    if not monitoring_authorized(request):
+        return error("Unauthorized", 403)
+    return JSONResponse({
+        "status": "ok",
+        "db_pool": pool.get_stats(),
+        "backup": main.backup_worker.stats() if main.BACKUP_ENABLED else None,
+        "cache": main.query_cache.stats() if main.CACHE_ENABLED else None,
+        "write_buffer": main.write_buffer.stats() if main.WRITE_BUFFER_ENABLED else None,
+        "archive": main.memory_archive.stats() if main.ARCHIVE_ENABLED else None,
+        "changes": main.change_feed.stats(),
+        "replicas": main.replica_router.stats() if main.replica_router.enabled else None
+    })
+
+
+###############################################################################
+#                             APP SETUP                                        #
+###############################################################################
+
+@asynccontextmanager
+async def lifespan(app):
+    if not main.POSTGRES_BACKEND:
+        raise RuntimeError("The ASGI app needs STORAGE_BACKEND=postgres; serve other backends with main.py")
+    await pool.open()
+    for replica_pool in replica_pools.values():
+        await replica_pool.open(wait=False)
+    if main.WRITE_BUFFER_ENABLED:
+        main.write_buffer.start()  # replays any journal left by a previous run
+    main.change_feed.start()
+    main.log_startup_ready()
+    yield
+    for replica_pool in replica_pools.values():
+        await replica_pool.close()
+    await pool.close()
+
+
+app = Starlette(
+    routes=[
+        Route("/remember", remember, methods=["POST"]),
+        Route("/recall-or-search", recall_or_search, methods=["GET"]),
+        Route("/delete", delete_memory, methods=["DELETE"]),
+        Route("/edit", edit_memory, methods=["PUT"]),
+        Route("/memory/{memory_id:int}", get_memory, methods=["GET"]),
+        Route("/memory/{memory_id:int}", update_memory, methods=["PUT"]),
+        Route("/memory/{memory_id:int}", delete_memory_by_id, methods=["DELETE"]),
+        Route("/query", structured_query, methods=["POST"]),
+        Route("/context", context_bundle, methods=["GET"]),
+        Route("/stats", memory_stats, methods=["GET"]),
+        Route("/changes", changes_stream, methods=["GET"]),
+        Route("/health", health, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ],
+    middleware=[
+        *([Middleware(MetricsMiddleware)] if main.METRICS_ENABLED else []),
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+        Middleware(ReadRoutingMiddleware),
+        *([Middleware(GZipMiddleware, minimum_size=main.COMPRESS_MIN_SIZE)] if main.COMPRESS_ENABLED else []),
+    ],
+    lifespan=lifespan,
+)
+
+# Metric route labels as the Flask app names its rules, so both modes share series
+ROUTE_LABELS = {route.endpoint: re.sub(r"\{(\w+):int\}", r"<int:\1>", route.path) for route in app.routes}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    try:
+        main.safe_init_db()
+    except main.MigrationError as e:
+        logging.error(f"❌ {e}")
+        raise SystemExit(1)
+    uvicorn.run(app, host="0.0.0.0", port=10000)
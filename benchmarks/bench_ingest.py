@@ -0,0 +1,68 @@
+"""
+Compare ingest throughput (memories/sec) of /remember vs /remember/batch.
+
+Usage:
+    DATABASE_URL=postgres://.../bench_db API_KEY=bench python benchmarks/bench_ingest.py \
+        [--memories 5000] [--batch-sizes 100 1000 5000] [--concurrency 1]
+
+WARNING: the memory table in DATABASE_URL is truncated before each run.
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+from common import WORDS, print_table, reset_memories, run_concurrent
+
+os.environ.setdefault("API_KEY", "bench")
+
+import main  # noqa: E402
+
+
+def synthetic_memory(rng):
+    categories = main.MemoryCategory.get_values()
+    return {
+        "title": " ".join(rng.choices(WORDS, k=4)),
+        "details": " ".join(rng.choices(WORDS, k=rng.randint(10, 120))),
+        "categories": rng.sample(categories, k=rng.randint(1, 2)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--memories", type=int, default=5000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    main.safe_init_db()
+    client = main.app.test_client()
+    headers = {"X-API-KEY": main.API_KEY}
+    rng = random.Random(42)
+    memories = [synthetic_memory(rng) for _ in range(args.memories)]
+    rows = []
+
+    conn = main.get_db_connection()
+    reset_memories(conn)
+    pending = iter(memories)
+    latencies, elapsed = run_concurrent(lambda: client.post("/remember", json=next(pending), headers=headers),
+                                        args.memories, args.concurrency)
+    rows.append({"endpoint": "/remember", "batch_size": 1, "memories": args.memories,
+                 "seconds": round(elapsed, 2), "memories_per_sec": round(args.memories / elapsed, 1)})
+
+    for size in args.batch_sizes:
+        reset_memories(conn)
+        started = time.perf_counter()
+        for start in range(0, args.memories, size):
+            response = client.post("/remember/batch", data=json.dumps(memories[start:start + size]),
+                                   content_type="application/json", headers=headers)
+            assert response.status_code == 200, response.get_json()
+        elapsed = time.perf_counter() - started
+        rows.append({"endpoint": "/remember/batch", "batch_size": size, "memories": args.memories,
+                     "seconds": round(elapsed, 2), "memories_per_sec": round(args.memories / elapsed, 1)})
+
+    main.release_db_connection(conn)
+    main.backup_worker.flush(30)
+    print_table(rows, ["endpoint", "batch_size", "memories", "seconds", "memories_per_sec"])
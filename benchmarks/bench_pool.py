@@ -0,0 +1,50 @@
+"""
+Compare /recall-or-search latency with and without the connection pool.
+
+Usage:
+    DATABASE_URL=postgres://... API_KEY=bench python benchmarks/bench_pool.py [--requests 2000] [--concurrency 8]
+
+The Flask app is driven in-process through its test client so the numbers
+isolate handler + database cost from HTTP server overhead.
+"""
+
+import argparse
+import os
+
+from common import run_concurrent, summarize, print_table
+
+os.environ.setdefault("API_KEY", "bench")
+# Measure the database path; every repeat of a URL would otherwise be a cache hit
+os.environ["CACHE_ENABLED"] = "false"
+
+import main  # noqa: E402
+
+
+def bench(pooled, requests, concurrency):
+    main.DB_POOL_ENABLED = pooled
+    client = main.app.test_client()
+    headers = {"X-API-KEY": main.API_KEY}
+
+    def call():
+        client.get("/recall-or-search", headers=headers)
+
+    # Warm up (fills the pool / primes the server-side caches)
+    for _ in range(min(50, requests)):
+        call()
+    latencies, elapsed = run_concurrent(call, requests, concurrency)
+    result = summarize(latencies, elapsed)
+    result["mode"] = "pooled" if pooled else "connect-per-request"
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    main.safe_init_db()
+    rows = [bench(False, args.requests, args.concurrency), bench(True, args.requests, args.concurrency)]
+    print_table(rows, ["mode", "requests", "throughput_rps", "p50_ms", "p99_ms"])
+    if main._db_pool:
+        print("pool stats:", main.get_db_pool().stats())
@@ -0,0 +1,71 @@
+"""
+Benchmark /recall-or-search search modes over a synthetic memory table.
+
+Usage:
+    DATABASE_URL=postgres://.../bench_db API_KEY=bench python benchmarks/bench_search.py \
+        [--sizes 100000 1000000] [--requests 200] [--concurrency 4]
+
+WARNING: the memory table in DATABASE_URL is truncated and reseeded for every size.
+"""
+
+import argparse
+import os
+
+from common import run_concurrent, summarize, print_table, seed_memories, reset_memories
+
+os.environ.setdefault("API_KEY", "bench")
+os.environ.setdefault("BACKUP_ENABLED", "false")
+# Measure the database path; every repeat of a URL would otherwise be a cache hit
+os.environ["CACHE_ENABLED"] = "false"
+
+import main  # noqa: E402
+
+# (label, query string) pairs: common word, rare word, multi-word phrase, misspelling
+SEARCHES = [
+    ("common", "search=coffee"),
+    ("rare", "search=quasar"),
+    ("phrase", "search=hiking%20weekend"),
+    ("typo", "search=marathn"),
+]
+
+
+def explain(conn, mode, term):
+    query, params, _ = main.build_recall_query(term, "", mode, limit=main.DEFAULT_PAGE_SIZE)
+    cursor = conn.cursor()
+    cursor.execute("EXPLAIN (ANALYZE, FORMAT TEXT) " + query, params)
+    plan = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return plan[0].strip(), plan[-1].strip()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    main.safe_init_db()
+    client = main.app.test_client()
+    headers = {"X-API-KEY": main.API_KEY}
+
+    for size in args.sizes:
+        conn = main.get_db_connection()
+        reset_memories(conn)
+        seed_memories(conn, size)
+
+        rows = []
+        for mode in main.SEARCH_MODES:
+            for label, qs in SEARCHES:
+                url = f"/recall-or-search?mode={mode}&{qs}"
+                latencies, elapsed = run_concurrent(lambda: client.get(url, headers=headers),
+                                                    args.requests, args.concurrency)
+                result = summarize(latencies, elapsed)
+                result.update({"size": size, "mode": mode, "search": label})
+                rows.append(result)
+        print_table(rows, ["size", "mode", "search", "requests", "p50_ms", "p99_ms", "throughput_rps"])
+
+        for mode in main.SEARCH_MODES:
+            top, timing = explain(conn, mode, "quasar")
+            print(f"  plan[{mode}]: {top} | {timing}")
+        main.release_db_connection(conn)
@@ -0,0 +1,100 @@
+"""
+Semantic recall latency: brute-force EmbeddingIndex vs an approximate IVF index.
+
+Usage:
+    python benchmarks/bench_semantic.py [--size 100000] [--queries 500] [--nlist 316] [--nprobe 8 16 32]
+
+Runs entirely in memory (no database needed): synthetic memories are embedded
+with the configured embedder, loaded into main.EmbeddingIndex, and the same
+queries are answered exactly and by a k-means inverted-file (IVF) index. Reports
+per-query latency and the IVF's recall@k against the exact results.
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from common import WORDS, percentile, print_table
+
+import main  # noqa: E402
+
+
+class IVFIndex:
+    """Inverted-file index: k-means coarse centroids, search only the nprobe nearest lists."""
+
+    def __init__(self, vectors, ids, nlist, iterations=10, seed=0):
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(len(vectors), size=min(len(vectors), nlist * 40), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        self.centroids = centroids
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        self.lists = [(vectors[assignment == c], ids[assignment == c]) for c in range(nlist)]
+
+    def search(self, query, k, nprobe):
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        vectors = np.vstack([self.lists[c][0] for c in probes])
+        ids = np.concatenate([self.lists[c][1] for c in probes])
+        scores = vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return ids[top].tolist(), scores[top].tolist()
+
+
+def timed(fn, queries):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(fn(query))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=316)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32])
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    embedder = main.get_embedder()
+    texts = [" ".join(rng.choices(WORDS, k=rng.randint(10, 60))) for _ in range(args.size)]
+
+    started = time.perf_counter()
+    vectors = np.vstack([embedder.embed(texts[i:i + 5000]) for i in range(0, len(texts), 5000)])
+    print(f"embedded {args.size} memories with {embedder.name} in {time.perf_counter() - started:.1f}s")
+
+    ids = np.arange(1, args.size + 1, dtype=np.int64)
+    index = main.EmbeddingIndex(embedder.dim)
+    index.upsert(ids.tolist(), vectors, [1] * args.size)
+    queries = embedder.embed([" ".join(rng.choices(WORDS, k=3)) for _ in range(args.queries)])
+
+    rows = []
+    exact_latencies, exact = timed(lambda q: index.search(q, args.k), queries)
+    rows.append({"index": "brute-force", "recall_at_k": 1.0,
+                 "p50_ms": round(percentile(exact_latencies, 50) * 1000, 3),
+                 "p99_ms": round(percentile(exact_latencies, 99) * 1000, 3)})
+
+    started = time.perf_counter()
+    ivf = IVFIndex(vectors, ids, args.nlist)
+    print(f"built IVF (nlist={args.nlist}) in {time.perf_counter() - started:.1f}s")
+    for nprobe in args.nprobe:
+        latencies, approx = timed(lambda q: ivf.search(q, args.k, nprobe), queries)
+        recall = np.mean([len(set(a[0]) & set(e[0])) / max(len(e[0]), 1) for a, e in zip(approx, exact)])
+        rows.append({"index": f"ivf nprobe={nprobe}", "recall_at_k": round(float(recall), 3),
+                     "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+                     "p99_ms": round(percentile(latencies, 99) * 1000, 3)})
+
+    print_table(rows, ["index", "recall_at_k", "p50_ms", "p99_ms"])
@@ -0,0 +1,130 @@
+"""
+Recall serialization throughput: rows/sec turned into a response body.
+
+Usage:
+    python benchmarks/bench_serialize.py [--rows 200] [--rounds 500]
+    DATABASE_URL=postgres://... python benchmarks/bench_serialize.py --database [--limit 200]
+
+Without --database, runs in memory on synthetic rows shaped like psycopg2's
+(details as a dict, categories as '{a,b}' text, UTC datetimes) and compares:
+
+  - python:   serialize_memory_row per row + json.dumps (the stdlib encoder)
+  - orjson:   the same rows through dumps_json with orjson (when installed)
+  - sql_json: render_recall_body splicing JSON text that Postgres already built
+
+With --database, fetches a recall page both ways from the memory table and
+reports end-to-end fetch + serialize time per page.
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from common import WORDS, print_table
+
+os.environ.setdefault("API_KEY", "bench")
+os.environ.setdefault("BACKUP_ENABLED", "false")
+
+import main  # noqa: E402
+
+COLUMNS = ["id", "title", "details", "categories", "timestamp"]
+
+
+def synthetic_rows(count, seed=0):
+    """(rows, memory_json rows) for the same synthetic memories."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows, json_rows = [], []
+    for memory_id in range(count, 0, -1):
+        categories = rng.sample(main.CATEGORY_VALUES, rng.randint(1, 3))
+        row = (
+            memory_id,
+            " ".join(rng.choices(WORDS, k=4)),
+            {"text": " ".join(rng.choices(WORDS, k=rng.randint(10, 80)))},
+            "{" + ",".join(categories) + "}",
+            start + timedelta(minutes=memory_id),
+        )
+        rows.append(row)
+        memory = main.serialize_memory_row(row, COLUMNS)
+        json_rows.append((row[4], row[0], json.dumps(memory, sort_keys=True)))
+    return rows, json_rows
+
+
+def measure(label, render, rows, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        body = render()
+    elapsed = time.perf_counter() - started
+    return {
+        "path": label,
+        "rows_per_sec": round(rows * rounds / elapsed),
+        "us_per_page": round(elapsed / rounds * 1e6, 1),
+        "body_kb": round(len(body) / 1024, 1),
+    }
+
+
+def bench_in_memory(count, rounds):
+    spec, _ = main.parse_recall_args({"limit": str(count)})
+    spec["limit"] = count
+    rows, json_rows = synthetic_rows(count)
+    json_columns = ["timestamp", "id", "memory_json"]
+
+    def python_path():
+        payload, _ = main.build_recall_payload(spec, COLUMNS, rows)
+        return json.dumps(payload, separators=(",", ":"), sort_keys=True).encode()
+
+    results = [measure("python", python_path, count, rounds)]
+    if main.orjson is not None:
+        results.append(measure("orjson", lambda: main.render_recall_body(spec, COLUMNS, rows)[0], count, rounds))
+    results.append(measure("sql_json", lambda: main.render_recall_body(spec, json_columns, json_rows)[0],
+                           count, rounds))
+    return results
+
+
+def bench_database(limit, rounds):
+    spec, error = main.parse_recall_args({"limit": str(limit)})
+    if error:
+        raise SystemExit(error)
+    conn = main.get_db_connection()
+    cursor = conn.cursor()
+    results = []
+    for label, sql_json in (("python", False), ("sql_json", True)):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            if sql_json:
+                cursor.execute(main.RECALL_JSON_TIMEZONE_SQL)
+                query, params, _ = main.build_recall_json_query(spec)
+            else:
+                query, params, _ = main.build_recall_query(**spec["query"])
+            cursor.execute(query, params)
+            columns = [column.name for column in cursor.description]
+            body, _ = main.render_recall_body(spec, columns, cursor.fetchall())
+            conn.rollback()
+        elapsed = time.perf_counter() - started
+        results.append({
+            "path": label,
+            "rows_per_sec": round(limit * rounds / elapsed),
+            "us_per_page": round(elapsed / rounds * 1e6, 1),
+            "body_kb": round(len(body) / 1024, 1),
+        })
+    cursor.close()
+    main.release_db_connection(conn)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200, help="rows per page (in-memory mode)")
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--database", action="store_true", help="fetch real pages from DATABASE_URL")
+    parser.add_argument("--limit", type=int, default=main.MAX_PAGE_SIZE, help="page size (--database mode)")
+    args = parser.parse_args()
+
+    if args.database:
+        rows = bench_database(args.limit, args.rounds)
+    else:
+        rows = bench_in_memory(args.rows, args.rounds)
+    print_table(rows, ["path", "rows_per_sec", "us_per_page", "body_kb"])
@@ -0,0 +1,85 @@
+"""
+Measure cold-start time of the memory API: a fresh interpreter importing main
+and, with --init, running safe_init_db() against DATABASE_URL (the "schema is
+current" fast path after the first run).
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10] [--init] [--target 1.0]
+
+Exits non-zero when the median exceeds --target seconds (default
+STARTUP_TARGET_SECONDS or 1.0), so it can gate CI or a deploy.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from common import print_table, summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+if {init}:
+    main.safe_init_db()
+print(imported - started, time.perf_counter() - imported)
+"""
+
+
+def cold_start(init):
+    """Run one fresh interpreter; returns (wall, import, init) seconds."""
+    env = dict(os.environ, LOG_LEVEL="WARNING", BACKUP_ENABLED="false")
+    env.setdefault("API_KEY", "bench")
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", PROBE.format(init=init)], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    wall = time.perf_counter() - started
+    import_seconds, init_seconds = (float(value) for value in output.split()[-2:])
+    return wall, import_seconds, init_seconds
+
+
+def slowest_imports(count=10):
+    """Top cumulative import times of `import main`, from python -X importtime."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT,
+                            env=dict(os.environ, API_KEY="bench"), capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        parts = line.split("|")
+        # Direct imports of main only; nested modules are indented further
+        if len(parts) == 3 and parts[1].strip().isdigit() and parts[2].startswith("   ") \
+                and not parts[2].startswith("     "):
+            rows.append({"module": parts[2].strip(), "cumulative_ms": round(int(parts[1]) / 1000, 1)})
+    return sorted(rows, key=lambda row: -row["cumulative_ms"])[:count]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--init", action="store_true", help="also run safe_init_db() (needs DATABASE_URL)")
+    parser.add_argument("--target", type=float, default=float(os.getenv("STARTUP_TARGET_SECONDS", "1.0")))
+    args = parser.parse_args()
+
+    cold_start(args.init)  # warm the OS file cache and, with --init, apply any pending migrations
+    samples = [cold_start(args.init) for _ in range(args.runs)]
+
+    rows = []
+    for index, label in enumerate(("process_wall", "import_main", "safe_init_db")):
+        if label == "safe_init_db" and not args.init:
+            continue
+        result = summarize([sample[index] for sample in samples], 0)
+        result["phase"] = label
+        rows.append(result)
+    print_table(rows, ["phase", "requests", "mean_ms", "p50_ms", "p95_ms"])
+
+    print("\nSlowest top-level imports:")
+    print_table(slowest_imports(), ["module", "cumulative_ms"])
+
+    ready = sorted(sample[1] + sample[2] for sample in samples)[len(samples) // 2]
+    verdict = "within" if ready <= args.target else "OVER"
+    print(f"\nMedian time to ready (import + init): {ready * 1000:.0f}ms, {verdict} the {args.target * 1000:.0f}ms target")
+    sys.exit(0 if ready <= args.target else 1)
@@ -0,0 +1,144 @@
+"""
+Shared helpers for the benchmark scripts in this directory.
+
+Every benchmark talks to a real PostgreSQL instance pointed to by DATABASE_URL
+(a local throwaway database is strongly recommended).
+"""
+
+import os
+import sys
+import time
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+# Allow `python benchmarks/<script>.py` from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile (0-100) of samples using nearest-rank."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies, elapsed):
+    """Summarize a list of per-call latencies (seconds) into a dict in milliseconds."""
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3) if latencies else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+    }
+
+
+def run_concurrent(call, requests, concurrency):
+    """Invoke call() `requests` times across `concurrency` threads; return (latencies, elapsed)."""
+    def timed(_):
+        start = time.perf_counter()
+        call()
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, range(requests)))
+    return latencies, time.perf_counter() - started
+
+
+def print_table(rows, columns):
+    """Print a list of dicts as a fixed-width table."""
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(widths[c]) for c in columns))
+
+
+# Vocabulary for synthetic memories; a few rare words make selective searches possible.
+WORDS = (
+    "army deployment sergeant office career promotion ethics therapy journal anxiety "
+    "growth habit meditation travel flight passport hiking camping roadtrip guitar "
+    "painting chess gym marathon project dating breakup anniversary attraction mom "
+    "dad sister brother friend party childhood school grandma hometown infobuddy "
+    "memory continuity friendship python database feature roadmap deploy postgres "
+    "coffee weekend dinner movie book music rain winter summer ocean mountain city "
+    "zephyr quasar obsidian"
+).split()
+
+
+# Relative category frequencies (MemoryCategory order), roughly matching real usage
+CATEGORY_WEIGHTS = {
+    "work_and_military": 0.14,
+    "personal_growth": 0.16,
+    "adventure_and_travel": 0.08,
+    "hobbies_and_interests": 0.12,
+    "romantic_relationships": 0.07,
+    "friends_and_family": 0.12,
+    "upbringing_and_lore": 0.06,
+    "infobuddy_relationship": 0.07,
+    "infobuddy_technical": 0.10,
+    "miscellaneous": 0.08,
+}
+
+
+def seed_memories(conn, count, batch=50000, seed=0.42):
+    """
+    Insert `count` synthetic memories server-side with generate_series.
+
+    Titles are 3-6 words drawn from WORDS; details are 10-610 words with a long
+    tail (most memories are short, a few are essays). Categories follow
+    CATEGORY_WEIGHTS and ~30% of memories get a second one. Timestamps are
+    spread over ~3 years. Postgres' random() is seeded so runs are repeatable.
+    """
+    words_sql = "ARRAY[" + ",".join(f"'{w}'" for w in WORDS) + "]"
+    # Lower bounds of each category's slice of [0, 1), for width_bucket()
+    bounds, total = [], 0.0
+    for weight in CATEGORY_WEIGHTS.values():
+        bounds.append(round(total, 6))
+        total += weight
+    bounds_sql = "ARRAY[" + ",".join(str(b) for b in bounds) + "]::float8[]"
+    category_sql = "ARRAY[" + ",".join(f"'{c}'" for c in CATEGORY_WEIGHTS) + "]::memory_category[]"
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT setseed(%s)", (seed,))
+    done = 0
+    while done < count:
+        n = min(batch, count - done)
+        cursor.execute(f"""
+            WITH vocab AS (SELECT {words_sql} AS w)
+            INSERT INTO memory (title, details, categories, timestamp)
+            SELECT
+                (SELECT string_agg(w[1 + floor(random() * array_length(w, 1))::int], ' ')
+                   FROM vocab, generate_series(1, 3 + (g %% 4))),
+                jsonb_build_object('text',
+                    (SELECT string_agg(w[1 + floor(random() * array_length(w, 1))::int], ' ')
+                       FROM vocab, generate_series(1, pick.words))),
+                CASE WHEN pick.second AND pick.a <> pick.b
+                     THEN ARRAY[({category_sql})[pick.a], ({category_sql})[pick.b]]
+                     ELSE ARRAY[({category_sql})[pick.a]] END,
+                now() - (random() * interval '1095 days')
+            FROM generate_series(%s, %s) AS g,
+            LATERAL (
+                -- Referencing g keeps these per-row instead of evaluated once
+                SELECT width_bucket(random() + g * 0, {bounds_sql}) AS a,
+                       width_bucket(random() + g * 0, {bounds_sql}) AS b,
+                       random() + g * 0 < 0.3 AS second,
+                       10 + floor(power(random(), 3) * 600)::int + g * 0 AS words
+            ) AS pick
+        """, (done + 1, done + n))
+        conn.commit()
+        done += n
+    cursor.execute("ANALYZE memory")
+    conn.commit()
+    cursor.close()
+
+
+def reset_memories(conn):
+    """Remove every memory (benchmark databases only!)."""
+    cursor = conn.cursor()
+    cursor.execute("TRUNCATE memory RESTART IDENTITY")
+    conn.commit()
+    cursor.close()
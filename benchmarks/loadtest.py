@@ -0,0 +1,101 @@
+"""
+HTTP load test comparing serving modes of the memory API.
+
+Start the servers to compare against the same (local) Postgres, e.g.
+
+    python main.py                                              # Flask dev server on :10000
+    PORT=10001 gunicorn -c gunicorn.conf.py
+    SERVER_MODE=asgi PORT=10002 gunicorn -c gunicorn.conf.py
+
+then drive them with an identical workload:
+
+    API_KEY=... python benchmarks/loadtest.py http://localhost:10000 http://localhost:10002 \
+        [--duration 30] [--concurrency 64] [--write-ratio 0.1]
+
+Each client thread keeps one persistent HTTP connection. Reads are a mix of
+recent, category and search calls to /recall-or-search; writes go to /remember.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse, quote
+
+from common import WORDS, print_table, summarize
+
+API_KEY = os.getenv("API_KEY", "bench")
+CATEGORIES = [
+    "work_and_military", "personal_growth", "adventure_and_travel", "hobbies_and_interests",
+    "romantic_relationships", "friends_and_family", "upbringing_and_lore",
+    "infobuddy_relationship", "infobuddy_technical", "miscellaneous",
+]
+
+
+def next_request(rng, write_ratio):
+    if rng.random() < write_ratio:
+        body = json.dumps({
+            "title": " ".join(rng.choices(WORDS, k=4)),
+            "details": " ".join(rng.choices(WORDS, k=30)),
+            "categories": [rng.choice(CATEGORIES)],
+        })
+        return "POST", "/remember", body
+    kind = rng.random()
+    if kind < 0.5:
+        return "GET", "/recall-or-search", None
+    if kind < 0.8:
+        return "GET", f"/recall-or-search?category={rng.choice(CATEGORIES)}", None
+    return "GET", f"/recall-or-search?search={quote(rng.choice(WORDS))}", None
+
+
+def client_loop(target, deadline, write_ratio, seed, latencies, errors):
+    url = urlparse(target)
+    rng = random.Random(seed)
+    headers = {"X-API-KEY": API_KEY, "Content-Type": "application/json"}
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    while time.monotonic() < deadline:
+        method, path, body = next_request(rng, write_ratio)
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def run(target, duration, concurrency, write_ratio):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=client_loop, args=(target, deadline, write_ratio, i, latencies, errors))
+               for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = summarize(latencies, time.perf_counter() - started)
+    result.update({"target": target, "errors": len(errors)})
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="+", help="Base URLs of running servers")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+
+    rows = [run(target, args.duration, args.concurrency, args.write_ratio) for target in args.targets]
+    print_table(rows, ["target", "requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms"])
@@ -0,0 +1,296 @@
+"""
+Reproducible end-to-end benchmark suite for the memory API.
+
+For every dataset size the memory table is truncated and reseeded (see
+common.seed_memories: weighted categories, long-tail details, fixed seed), then
+each scenario below is driven by concurrent clients. Throughput, p50/p95/p99
+latency, error counts and EXPLAIN plans of the recall queries are written to a
+JSON results file so runs can be diffed over time.
+
+Usage:
+    DATABASE_URL=postgres://.../bench_db python benchmarks/run_suite.py \
+        [--sizes 1000 100000 1000000] [--requests 500] [--concurrency 8] \
+        [--url http://localhost:10000] [--with-cache] [--compare benchmarks/results/<old>.json]
+
+By default requests go through Flask's in-process test client, which measures
+the application and database without HTTP overhead. Pass --url to drive a
+running server instead (it must use the same DATABASE_URL, which is still used
+for seeding and plans).
+
+WARNING: the memory table in DATABASE_URL is truncated and reseeded for every size.
+"""
+
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+from urllib.parse import quote, urlparse
+
+from common import CATEGORY_WEIGHTS, WORDS, print_table, reset_memories, run_concurrent, seed_memories, summarize
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+CATEGORIES = list(CATEGORY_WEIGHTS)
+
+
+class InProcessClient:
+    """Issue requests through the Flask test client."""
+
+    def __init__(self, app, api_key):
+        self.client = app.test_client()
+        self.headers = {"X-API-KEY": api_key}
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, headers=self.headers, json=body)
+        return response.status_code
+
+
+class HttpClient:
+    """Issue requests to a live server, one persistent connection per thread."""
+
+    def __init__(self, base_url, api_key):
+        self.url = urlparse(base_url)
+        self.headers = {"X-API-KEY": api_key, "Content-Type": "application/json"}
+        self.local = threading.local()
+
+    def request(self, method, path, body=None):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=60)
+        try:
+            conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=self.headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self.local.conn = None
+            return 599
+
+
+def random_memory(rng):
+    return {
+        "title": " ".join(rng.choices(WORDS, k=rng.randint(3, 6))),
+        "details": " ".join(rng.choices(WORDS, k=10 + int(rng.random() ** 3 * 600))),
+        "categories": rng.choices(CATEGORIES, weights=list(CATEGORY_WEIGHTS.values()), k=1),
+    }
+
+
+def build_scenarios(id_range, semantic):
+    """
+    Return (name, request factory) pairs; each factory takes an rng and returns
+    (method, path, json body). Reads come first so writes don't skew them.
+    """
+    low, high = id_range
+    deletable = list(range(high, low - 1, -1))
+    delete_lock = threading.Lock()
+
+    def next_deletable(_rng):
+        with delete_lock:
+            memory_id = deletable.pop() if deletable else high
+        return "DELETE", f"/memory/{memory_id}", None
+
+    scenarios = [
+        ("recall_recent", lambda rng: ("GET", "/recall-or-search", None)),
+        ("recall_category", lambda rng: ("GET", f"/recall-or-search?category={rng.choice(CATEGORIES)}", None)),
+        ("recall_limit_count", lambda rng: ("GET", f"/recall-or-search?limit={rng.choice([50, 200])}&count=estimate", None)),
+        ("search_substring", lambda rng: ("GET", f"/recall-or-search?search={quote(rng.choice(WORDS))}", None)),
+        ("search_fulltext", lambda rng: ("GET", f"/recall-or-search?mode=fulltext&search={quote(rng.choice(WORDS))}", None)),
+        ("search_fuzzy", lambda rng: ("GET", f"/recall-or-search?mode=fuzzy&search={quote(rng.choice(WORDS)[:-1])}", None)),
+    ]
+    if semantic:
+        scenarios.append(("search_semantic", lambda rng: (
+            "GET", f"/recall-or-search?mode=semantic&search={quote(' '.join(rng.choices(WORDS, k=3)))}", None)))
+    scenarios += [
+        ("get_by_id", lambda rng: ("GET", f"/memory/{rng.randint(low, high)}", None)),
+        ("stats", lambda rng: ("GET", "/stats", None)),
+        ("query_batch_3", lambda rng: ("POST", "/query", {"queries": [
+            {"categories_any": rng.sample(CATEGORIES, 2), "limit": 20},
+            {"categories_all": [rng.choice(CATEGORIES)], "text": rng.choice(WORDS), "mode": "fulltext"},
+            {"since": "2025-01-01T00:00:00+00:00", "sort": "oldest", "fields": ["id", "title", "timestamp"]},
+        ]})),
+        ("remember", lambda rng: ("POST", "/remember", random_memory(rng))),
+        ("remember_batch_50", lambda rng: ("POST", "/remember/batch", [random_memory(rng) for _ in range(50)])),
+        ("edit_by_id", lambda rng: ("PUT", f"/memory/{rng.randint(low, high)}",
+                                    {"details": " ".join(rng.choices(WORDS, k=20))})),
+        ("delete_by_id", next_deletable),
+    ]
+    return scenarios
+
+
+def run_scenario(client, factory, requests, concurrency, seed):
+    """Drive one scenario; each worker thread gets its own deterministic rng."""
+    local = threading.local()
+    counter = iter(range(concurrency * 1000))
+    counter_lock = threading.Lock()
+    statuses = {}
+    status_lock = threading.Lock()
+
+    def call():
+        rng = getattr(local, "rng", None)
+        if rng is None:
+            with counter_lock:
+                rng = local.rng = random.Random(seed * 1000 + next(counter))
+        status = client.request(*factory(rng))
+        with status_lock:
+            statuses[status] = statuses.get(status, 0) + 1
+
+    latencies, elapsed = run_concurrent(call, requests, concurrency)
+    result = summarize(latencies, elapsed)
+    result["errors"] = sum(count for status, count in statuses.items() if status >= 400 and status != 404)
+    result["statuses"] = {str(status): count for status, count in sorted(statuses.items())}
+    return result
+
+
+def explain_recall_queries(main, conn):
+    """EXPLAIN (ANALYZE, BUFFERS) the SQL behind the main recall shapes."""
+    shapes = {
+        "recent": ("", "", "substring"),
+        "category": ("", "upbringing_and_lore", "substring"),
+        "substring_rare": ("quasar", "", "substring"),
+        "fulltext_common": ("coffee", "", "fulltext"),
+        "fuzzy_typo": ("marathn", "", "fuzzy"),
+    }
+    plans = {}
+    cursor = conn.cursor()
+    for name, (term, category, mode) in shapes.items():
+        query, params, _ = main.build_recall_query(term, category, mode, limit=main.DEFAULT_PAGE_SIZE)
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+        plan = cursor.fetchone()[0][0]
+        plans[name] = {
+            "execution_ms": plan.get("Execution Time"),
+            "planning_ms": plan.get("Planning Time"),
+            "top_node": plan["Plan"]["Node Type"],
+            "plan": plan["Plan"],
+        }
+    conn.rollback()
+    cursor.close()
+    return plans
+
+
+def run_metadata(main, conn, args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(RESULTS_DIR), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    cursor = conn.cursor()
+    cursor.execute("SHOW server_version")
+    server_version = cursor.fetchone()[0]
+    cursor.close()
+    return {
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_commit": commit,
+        "postgres_version": server_version,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "target": args.url or "in-process",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "config": {
+            "db_pool_enabled": main.DB_POOL_ENABLED,
+            "db_pool_max_size": main.DB_POOL_MAX_SIZE,
+            "cache_enabled": main.CACHE_ENABLED,
+            "embeddings_enabled": main.EMBEDDINGS_ENABLED,
+            "embedding_model": main.EMBEDDING_MODEL,
+        },
+    }
+
+
+def compare(previous_path, results):
+    """Print p50/p99/throughput changes against an earlier results file."""
+    with open(previous_path) as f:
+        previous = json.load(f)
+    old = {(r["size"], r["scenario"]): r for r in previous["scenarios"]}
+    rows = []
+    for r in results["scenarios"]:
+        before = old.get((r["size"], r["scenario"]))
+        if not before:
+            continue
+        row = {"size": r["size"], "scenario": r["scenario"]}
+        for key in ("p50_ms", "p99_ms", "throughput_rps"):
+            if before.get(key) and r.get(key) is not None:
+                row[key] = f"{before[key]} -> {r[key]} ({(r[key] - before[key]) / before[key] * 100:+.1f}%)"
+        rows.append(row)
+    if rows:
+        print(f"\nCompared with {previous_path} ({previous['metadata'].get('git_commit')}):")
+        print_table(rows, ["size", "scenario", "p50_ms", "p99_ms", "throughput_rps"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--with-cache", action="store_true", help="leave the recall cache enabled")
+    parser.add_argument("--scenarios", nargs="+", help="only run these scenarios")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help=f"results file (default: {RESULTS_DIR}/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    os.environ.setdefault("API_KEY", "bench")
+    os.environ.setdefault("BACKUP_ENABLED", "false")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if not args.with_cache:
+        # Measure the database path; cached reads would hide query regressions
+        os.environ["CACHE_ENABLED"] = "false"
+
+    import main  # noqa: E402
+
+    main.safe_init_db()
+    client = HttpClient(args.url, main.API_KEY) if args.url else InProcessClient(main.app, main.API_KEY)
+
+    conn = main.get_db_connection()
+    results = {"metadata": run_metadata(main, conn, args), "scenarios": [], "plans": {}}
+    main.release_db_connection(conn)
+
+    for size in args.sizes:
+        conn = main.get_db_connection()
+        reset_memories(conn)
+        seed_memories(conn, size, seed=(args.seed % 1000) / 1000.0)
+        cursor = conn.cursor()
+        cursor.execute("SELECT MIN(id), MAX(id) FROM memory")
+        id_range = cursor.fetchone()
+        cursor.close()
+        main.query_cache.clear()
+
+        semantic = main.EMBEDDINGS_ENABLED
+        if semantic:
+            main.backfill_embeddings()
+
+        results["plans"][str(size)] = explain_recall_queries(main, conn)
+        main.release_db_connection(conn)
+
+        rows = []
+        for index, (name, factory) in enumerate(build_scenarios(id_range, semantic)):
+            if args.scenarios and name not in args.scenarios:
+                continue
+            result = run_scenario(client, factory, args.requests, args.concurrency, args.seed + index)
+            result.update({"size": size, "scenario": name})
+            rows.append(result)
+            results["scenarios"].append(result)
+        print(f"\n== {size} memories ==")
+        print_table(rows, ["scenario", "requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms"])
+        for name, plan in results["plans"][str(size)].items():
+            print(f"  plan[{name}]: {plan['top_node']} | {plan['execution_ms']} ms")
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['metadata']['git_commit'] or 'local'}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+    sys.exit(1 if any(r["errors"] for r in results["scenarios"]) else 0)
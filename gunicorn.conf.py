@@ -0,0 +1,54 @@
+"""
+Production launcher settings for multi-worker deployments.
+
+    gunicorn -c gunicorn.conf.py                        # Flask app, threaded workers (default)
+    SERVER_MODE=asgi gunicorn -c gunicorn.conf.py       # async mode (asgi_app)
+
+SERVER_MODE picks both the worker class and the app. The async mode serves the
+routes listed in asgi_app's docstring; /remember/batch, /export and /docs are
+Flask-only, so it is opt-in.
+
+Tune with PORT, WEB_CONCURRENCY (worker processes) and WEB_THREADS (wsgi only).
+A wsgi worker opens one psycopg2 pool of up to DB_POOL_MAX_SIZE connections. An
+asgi worker opens two: its async pool and the psycopg2 pool that the threaded
+paths use (semantic recall, idempotency keys, /changes replay, the write buffer
+and backups). Keep WEB_CONCURRENCY * DB_POOL_MAX_SIZE (doubled for asgi, plus a
+pool per READ_REPLICA_URLS entry on the replicas) below Postgres' max_connections.
+Every worker appends its writes to backup change logs, but only one of them at a
+time (the holder of an advisory lock) takes snapshots and applies retention.
+"""
+
+import multiprocessing
+import os
+
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi").lower()
+
+wsgi_app = "asgi_app:app" if SERVER_MODE == "asgi" else "main:app"
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "uvicorn.workers.UvicornWorker" if SERVER_MODE == "asgi" else "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+keepalive = 5
+timeout = 60
+graceful_timeout = 30
+
+
+def on_starting(server):
+    """Run schema migrations once in the master; a failure stops gunicorn before any worker starts."""
+    import main
+
+    main.safe_init_db()
+
+
+def post_worker_init(worker):
+    """Start per-worker background threads and log each wsgi worker's cold-start time."""
+    if SERVER_MODE == "asgi":
+        return  # asgi_app does both from its lifespan, once the async pool is open
+    import main
+
+    if main.WRITE_BUFFER_ENABLED:
+        main.write_buffer.start()
+    if main.POSTGRES_BACKEND:
+        main.change_feed.start()
+    main.log_startup_ready()
@@ -1,14 +1,73 @@
 import os
+import time
+
+# Cold-start clock (see STARTUP below); set before the heavier imports
+_IMPORT_STARTED = time.perf_counter()
+
+import sys
+import uuid
+import re
+import zlib
+import base64
+import hashlib
+import bisect
+import argparse
+import queue
+import atexit
+import select
+import fcntl
+import threading
+import contextvars
 import psycopg2
+import psycopg2.extras
+import psycopg2.extensions
+import psycopg2.pool
 import logging
 import json
-import pytz
-from flask import Flask, request, jsonify
+import gzip
+import importlib
+import importlib.util
+from flask import Flask, Response, request, jsonify, g, has_app_context, has_request_context
 from flask_cors import CORS
-from flasgger import Swagger
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
 from enum import Enum
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque, namedtuple
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import wraps
+from werkzeug.http import parse_accept_header
+
+
+class _LazyModule:
+    """Stand-in for a module that is only imported on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        value = getattr(self._module, attr)
+        setattr(self, attr, value)  # later lookups skip __getattr__
+        return value
+
+
+# numpy (~70ms to import) is only needed once semantic recall or embedding is used
+np = _LazyModule("numpy") if importlib.util.find_spec("numpy") else None
+
+try:
+    import brotli
+except ImportError:  # responses fall back to gzip
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # dumps_json falls back to the json module
+    orjson = None
 
 ###############################################################################
 #                             ENV & APP SETUP                                  #
@@ -19,9 +78,128 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 API_KEY = os.getenv("API_KEY")
 
+# Storage backend (see STORAGE BACKENDS below): postgres, sqlite for a single
+# node without a database server, or sharded to spread owners' memories over the
+# Postgres databases in SHARD_URLS (see SHARDING below). Features built on a single
+# Postgres database (LISTEN/NOTIFY cache invalidation, embeddings, backups, the
+# write buffer, the archive, replicas, /changes) are off unless it is postgres.
+STORAGE_BACKENDS = ("postgres", "sqlite", "sharded")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgres").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "infobuddy_memory.db")
+POSTGRES_BACKEND = STORAGE_BACKEND == "postgres"
+SHARD_URLS = [url.strip() for url in os.getenv("SHARD_URLS", "").split(",") if url.strip()]
+SHARD_PLACEMENT_TTL = float(os.getenv("SHARD_PLACEMENT_TTL", "5"))
+
+# Request timing histograms and /metrics (see METRICS below)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() not in ("0", "false", "no")
+# Bearer token that opens /metrics and /health without the API key, e.g. for a scraper
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Response compression (see HTTP CACHING & COMPRESSION below)
+COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "true").lower() not in ("0", "false", "no")
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+
+# Seconds to wait for Postgres when connecting; startup fails rather than hangs
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+
+# Startup is logged with a warning when import + schema check exceed this
+STARTUP_TARGET_SECONDS = float(os.getenv("STARTUP_TARGET_SECONDS", "1.0"))
+
+# Connection pool sizing (see DatabasePool below)
+DB_POOL_ENABLED = os.getenv("DB_POOL_ENABLED", "true").lower() not in ("0", "false", "no")
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_POOL_HEALTHCHECK_IDLE = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE", "30"))
+
+# Read replicas (see ReplicaRouter below): comma-separated DSNs of streaming
+# replicas for read-only queries; postgres only. A replica lagging more than
+# REPLICA_MAX_LAG seconds leaves rotation, and a client that wrote reads from the
+# primary for READ_YOUR_WRITES_SECONDS (by default longer than a replica may lag).
+READ_REPLICA_URLS = [url.strip() for url in os.getenv("READ_REPLICA_URLS", "").split(",") if url.strip()] \
+    if POSTGRES_BACKEND else []
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "2"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", str(REPLICA_MAX_LAG + REPLICA_CHECK_INTERVAL)))
+
+# Result paging for /recall-or-search
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
+
+# Have Postgres build each recalled memory's JSON (see build_recall_json_query)
+RECALL_SQL_JSON = os.getenv("RECALL_SQL_JSON", "true").lower() not in ("0", "false", "no")
+
+# Rows fetched per server-side cursor round trip when exporting
+EXPORT_ITERSIZE = int(os.getenv("EXPORT_ITERSIZE", "2000"))
+
+# In-process cache for /recall-or-search (see QueryCache below)
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "30"))
+# Without LISTEN (any backend but postgres) a cache hit is served only after checking the store version
+CACHE_LISTEN = POSTGRES_BACKEND and os.getenv("CACHE_LISTEN", "true").lower() not in ("0", "false", "no")
+
+# Semantic recall (see EmbeddingIndex below); needs numpy
+EMBEDDINGS_ENABLED = np is not None and POSTGRES_BACKEND and os.getenv("EMBEDDINGS_ENABLED", "true").lower() not in ("0", "false", "no")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "hashing")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+EMBEDDING_SYNC_INTERVAL = float(os.getenv("EMBEDDING_SYNC_INTERVAL", "5"))
+
+# Bulk ingest via /remember/batch
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "10000"))
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "1000"))
+
+# Memories whose normalized title and details are already stored (see
+# DEDUPLICATION & IDEMPOTENCY below) are skipped, merged into (merge_categories)
+# or refresh the stored one's timestamp (bump_timestamp); ?on_duplicate= overrides
+DUPLICATE_POLICIES = ("skip", "merge_categories", "bump_timestamp")
+DUPLICATE_POLICY = os.getenv("DUPLICATE_POLICY", "skip").lower()
+# Seconds a response to a request with an Idempotency-Key is replayed for
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+
+# /context bundles (see CONTEXT BUNDLES below): default budget in tokens, the
+# characters counted per token, candidates per lane and the recency half-life
+CONTEXT_DEFAULT_BUDGET = int(os.getenv("CONTEXT_DEFAULT_BUDGET", "2000"))
+CONTEXT_CHARS_PER_TOKEN = int(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4"))
+CONTEXT_MAX_CHARS = int(os.getenv("CONTEXT_MAX_CHARS", "200000"))
+CONTEXT_LANE_LIMIT = int(os.getenv("CONTEXT_LANE_LIMIT", "20"))
+CONTEXT_HALF_LIFE_DAYS = float(os.getenv("CONTEXT_HALF_LIFE_DAYS", "30"))
+
+# Buffered /remember writes (see BufferedWriter below)
+WRITE_BUFFER_ENABLED = POSTGRES_BACKEND and os.getenv("WRITE_BUFFER_ENABLED", "false").lower() in ("1", "true", "yes")
+WRITE_JOURNAL_DIR = os.getenv("WRITE_JOURNAL_DIR", "journal")
+WRITE_JOURNAL_FSYNC = os.getenv("WRITE_JOURNAL_FSYNC", "true").lower() not in ("0", "false", "no")
+WRITE_FLUSH_MAX_BATCH = int(os.getenv("WRITE_FLUSH_MAX_BATCH", "500"))
+WRITE_FLUSH_LINGER = float(os.getenv("WRITE_FLUSH_LINGER", "0.05"))
+WRITE_FLUSH_MAX_BACKOFF = float(os.getenv("WRITE_FLUSH_MAX_BACKOFF", "30"))
+WRITE_ID_BLOCK = int(os.getenv("WRITE_ID_BLOCK", "1000"))
+
+# Cold-storage archive of old memories (monthly gzip NDJSON files + index, see MemoryArchive)
+ARCHIVE_ENABLED = POSTGRES_BACKEND and os.getenv("ARCHIVE_ENABLED", "false").lower() in ("1", "true", "yes")
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_RECALL_DEFAULT = os.getenv("ARCHIVE_RECALL_DEFAULT", "fallback").lower()
+ARCHIVE_CACHE_MONTHS = int(os.getenv("ARCHIVE_CACHE_MONTHS", "3"))
+
+# Change stream for GET /changes (see ChangeFeed below); postgres only
+CHANGES_RETENTION = float(os.getenv("CHANGES_RETENTION", "86400"))
+CHANGES_PRUNE_INTERVAL = float(os.getenv("CHANGES_PRUNE_INTERVAL", "300"))
+CHANGES_REPLAY_MAX = int(os.getenv("CHANGES_REPLAY_MAX", "5000"))
+CHANGES_QUEUE_SIZE = int(os.getenv("CHANGES_QUEUE_SIZE", "256"))
+CHANGES_HEARTBEAT = float(os.getenv("CHANGES_HEARTBEAT", "15"))
+CHANGES_RETRY_MS = int(os.getenv("CHANGES_RETRY_MS", "2000"))
+
+# Backups (see BackupWorker below)
+BACKUP_ENABLED = POSTGRES_BACKEND and os.getenv("BACKUP_ENABLED", "true").lower() not in ("0", "false", "no")
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_COALESCE_SECONDS = float(os.getenv("BACKUP_COALESCE_SECONDS", "2"))
+BACKUP_SNAPSHOT_EVERY_CHANGES = int(os.getenv("BACKUP_SNAPSHOT_EVERY_CHANGES", "1000"))
+BACKUP_SNAPSHOT_INTERVAL = float(os.getenv("BACKUP_SNAPSHOT_INTERVAL", "3600"))
+BACKUP_KEEP_SNAPSHOTS = int(os.getenv("BACKUP_KEEP_SNAPSHOTS", "7"))
+
 # Configure logging
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
@@ -76,6 +254,15 @@ class MemoryCategory(Enum):
     def get_descriptions(cls):
         return {member.value['value']: member.value['description'] for member in cls}
 
+
+# Built once; validation checks every submitted category against the set
+CATEGORY_VALUES = tuple(MemoryCategory.get_values())
+CATEGORY_SET = frozenset(CATEGORY_VALUES)
+
+# Memories are displayed in Chicago time
+DISPLAY_TIMEZONE = "America/Chicago"
+DISPLAY_TZ = ZoneInfo(DISPLAY_TIMEZONE)
+
 # Debugging confirmation
 if API_KEY:
     logging.debug("✅ API Key loaded.")
@@ -89,555 +276,6095 @@ else:
 
 app = Flask(__name__)
 CORS(app)
-Swagger(app)
 
-###############################################################################
-#                             DB CONNECTION                                    #
-###############################################################################
-
-def get_db_connection():
-    """Establish a connection to the PostgreSQL database."""
-    try:
-        return psycopg2.connect(DATABASE_URL)
-    except Exception as e:
-        logging.error(f"❌ Database Connection Error: {str(e)}")
-        return None
 
-###############################################################################
-#                             INIT DB                                         #
-###############################################################################
-
-def safe_init_db():
+class LazySwaggerDocs:
     """
-    Safely create the 'memory' table if it doesn't exist.
-    This version preserves existing data.
+    WSGI wrapper that serves flasgger's /apidocs from a docs-only Flask app
+    built on the first docs request, keeping flasgger (and jsonschema, yaml,
+    mistune) out of startup. The docs app mirrors the API's routes so the
+    specs still come from the view docstrings.
     """
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
 
-            # Check if table exists
-            cursor.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_name = 'memory'
-                );
-            """)
-            table_exists = cursor.fetchone()[0]
+    PATHS = ("/apidocs", "/apispec", "/flasgger_static")
 
-            if not table_exists:
-                logging.info("Creating memory table for the first time...")
-                # First ensure the enum type exists
-                cursor.execute("""
-                    DO $$ 
-                    BEGIN
-                        IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'memory_category') THEN
-                            CREATE TYPE memory_category AS ENUM (
-                                'work_and_military',
-                                'personal_growth',
-                                'adventure_and_travel',
-                                'hobbies_and_interests',
-                                'romantic_relationships',
-                                'friends_and_family',
-                                'upbringing_and_lore',
-                                'infobuddy_relationship',
-                                'infobuddy_technical',
-                                'miscellaneous'
-                            );
-                        END IF;
-                    END $$;
-                """)
+    def __init__(self, wsgi_app, source_app):
+        self.wsgi_app = wsgi_app
+        self.source_app = source_app
+        self._docs_app = None
+        self._lock = threading.Lock()
 
-                cursor.execute("""
-                    CREATE TABLE memory (
-                        id SERIAL PRIMARY KEY,
-                        title TEXT NOT NULL,
-                        details JSONB,
-                        categories memory_category[] NOT NULL,
-                        timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-                    );
-                """)
-                conn.commit()
-                logging.info("✅ Memory table created successfully.")
-            else:
-                logging.info("✅ Memory table already exists, preserving data.")
+    def _build_docs_app(self):
+        from flasgger import Swagger
 
-            # Create indexes for better search performance
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_memory_title ON memory (title);
-                CREATE INDEX IF NOT EXISTS idx_memory_categories ON memory USING gin (categories);
-                CREATE INDEX IF NOT EXISTS idx_memory_timestamp ON memory (timestamp);
-            """)
-            conn.commit()
+        docs_app = Flask(__name__)
+        for rule in self.source_app.url_map.iter_rules():
+            if rule.endpoint != "static":
+                docs_app.add_url_rule(rule.rule, rule.endpoint, self.source_app.view_functions[rule.endpoint],
+                                      methods=rule.methods)
+        Swagger(docs_app)
+        return docs_app
 
-            # Log current record count
-            cursor.execute("SELECT COUNT(*) FROM memory")
-            count = cursor.fetchone()[0]
-            logging.info(f"📊 Current record count in memory table: {count}")
+    def __call__(self, environ, start_response):
+        if not environ.get("PATH_INFO", "").startswith(self.PATHS):
+            return self.wsgi_app(environ, start_response)
+        if self._docs_app is None:
+            with self._lock:
+                if self._docs_app is None:
+                    self._docs_app = self._build_docs_app()
+        return self._docs_app(environ, start_response)
 
-        except Exception as e:
-            logging.error(f"❌ Error during database initialization: {str(e)}")
-            conn.rollback()
-        finally:
-            cursor.close()
-            conn.close()
-    else:
-        logging.error("❌ ERROR: Database initialization failed - couldn't connect.")
+
+app.wsgi_app = LazySwaggerDocs(app.wsgi_app, app)
 
 ###############################################################################
-#                             BACKUP FUNCTIONS                                 #
+#                             METRICS                                          #
 ###############################################################################
 
-def backup_database():
-    """Create a JSON backup of all memories."""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT title, details, categories, timestamp 
-                FROM memory 
-                ORDER BY timestamp DESC
-            """)
-            memories = cursor.fetchall()
-
-            backup_data = []
-            for memory in memories:
-                backup_data.append({
-                    "title": memory[0],
-                    "details": memory[1],
-                    "categories": memory[2],
-                    "timestamp": memory[3].isoformat()
-                })
-
-            # Create backups directory if it doesn't exist
-            os.makedirs("backups", exist_ok=True)
-
-            # Create backup file with timestamp
-            backup_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = f"backups/memory_backup_{backup_time}.json"
-
-            with open(backup_file, "w") as f:
-                json.dump(backup_data, f, indent=2)
-
-            logging.info(f"✅ Backup created successfully: {backup_file}")
-            return backup_file
+# Latency buckets in seconds, shared by every histogram
+METRIC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
 
-        except Exception as e:
-            logging.error(f"❌ Backup failed: {str(e)}")
-        finally:
-            cursor.close()
-            conn.close()
-    return None
 
-###############################################################################
-#                         SECURITY FUNCTION                                    #
-###############################################################################
+class Histogram:
+    """Cumulative-bucket histogram keyed by a label tuple, rendered in Prometheus text format."""
 
-def check_api_key(req):
-    """
-    Check that the request has a valid API key.
-    Looks first for a Bearer token in the Authorization header,
-    then for an X-API-KEY header,
-    and finally for an 'api_key' query parameter.
-    """
-    token = None
+    def __init__(self, name, help_text, label_names, buckets=METRIC_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
 
-    # 1. Check Authorization header (expecting "Bearer <token>")
-    auth_header = req.headers.get("Authorization")
-    if auth_header and auth_header.lower().startswith("bearer "):
-        token = auth_header.split(" ", 1)[1].strip()
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
 
-    # 2. Fallback: Check X-API-KEY header
-    if not token:
-        token = req.headers.get("X-API-KEY")
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            label_text = _format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label_text}{"," if label_text else ""}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
 
-    # 3. Fallback: Check query parameter (e.g., ?api_key=YOUR_API_KEY)
-    if not token:
-        token = req.args.get("api_key")
 
-    logging.debug("Token from request: %r", token)
+class Counter:
+    """Monotonic counter keyed by a label tuple."""
 
-    if not token:
-        logging.warning("🚨 Missing API key in request (headers or query parameter).")
-        return False
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
 
-    expected_key = API_KEY.strip() if API_KEY else None
-    logging.debug("Expected API key: %r", expected_key)
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
 
-    if token != expected_key:
-        logging.warning("🚨 API key mismatch: provided token does not match expected key.")
-        return False
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{{{_format_labels(self.label_names, labels)}}} {value}")
+        return lines
 
-    return True
 
+def _format_labels(names, values):
+    return ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
 
-###############################################################################
-#                             MEMORY HANDLERS                                  #
-###############################################################################
 
-@app.route("/remember", methods=["POST"])
-def remember():
-    """Store a memory with title, details, and multiple categories."""
-    if not check_api_key(request):
-        return jsonify({"error": "Unauthorized"}), 403
+def _render_gauges(name, help_text, metric_type, label_name, values):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for label, value in sorted(values.items()):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f'{name}{{{label_name}="{label}"}} {value}')
+    return lines
 
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No JSON data provided"}), 400
 
-        title = str(data.get("title", "")).strip()
-        details = str(data.get("details", "")).strip()
-        categories = data.get("categories", [])
+REQUEST_PHASE_SECONDS = Histogram(
+    "memory_api_request_phase_seconds",
+    "Time spent per request phase (total, db_connect, query, decode, serialize, backup, compress, journal, archive).",
+    ("route", "phase"),
+)
+REQUESTS_TOTAL = Counter("memory_api_requests_total", "Requests handled.", ("route", "method", "status"))
+ERRORS_TOTAL = Counter("memory_api_errors_total", "Requests that ended in a 5xx response.", ("route",))
 
-        if not title or not details or not categories:
-            return jsonify({"error": "Missing title, details, or categories"}), 400
 
-        if not isinstance(categories, list):
-            return jsonify({"error": "Categories must be provided as a list"}), 400
+# Phase timings of the current asgi_app request (see asgi_app.MetricsMiddleware);
+# Flask requests keep theirs in g
+request_phases = contextvars.ContextVar("request_phases", default=None)
 
-        # Validate categories
-        valid_categories = MemoryCategory.get_values()
-        categories = [cat.strip() for cat in categories]
-        invalid_categories = [cat for cat in categories if cat not in valid_categories]
-        if invalid_categories:
-            return jsonify({
-                "error": f"Invalid categories: {invalid_categories}. Must be one or more of: {valid_categories}"
-            }), 400
 
-        logging.info(f"Attempting to store memory - Title: {title}, Categories: {categories}")
+@contextmanager
+def timed_phase(phase):
+    """Add the time spent in the block to the current request's `phase` (no-op outside requests)."""
+    phases = None
+    if METRICS_ENABLED:
+        phases = g.setdefault("timing_phases", {}) if has_request_context() else request_phases.get()
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[phase] = phases.get(phase, 0.0) + time.perf_counter() - start
 
-        chicago_tz = pytz.timezone("America/Chicago")
-        timestamp = datetime.now(chicago_tz)
 
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "Database connection failed"}), 500
+def _route_label():
+    return request.url_rule.rule if request.url_rule else "unmatched"
 
-        cursor = conn.cursor()
 
-        # Ensure details is proper JSONB
-        if isinstance(details, str):
-            details_json = json.dumps({"text": details})
-        elif isinstance(details, dict):
-            details_json = json.dumps(details)
-        else:
-            return jsonify({"error": "Invalid details format"}), 400
-
-        cursor.execute(
-            """
-            INSERT INTO memory (title, details, categories, timestamp)
-            VALUES (%s, %s::jsonb, %s::memory_category[], %s)
-            """,
-            (title, details_json, categories, timestamp)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
+@app.before_request
+def start_request_timer():
+    if METRICS_ENABLED:
+        g.request_started = time.perf_counter()
 
-        # Create backup after successful insert
-        backup_database()
 
-        return jsonify({
-            "message": f"Memory stored: '{title}'",
-            "categories": categories
-        }), 200
+def observe_request(route, method, status, total, phases):
+    """Record a finished request in the histograms and counters (Flask and asgi_app alike)."""
+    REQUEST_PHASE_SECONDS.observe((route, "total"), total)
+    for phase, elapsed in phases.items():
+        REQUEST_PHASE_SECONDS.observe((route, phase), elapsed)
+    REQUESTS_TOTAL.inc((route, method, status))
+    if status >= 500:
+        ERRORS_TOTAL.inc((route,))
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
 
+def server_timing(headers, total, phases):
+    """
+    The opt-in per-request breakdown, e.g. `curl -H "X-Debug-Timing: 1"`, as a
+    Server-Timing header value; None when not asked for.
+    """
+    if headers.get("X-Debug-Timing", "").lower() not in ("1", "true", "yes"):
+        return None
+    entries = [f"{phase};dur={elapsed * 1000:.3f}" for phase, elapsed in phases.items()]
+    entries.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(entries)
 
 
-@app.route("/recall-or-search", methods=["GET"])
-def recall_or_search():
-    """Retrieve memories by title, details, or categories, converting timestamps to Chicago time."""
-    if not check_api_key(request):
+@app.after_request
+def record_request_metrics(response):
+    if not METRICS_ENABLED or "request_started" not in g:
+        return response
+    total = time.perf_counter() - g.request_started
+    phases = g.get("timing_phases", {})
+    observe_request(_route_label(), request.method, response.status_code, total, phases)
+    timing = server_timing(request.headers, total, phases)
+    if timing:
+        response.headers["Server-Timing"] = timing
+    return response
+
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text exposition of request, pool, replica, cache and backup metrics."""
+    if not check_monitoring_access(request):
         return jsonify({"error": "Unauthorized"}), 403
+    return Response("\n".join(render_metrics()) + "\n", mimetype=METRICS_CONTENT_TYPE)
 
-    search_term = request.args.get("search", "").strip()
-    category = request.args.get("category", "").strip()
 
-    try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "Database connection failed"}), 500
-        cursor = conn.cursor()
+def render_metrics():
+    """The /metrics exposition as a list of lines."""
+    lines = []
+    lines += REQUEST_PHASE_SECONDS.render()
+    lines += REQUESTS_TOTAL.render()
+    lines += ERRORS_TOTAL.render()
+    if DB_POOL_ENABLED and _db_pool:
+        stats = _db_pool.stats()
+        lines += _render_gauges("memory_api_db_pool", "Database pool gauges.", "gauge", "stat",
+                                {k: stats[k] for k in ("in_use", "idle", "open", "max_size")})
+        lines += _render_gauges("memory_api_db_pool_events_total", "Database pool events.", "counter", "event",
+                                {k: stats[k] for k in ("checkouts", "timeouts", "health_check_failures")})
+    if CACHE_ENABLED:
+        lines += _render_gauges("memory_api_cache_events_total", "Recall cache events.", "counter", "event",
+                                query_cache.counters)
+        lines += _render_gauges("memory_api_cache", "Recall cache gauges.", "gauge", "stat",
+                                {"entries": query_cache.stats()["entries"]})
+    if BACKUP_ENABLED:
+        lines += _render_gauges("memory_api_backup_events_total", "Backup worker events.", "counter", "event",
+                                backup_worker.counters)
+        lines += _render_gauges("memory_api_backup", "Backup worker gauges.", "gauge", "stat",
+                                {"queue_depth": backup_worker.stats()["queue_depth"]})
+    if WRITE_BUFFER_ENABLED:
+        stats = write_buffer.stats()
+        lines += _render_gauges("memory_api_write_buffer_events_total", "Buffered write events.", "counter", "event",
+                                write_buffer.counters)
+        lines += _render_gauges("memory_api_write_buffer", "Buffered write gauges.", "gauge", "stat",
+                                {k: stats[k] for k in ("queue_depth", "segments", "reserved_ids")})
+        lines += WRITE_BUFFER_SECONDS.render()
+    if replica_router.enabled:
+        lines += _render_gauges("memory_api_read_routing_total", "Read-only query routing.", "counter", "event",
+                                replica_router.counters)
+        replicas = replica_router.stats()["replicas"]
+        lines += _render_gauges("memory_api_replica_lag_seconds", "Read replica lag at the last check.", "gauge",
+                                "replica", {replica["name"]: replica["lag_seconds"] for replica in replicas})
+        lines += _render_gauges("memory_api_replica_healthy", "1 while a read replica is in rotation.", "gauge",
+                                "replica", {replica["name"]: int(replica["healthy"]) for replica in replicas})
+    if STORAGE_BACKEND == "sharded":
+        lines += SHARD_QUERY_SECONDS.render()
+        shards = get_memory_store().stats()["shards"]
+        lines += _render_gauges("memory_api_shard_transactions_total", "Transactions run per shard.", "counter",
+                                "shard", {shard["name"]: shard["transactions"] for shard in shards})
+        lines += _render_gauges("memory_api_shard_errors_total", "Failed transactions per shard.", "counter",
+                                "shard", {shard["name"]: shard["errors"] for shard in shards})
+    if POSTGRES_BACKEND:
+        lines += _render_gauges("memory_api_changes_events_total", "Change feed events.", "counter", "event",
+                                change_feed.counters)
+        lines += _render_gauges("memory_api_changes", "Change feed gauges.", "gauge", "stat",
+                                {"subscribers": change_feed.stats()["subscribers"]})
+    lines += _render_gauges("memory_api_startup_seconds", "Time spent becoming ready, by phase.", "gauge", "phase",
+                            startup_timings)
+    return lines
 
-        if not search_term and not category:
-            # Return recent memories if no search parameters
-            cursor.execute("""
-                SELECT title, details, categories, timestamp 
-                FROM memory 
-                ORDER BY timestamp DESC
-                LIMIT 10;
-            """)
-        else:
-            params = []
-            conditions = []
-
-            if search_term:
-                conditions.append("(title ILIKE %s OR details->>'text' ILIKE %s)")
-                params.extend([f"%{search_term}%", f"%{search_term}%"])
-
-            if category:
-                conditions.append("%s = ANY(categories)")
-                params.append(category)
-
-            query = """
-                SELECT title, details, categories, timestamp 
-                FROM memory 
-                WHERE """ + " OR ".join(conditions) + """
-                ORDER BY timestamp DESC;
-            """
-            cursor.execute(query, params)
+###############################################################################
+#                             HTTP CACHING & COMPRESSION                       #
+###############################################################################
 
-        memories = []
-        chicago_tz = pytz.timezone("America/Chicago")
-        for row in cursor.fetchall():
-            details = row[1]
-            if isinstance(details, str):
-                details = json.loads(details)
-
-            # Convert timestamp to Chicago time
-            timestamp_chicago = row[3].astimezone(chicago_tz) if row[3] else None
-
-            memories.append({
-                "title": row[0],
-                "details": details["text"] if isinstance(details, dict) and "text" in details else str(details),
-                "categories": row[2],
-                "timestamp": timestamp_chicago.isoformat() if timestamp_chicago else None
-            })
+# Bumped by a statement trigger on every write to memory (see SUMMARY STATS), so
+# reading it is a single-row lookup no matter how many memories there are.
+STORE_VERSION_SQL = "SELECT version, modified_at FROM memory_store_version"
 
-        cursor.close()
-        conn.close()
 
-        if not memories:
-            return jsonify({
-                "message": "No memories found matching your search.",
-                "suggestion": "Try a different search term or category."
-            }), 404
+def store_validators(version, modified_at):
+    """The (ETag, Last-Modified) header values for a store version."""
+    last_modified = format_datetime(modified_at.astimezone(timezone.utc), usegmt=True) if modified_at else None
+    return f'W/"{version}"', last_modified
 
-        return jsonify({
-            "memories": memories,
-            "total_found": len(memories)
-        }), 200
 
-    except Exception as e:
-        logging.error(f"❌ ERROR in /recall-or-search: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+def is_not_modified(headers, etag, last_modified):
+    """
+    Whether a conditional GET can be answered with 304. If-None-Match wins over
+    If-Modified-Since, whose one-second resolution can miss back-to-back writes.
+    """
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match:
+        # Weak comparison: W/"5" and "5" match
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = headers.get("If-Modified-Since")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
 
 
+def not_modified_response(etag, last_modified):
+    response = Response(status=304)
+    response.headers["ETag"] = etag
+    if last_modified:
+        response.headers["Last-Modified"] = last_modified
+    return response
 
-@app.route("/delete", methods=["DELETE"])
-def delete_memory():
-    """Delete a specific memory by title. If multiple exist, deletes the most recent one."""
-    if not check_api_key(request):
-        return jsonify({"error": "Unauthorized"}), 403
 
-    title = request.args.get("title")
-    if not title:
-        return jsonify({"error": "Missing title"}), 400
+def choose_content_encoding(accept_encoding):
+    """Pick br (when the brotli package is installed) or gzip from an Accept-Encoding value."""
+    accepted = parse_accept_header(accept_encoding or "")
+    if brotli is not None and accepted.quality("br") > 0:
+        return "br"
+    if accepted.quality("gzip") > 0:
+        return "gzip"
+    return None
 
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"error": "Database connection failed"}), 500
 
-    cursor = conn.cursor()
+def compress_body(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
 
-    # Look up the most recent memory with the given title
-    cursor.execute("""
-        SELECT timestamp FROM memory 
-        WHERE title = %s 
-        ORDER BY timestamp DESC 
-        LIMIT 1
-    """, (title,))
-    result = cursor.fetchone()
-    if not result:
-        cursor.close()
-        conn.close()
-        return jsonify({"error": "Memory not found"}), 404
 
-    stored_timestamp = result[0]
+def dumps_json(payload):
+    """Encode a response payload as jsonify would (compact, sorted keys), with orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(payload, separators=(",", ":"), sort_keys=True).encode()
 
-    cursor.execute("""
-        DELETE FROM memory 
-        WHERE title = %s AND timestamp = %s::timestamptz
-    """, (title, stored_timestamp))
-    deleted = cursor.rowcount > 0
-    conn.commit()
-    cursor.close()
-    conn.close()
 
-    if deleted:
-        return jsonify({"message": f"Memory deleted: '{title}'"}), 200
-    else:
-        return jsonify({"error": "Memory not found"}), 404
+@app.after_request
+def compress_response(response):
+    """Compress JSON bodies of at least COMPRESS_MIN_SIZE bytes for clients that accept it."""
+    if (not COMPRESS_ENABLED or response.direct_passthrough or response.is_streamed
+            or response.status_code in (204, 304) or "Content-Encoding" in response.headers
+            or response.mimetype != "application/json"):
+        return response
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    encoding = choose_content_encoding(request.headers.get("Accept-Encoding"))
+    if encoding is None or len(body) < COMPRESS_MIN_SIZE:
+        return response
+    with timed_phase("compress"):
+        response.set_data(compress_body(body, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
 
+###############################################################################
+#                             DB CONNECTION                                    #
+###############################################################################
 
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available within the timeout."""
 
-@app.route("/edit", methods=["PUT"])
-def edit_memory():
-    """
-    Edit an existing memory.
 
-    Identification:
-      Provide original_title and (optionally) original_timestamp as query parameters.
-      If original_timestamp is omitted, the most recent memory with that title is used.
+class DatabasePool:
+    """
+    Bounded, thread-safe pool of PostgreSQL connections shared by every handler.
 
-    In the JSON body, include any fields to update:
-      - title: New title (optional)
-      - details: New details (optional; string or dict)
-      - categories: New categories (optional; must be a list of valid category values)
-      - timestamp: New timestamp (optional; to update the memory's timestamp)
+    Wraps psycopg2's ThreadedConnectionPool with:
+      - a semaphore so callers wait (up to `timeout` seconds) instead of failing
+        immediately when all connections are checked out,
+      - a health check on checkout (cheap status check, plus a `SELECT 1` ping for
+        connections that sat idle longer than `healthcheck_idle` seconds),
+      - counters exposed through `stats()`.
     """
-    if not check_api_key(request):
-        return jsonify({"error": "Unauthorized"}), 403
 
-    # Use the new query parameter names for identifying the memory.
-    original_title = request.args.get("original_title")
-    original_timestamp_str = request.args.get("original_timestamp")  # optional
+    def __init__(self, dsn, minconn, maxconn, timeout, healthcheck_idle):
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, dsn, connect_timeout=DB_CONNECT_TIMEOUT)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_idle = healthcheck_idle
+        self.counters = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "in_use": 0,
+        }
 
-    if not original_title:
-        return jsonify({"error": "Missing original title to identify the memory"}), 400
+    def _is_healthy(self, conn):
+        if conn.closed or conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        idle_for = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if idle_for < self.healthcheck_idle:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
 
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"error": "Database connection failed"}), 500
-    cursor = conn.cursor()
+    def getconn(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.counters["timeouts"] += 1
+            raise PoolTimeout(f"No database connection available within {self.timeout}s")
+        try:
+            conn = self._pool.getconn()
+            if not self._is_healthy(conn):
+                with self._lock:
+                    self.counters["health_check_failures"] += 1
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.counters["checkouts"] += 1
+            self.counters["in_use"] += 1
+        return conn
 
-    # If original_timestamp isn't provided, find the most recent memory with that title.
-    if not original_timestamp_str:
-        cursor.execute(
-            """
-            SELECT timestamp FROM memory
-            WHERE title = %s
-            ORDER BY timestamp DESC
-            LIMIT 1
-            """,
-            (original_title,)
-        )
-        result = cursor.fetchone()
-        if result:
-            original_timestamp = result[0]
-            original_timestamp_str = original_timestamp.isoformat()
-        else:
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Memory not found for the given title"}), 404
-    else:
+    def putconn(self, conn):
         try:
-            original_timestamp = datetime.fromisoformat(original_timestamp_str)
-        except ValueError:
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Invalid original timestamp format"}), 400
+            if conn.closed:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            with self._lock:
+                self.counters["in_use"] -= 1
+            self._slots.release()
 
-    data = request.get_json()
-    if not data:
-        cursor.close()
-        conn.close()
-        return jsonify({"error": "No JSON data provided for update"}), 400
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats.update({
+            "min_size": self.minconn,
+            "max_size": self.maxconn,
+            "idle": len(self._pool._pool),
+            "open": len(self._pool._pool) + len(self._pool._used),
+            "timeout_seconds": self.timeout,
+        })
+        return stats
 
-    new_title = data.get("title")
-    new_details = data.get("details")
-    new_categories = data.get("categories")
-    new_timestamp = data.get("timestamp")  # new timestamp for updating
+    def closeall(self):
+        self._pool.closeall()
 
-    if new_title is None and new_details is None and new_categories is None and new_timestamp is None:
-        cursor.close()
-        conn.close()
-        return jsonify({"error": "No update fields provided"}), 400
 
-    if new_categories is not None:
-        if not isinstance(new_categories, list):
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Categories must be provided as a list"}), 400
-        valid_categories = MemoryCategory.get_values()
-        new_categories = [cat.strip() for cat in new_categories]
-        invalid_categories = [cat for cat in new_categories if cat not in valid_categories]
-        if invalid_categories:
-            cursor.close()
-            conn.close()
-            return jsonify({
-                "error": f"Invalid categories: {invalid_categories}. Must be one or more of: {valid_categories}"
-            }), 400
+_db_pool = None
+_db_pool_lock = threading.Lock()
 
-    if new_timestamp is not None:
-        try:
-            new_timestamp_parsed = datetime.fromisoformat(new_timestamp)
-        except ValueError:
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Invalid new timestamp format"}), 400
 
-    update_parts = []
-    values = []
+def close_db_pool():
+    """Close every pooled connection, replicas included (e.g. before a pre-fork server forks workers)."""
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is not None:
+            _db_pool.closeall()
+            _db_pool = None
+    replica_router.closeall()
 
-    if new_title is not None:
-        update_parts.append("title = %s")
-        values.append(new_title.strip())
 
-    if new_details is not None:
-        if isinstance(new_details, str):
-            new_details_json = json.dumps({"text": new_details.strip()})
-        elif isinstance(new_details, dict):
-            new_details_json = json.dumps(new_details)
-        else:
-            cursor.close()
+def get_db_pool():
+    """Return the shared connection pool, creating it on first use."""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = DatabasePool(
+                    DATABASE_URL,
+                    DB_POOL_MIN_SIZE,
+                    DB_POOL_MAX_SIZE,
+                    DB_POOL_TIMEOUT,
+                    DB_POOL_HEALTHCHECK_IDLE,
+                )
+                logging.info(f"✅ Database pool ready (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE}).")
+    return _db_pool
+
+
+# Replication delay in seconds: 0 when the replica has replayed everything it
+# received (or is not a standby at all, e.g. a stand-in pointing at the primary)
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+# POST endpoints that only read; every other POST, PUT or DELETE counts as a write
+READ_ONLY_POST_PATHS = {"/query"}
+
+
+def is_write_request(method, path):
+    return method in ("POST", "PUT", "PATCH", "DELETE") and path not in READ_ONLY_POST_PATHS
+
+
+def read_client_key(headers, remote_addr):
+    """Whose writes a read must see: X-Client-ID when sent, else the peer address."""
+    return headers.get("X-Client-ID") or remote_addr
+
+
+def wants_primary_read(headers):
+    """`X-Read-Consistency: strong` sends a read to the primary regardless of pinning."""
+    return headers.get("X-Read-Consistency", "").lower() == "strong"
+
+
+class Replica:
+    """One READ_REPLICA_URLS entry and its last health check."""
+
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+        self.pool = None
+        self.healthy = False
+        self.lag = None
+        self.error = None
+        self.monitor_conn = None
+
+
+class ReplicaRouter:
+    """
+    Routes read-only queries to streaming replicas, round robin.
+
+    A monitor thread checks every replica each `check_interval` seconds and only
+    keeps those that answer with a lag of at most `max_lag` seconds in rotation.
+    Clients that wrote within `pin_seconds` read from the primary, so they see
+    their own writes; everyone else may read data up to `max_lag` seconds old.
+    """
+
+    def __init__(self, urls, max_lag, check_interval, pin_seconds):
+        self.replicas = [Replica(f"replica{index}", url) for index, url in enumerate(urls, 1)]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.pin_seconds = pin_seconds
+        self._pins = {}
+        self._last_write = 0.0
+        self._next = 0
+        self._owners = {}
+        self._thread = None
+        self._lock = threading.Lock()
+        self.counters = {"replica_reads": 0, "pinned_reads": 0, "fallback_reads": 0, "replica_errors": 0}
+
+    @property
+    def enabled(self):
+        return bool(self.replicas)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and self.replicas:
+                self._thread = threading.Thread(target=self._run, name="replica-monitor", daemon=True)
+                self._thread.start()
+
+    def note_write(self, client=None):
+        """Record a committed write, pinning `client` to the primary for pin_seconds."""
+        now = time.monotonic()
+        with self._lock:
+            self._last_write = now
+            if client is not None:
+                if len(self._pins) > 10000:
+                    self._pins = {key: until for key, until in self._pins.items() if until > now}
+                self._pins[client] = now + self.pin_seconds
+
+    def settled(self):
+        """True when no write was seen for max_lag seconds, so replica reads are safe to cache."""
+        return time.monotonic() - self._last_write > self.max_lag
+
+    def choose(self, client=None, strong=False):
+        """The replica for the next read, or None when it must go to the primary."""
+        if not self.replicas:
+            return None
+        self.start()
+        with self._lock:
+            if strong or self._pins.get(client, 0.0) > time.monotonic():
+                self.counters["pinned_reads"] += 1
+                return None
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if not healthy:
+                self.counters["fallback_reads"] += 1
+                return None
+            self._next += 1
+            self.counters["replica_reads"] += 1
+            return healthy[self._next % len(healthy)]
+
+    def getconn(self, replica):
+        """A connection to `replica`; a failure takes it out of rotation until the next good check."""
+        try:
+            if DB_POOL_ENABLED:
+                with self._lock:
+                    if replica.pool is None:
+                        replica.pool = DatabasePool(replica.url, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE,
+                                                    DB_POOL_TIMEOUT, DB_POOL_HEALTHCHECK_IDLE)
+                conn = replica.pool.getconn()
+            else:
+                conn = psycopg2.connect(replica.url, connect_timeout=DB_CONNECT_TIMEOUT)
+        except Exception as e:
+            self.mark_down(replica, e)
+            return None
+        with self._lock:
+            self._owners[id(conn)] = replica
+        return conn
+
+    def owns(self, conn):
+        return id(conn) in self._owners
+
+    def putconn(self, conn):
+        with self._lock:
+            replica = self._owners.pop(id(conn))
+        if replica.pool is not None:
+            replica.pool.putconn(conn)
+        else:
             conn.close()
-            return jsonify({"error": "Invalid format for details"}), 400
-        update_parts.append("details = %s::jsonb")
-        values.append(new_details_json)
 
-    if new_categories is not None:
-        update_parts.append("categories = %s::memory_category[]")
-        values.append(new_categories)
+    def mark_down(self, replica, error):
+        with self._lock:
+            replica.healthy = False
+            replica.error = str(error).strip()
+            self.counters["replica_errors"] += 1
+        logging.warning(f"⚠️ Read replica {replica.name} out of rotation: {replica.error}")
+
+    def closeall(self):
+        for replica in self.replicas:
+            if replica.pool is not None:
+                replica.pool.closeall()
+                replica.pool = None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats.update({
+                "max_lag_seconds": self.max_lag,
+                "pin_seconds": self.pin_seconds,
+                "replicas": [{
+                    "name": replica.name,
+                    "healthy": replica.healthy,
+                    "lag_seconds": replica.lag,
+                    "error": replica.error,
+                    "pool": replica.pool.stats() if replica.pool is not None else None,
+                } for replica in self.replicas],
+            })
+        return stats
+
+    def _run(self):
+        while True:
+            for replica in self.replicas:
+                self._check(replica)
+            time.sleep(self.check_interval)
+
+    def _check(self, replica):
+        try:
+            if replica.monitor_conn is None or replica.monitor_conn.closed:
+                replica.monitor_conn = psycopg2.connect(replica.url, connect_timeout=DB_CONNECT_TIMEOUT)
+                replica.monitor_conn.autocommit = True
+            with replica.monitor_conn.cursor() as cursor:
+                cursor.execute(REPLICA_LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except Exception as e:
+            if replica.monitor_conn is not None:
+                replica.monitor_conn.close()
+                replica.monitor_conn = None
+            replica.lag = None
+            if replica.healthy or replica.error is None:
+                self.mark_down(replica, e)
+            return
+        lag = None if lag is None else float(lag)
+        healthy = lag is not None and lag <= self.max_lag
+        with self._lock:
+            if healthy != replica.healthy:
+                logging.info(f"{'✅' if healthy else '⚠️'} Read replica {replica.name} "
+                             f"{'in' if healthy else 'out of'} rotation (lag {lag}s).")
+            replica.healthy = healthy
+            replica.lag = lag
+            replica.error = None if healthy else f"lag {lag}s exceeds {self.max_lag}s"
+
+
+replica_router = ReplicaRouter(READ_REPLICA_URLS, REPLICA_MAX_LAG, REPLICA_CHECK_INTERVAL, READ_YOUR_WRITES_SECONDS)
+
+
+def get_replica_connection():
+    """A read replica connection for the current request, or None to use the primary."""
+    if has_request_context():
+        replica = replica_router.choose(read_client_key(request.headers, request.remote_addr),
+                                        wants_primary_read(request.headers))
+    else:
+        replica = replica_router.choose()
+    if replica is None:
+        return None
+    with timed_phase("db_connect"):
+        conn = replica_router.getconn(replica)
+    if conn is not None and has_request_context():
+        g.setdefault("db_connections", []).append(conn)
+        g.read_replica = replica.name
+    return conn
+
+
+def get_db_connection(read_only=False):
+    """
+    Check out a connection to the PostgreSQL database.
+    Connections come from the shared pool unless DB_POOL_ENABLED=false;
+    always hand them back with release_db_connection(). With read_only=True
+    the connection may be to a read replica (see ReplicaRouter).
+    """
+    if read_only and replica_router.enabled:
+        conn = get_replica_connection()
+        if conn is not None:
+            return conn
+    try:
+        with timed_phase("db_connect"):
+            if not DB_POOL_ENABLED:
+                conn = psycopg2.connect(DATABASE_URL, connect_timeout=DB_CONNECT_TIMEOUT)
+            else:
+                conn = get_db_pool().getconn()
+    except Exception as e:
+        logging.error(f"❌ Database Connection Error: {str(e)}")
+        return None
+    if has_app_context():
+        g.setdefault("db_connections", []).append(conn)
+    return conn
+
+
+def release_db_connection(conn):
+    """Return a connection obtained from get_db_connection()."""
+    if conn is None:
+        return
+    if has_app_context() and conn in g.get("db_connections", []):
+        g.db_connections.remove(conn)
+    if replica_router.owns(conn):
+        replica_router.putconn(conn)
+        return
+    if not DB_POOL_ENABLED:
+        conn.close()
+        return
+    try:
+        get_db_pool().putconn(conn)
+    except Exception as e:
+        logging.error(f"❌ Failed to return connection to pool: {str(e)}")
+
+@app.after_request
+def route_reads_after_writes(response):
+    """Pin a client that just wrote to the primary, and say where the request's reads went."""
+    if replica_router.enabled:
+        if response.status_code < 400 and is_write_request(request.method, request.path):
+            replica_router.note_write(read_client_key(request.headers, request.remote_addr))
+        response.headers["X-Served-By"] = g.get("read_replica", "primary")
+    return response
+
+
+@app.teardown_appcontext
+def release_leftover_db_connections(exc):
+    """Hand back any connection a handler failed to release (e.g. after an exception)."""
+    for conn in list(g.get("db_connections", [])):
+        logging.warning("⚠️ Releasing database connection leaked by request handler.")
+        release_db_connection(conn)
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    """Report service health and database pool statistics."""
+    if not check_monitoring_access(request):
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify({
+        "status": "ok",
+        "db_pool": get_db_pool().stats() if DB_POOL_ENABLED and _db_pool else None,
+        "backup": backup_worker.stats() if BACKUP_ENABLED else None,
+        "cache": query_cache.stats() if CACHE_ENABLED else None,
+        "write_buffer": write_buffer.stats() if WRITE_BUFFER_ENABLED else None,
+        "archive": memory_archive.stats() if ARCHIVE_ENABLED else None,
+        "changes": change_feed.stats() if POSTGRES_BACKEND else None,
+        "replicas": replica_router.stats() if replica_router.enabled else None,
+        "storage": get_memory_store().stats()
+    }), 200
+
+###############################################################################
+#                             SUMMARY STATS                                    #
+###############################################################################
+
+# Histogram days/months follow the timezone the API reports timestamps in.
+# Changing it requires dropping memory_stats_daily so it is rebuilt on startup.
+STATS_TIMEZONE = DISPLAY_TIMEZONE
+STATS_TZ = ZoneInfo(STATS_TIMEZONE)
+
+# One row per (category, day); category '*' counts every memory. Statement-level
+# triggers keep it current in the same transaction as the write, so /stats and
+# the startup count cost O(days) instead of O(memories).
+MEMORY_STATS_SQL = f"""
+    CREATE TABLE IF NOT EXISTS memory_stats_daily (
+        category TEXT NOT NULL,
+        day DATE NOT NULL,
+        memories BIGINT NOT NULL DEFAULT 0,
+        latest TIMESTAMPTZ,
+        PRIMARY KEY (category, day)
+    );
+
+    CREATE OR REPLACE FUNCTION memory_stats_add(stamps TIMESTAMPTZ[], cats TEXT[]) RETURNS void AS $$
+        INSERT INTO memory_stats_daily AS s (category, day, memories, latest)
+        SELECT category, (stamp AT TIME ZONE '{STATS_TIMEZONE}')::date, COUNT(*), MAX(stamp)
+        FROM unnest(stamps, cats) AS d(stamp, category)
+        GROUP BY 1, 2
+        ORDER BY 1, 2  -- consistent lock order between concurrent writers
+        ON CONFLICT (category, day) DO UPDATE
+            SET memories = s.memories + EXCLUDED.memories,
+                latest = GREATEST(s.latest, EXCLUDED.latest);
+    $$ LANGUAGE sql;
+
+    CREATE OR REPLACE FUNCTION memory_stats_remove(stamps TIMESTAMPTZ[], cats TEXT[]) RETURNS void AS $$
+        UPDATE memory_stats_daily AS s
+        SET memories = s.memories - r.n,
+            -- Only rescan (one day, via idx_memory_timestamp) when the latest memory went away
+            latest = CASE WHEN r.latest < s.latest THEN s.latest ELSE (
+                SELECT MAX(m.timestamp) FROM memory m
+                WHERE m.timestamp >= r.day::timestamp AT TIME ZONE '{STATS_TIMEZONE}'
+                  AND m.timestamp < (r.day + 1)::timestamp AT TIME ZONE '{STATS_TIMEZONE}'
+                  AND (r.category = '*' OR m.categories @> ARRAY[r.category]::memory_category[])
+            ) END
+        FROM (
+            SELECT category, (stamp AT TIME ZONE '{STATS_TIMEZONE}')::date AS day, COUNT(*) AS n, MAX(stamp) AS latest
+            FROM unnest(stamps, cats) AS d(stamp, category)
+            GROUP BY 1, 2
+        ) AS r
+        WHERE s.category = r.category AND s.day = r.day;
+    $$ LANGUAGE sql;
+
+    CREATE OR REPLACE FUNCTION memory_stats_after_insert() RETURNS trigger AS $$
+    BEGIN
+        PERFORM memory_stats_add(array_agg(stamp), array_agg(category))
+        FROM (SELECT timestamp AS stamp, unnest(categories::text[] || '*'::text) AS category
+              FROM new_rows WHERE timestamp IS NOT NULL) AS expanded;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION memory_stats_after_update() RETURNS trigger AS $$
+    BEGIN
+        -- Rows whose timestamp and categories are unchanged (most edits, embedding
+        -- backfills) leave the summary alone
+        PERFORM memory_stats_remove(array_agg(stamp), array_agg(category))
+        FROM (SELECT o.timestamp AS stamp, unnest(o.categories::text[] || '*'::text) AS category
+              FROM old_rows o JOIN new_rows n ON n.id = o.id
+              WHERE o.timestamp IS NOT NULL
+                AND (o.timestamp, o.categories) IS DISTINCT FROM (n.timestamp, n.categories)) AS expanded;
+        PERFORM memory_stats_add(array_agg(stamp), array_agg(category))
+        FROM (SELECT n.timestamp AS stamp, unnest(n.categories::text[] || '*'::text) AS category
+              FROM old_rows o JOIN new_rows n ON n.id = o.id
+              WHERE n.timestamp IS NOT NULL
+                AND (o.timestamp, o.categories) IS DISTINCT FROM (n.timestamp, n.categories)) AS expanded;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION memory_stats_after_delete() RETURNS trigger AS $$
+    BEGIN
+        PERFORM memory_stats_remove(array_agg(stamp), array_agg(category))
+        FROM (SELECT timestamp AS stamp, unnest(categories::text[] || '*'::text) AS category
+              FROM old_rows WHERE timestamp IS NOT NULL) AS expanded;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION memory_stats_after_truncate() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM memory_stats_daily;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS memory_stats_insert ON memory;
+    CREATE TRIGGER memory_stats_insert AFTER INSERT ON memory
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION memory_stats_after_insert();
+    DROP TRIGGER IF EXISTS memory_stats_update ON memory;
+    CREATE TRIGGER memory_stats_update AFTER UPDATE ON memory
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION memory_stats_after_update();
+    DROP TRIGGER IF EXISTS memory_stats_delete ON memory;
+    CREATE TRIGGER memory_stats_delete AFTER DELETE ON memory
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION memory_stats_after_delete();
+    DROP TRIGGER IF EXISTS memory_stats_truncate ON memory;
+    CREATE TRIGGER memory_stats_truncate AFTER TRUNCATE ON memory
+        FOR EACH STATEMENT EXECUTE FUNCTION memory_stats_after_truncate();
+
+    -- Store version for ETag/Last-Modified (see STORE_VERSION_SQL); transactional,
+    -- so a reader never sees a version newer than the data it then queries
+    CREATE TABLE IF NOT EXISTS memory_store_version (
+        singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+        version BIGINT NOT NULL DEFAULT 0,
+        modified_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT INTO memory_store_version (singleton) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
+    CREATE OR REPLACE FUNCTION memory_bump_store_version() RETURNS trigger AS $$
+    BEGIN
+        UPDATE memory_store_version SET version = version + 1, modified_at = clock_timestamp();
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS memory_bump_store_version ON memory;
+    CREATE TRIGGER memory_bump_store_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON memory
+        FOR EACH STATEMENT EXECUTE FUNCTION memory_bump_store_version();
+"""
+
+MEMORY_STATS_BACKFILL_SQL = f"""
+    INSERT INTO memory_stats_daily (category, day, memories, latest)
+    SELECT category, (timestamp AT TIME ZONE '{STATS_TIMEZONE}')::date, COUNT(*), MAX(timestamp)
+    FROM memory, unnest(categories::text[] || '*'::text) AS category
+    WHERE timestamp IS NOT NULL
+    GROUP BY 1, 2
+"""
+
+STATS_TOTAL_SQL = "SELECT COALESCE(SUM(memories), 0) FROM memory_stats_daily WHERE category = '*'"
+
+STATS_CATEGORY_SQL = """
+    SELECT category, SUM(memories), MAX(latest)
+    FROM memory_stats_daily
+    GROUP BY category
+"""
+
+
+def parse_stats_args(args):
+    """Validate /stats query parameters. Returns (spec, error)."""
+    category = args.get("category", "").strip()
+    if category and category not in CATEGORY_SET:
+        return None, f"Invalid category. Must be one of: {list(CATEGORY_VALUES)}"
+    spec = {"category": category or None, "since": None, "until": None}
+    for key in ("since", "until"):
+        value = args.get(key, "").strip()
+        if value:
+            try:
+                spec[key] = date.fromisoformat(value)
+            except ValueError:
+                return None, f"Invalid '{key}' date, expected YYYY-MM-DD"
+    return spec, None
+
+
+def build_stats_histogram_query(spec):
+    """The (sql, params) for the per-day counts /stats histograms are built from."""
+    conditions = ["category = %s", "memories > 0"]
+    params = [spec["category"] or "*"]
+    if spec["since"]:
+        conditions.append("day >= %s")
+        params.append(spec["since"])
+    if spec["until"]:
+        conditions.append("day < %s")
+        params.append(spec["until"])
+    query = f"""
+        SELECT day, memories
+        FROM memory_stats_daily
+        WHERE {' AND '.join(conditions)}
+        ORDER BY day"""
+    return query, params
+
+
+def build_stats_payload(spec, category_rows, day_rows, tz):
+    """Assemble the /stats response from the summary table rows."""
+    per_category = {category: {"count": 0, "latest": None} for category in CATEGORY_VALUES}
+    total, latest = 0, None
+    for category, count, category_latest in category_rows:
+        stamp = category_latest.astimezone(tz).isoformat() if category_latest else None
+        if category == "*":
+            total, latest = int(count), stamp
+        elif category in per_category:
+            per_category[category] = {"count": int(count), "latest": stamp}
+
+    by_month = OrderedDict()
+    for day, count in day_rows:
+        month = day.strftime("%Y-%m")
+        by_month[month] = by_month.get(month, 0) + count
+
+    return {
+        "total": total,
+        "latest": latest,
+        "categories": per_category,
+        "histogram": {
+            "category": spec["category"],
+            "timezone": STATS_TIMEZONE,
+            "by_day": [{"day": day.isoformat(), "count": count} for day, count in day_rows],
+            "by_month": [{"month": month, "count": count} for month, count in by_month.items()],
+        },
+    }
+
+
+@app.route("/stats", methods=["GET"])
+def memory_stats():
+    """
+    Per-category counts, per-day/month histograms and latest memory per category.
+
+    Served from the trigger-maintained memory_stats_daily summary, so the cost
+    depends on the number of days with memories, not the number of memories.
+
+    Query parameters:
+      - category: restrict the histograms to one category
+      - since / until: YYYY-MM-DD bounds for the histograms (until is exclusive)
+    """
+    if not check_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    spec, error = parse_stats_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        conn = get_db_connection(read_only=True)
+        if not conn:
+            return jsonify({"error": "Database connection failed"}), 500
+        cursor = conn.cursor()
+        with timed_phase("query"):
+            cursor.execute(STATS_CATEGORY_SQL)
+            category_rows = cursor.fetchall()
+            cursor.execute(*build_stats_histogram_query(spec))
+            day_rows = cursor.fetchall()
+        cursor.close()
+        release_db_connection(conn)
+
+        return jsonify(build_stats_payload(spec, category_rows, day_rows, STATS_TZ)), 200
+
+    except Exception as e:
+        logging.error(f"❌ ERROR in /stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+###############################################################################
+#                             CHANGE FEED                                      #
+###############################################################################
+
+CHANGES_NOTIFY_CHANNEL = "memory_change_feed"
+
+# One row per memory written, appended by statement-level triggers in the writing
+# transaction, which txid records. Postgres delivers the NOTIFY on commit and drops
+# it on rollback; it only wakes the feed, which then reads every change committed
+# since its last snapshot (see ChangeSnapshot).
+MEMORY_CHANGE_LOG_SQL = f"""
+    CREATE TABLE IF NOT EXISTS memory_change_log (
+        seq BIGSERIAL PRIMARY KEY,
+        txid BIGINT NOT NULL DEFAULT txid_current(),
+        op TEXT NOT NULL,
+        memory_id INTEGER,
+        changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    CREATE INDEX IF NOT EXISTS idx_memory_change_log_txid ON memory_change_log (txid);
+    CREATE INDEX IF NOT EXISTS idx_memory_change_log_changed_at ON memory_change_log (changed_at);
+
+    CREATE OR REPLACE FUNCTION memory_change_log_append(change_op TEXT, ids INTEGER[]) RETURNS void AS $$
+    BEGIN
+        IF cardinality(ids) > 0 THEN
+            INSERT INTO memory_change_log (op, memory_id) SELECT change_op, id FROM unnest(ids) AS u(id);
+            -- Repeated in one transaction, Postgres delivers a single notification
+            PERFORM pg_notify('{CHANGES_NOTIFY_CHANNEL}', txid_current()::text);
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION memory_change_log_after_insert() RETURNS trigger AS $$
+    BEGIN
+        PERFORM memory_change_log_append('insert', (SELECT array_agg(id ORDER BY id) FROM new_rows));
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION memory_change_log_after_update() RETURNS trigger AS $$
+    BEGIN
+        -- Same rule as updated_at: embedding backfills and no-op edits are not changes
+        PERFORM memory_change_log_append('update', (
+            SELECT array_agg(n.id ORDER BY n.id)
+            FROM old_rows o JOIN new_rows n ON n.id = o.id
+            WHERE (n.title, n.details, n.categories, n.timestamp)
+                  IS DISTINCT FROM (o.title, o.details, o.categories, o.timestamp)));
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION memory_change_log_after_delete() RETURNS trigger AS $$
+    BEGIN
+        PERFORM memory_change_log_append('delete', (SELECT array_agg(id ORDER BY id) FROM old_rows));
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION memory_change_log_after_truncate() RETURNS trigger AS $$
+    BEGIN
+        PERFORM memory_change_log_append('truncate', ARRAY[NULL]::integer[]);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS memory_change_log_insert ON memory;
+    CREATE TRIGGER memory_change_log_insert AFTER INSERT ON memory
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION memory_change_log_after_insert();
+    DROP TRIGGER IF EXISTS memory_change_log_update ON memory;
+    CREATE TRIGGER memory_change_log_update AFTER UPDATE ON memory
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION memory_change_log_after_update();
+    DROP TRIGGER IF EXISTS memory_change_log_delete ON memory;
+    CREATE TRIGGER memory_change_log_delete AFTER DELETE ON memory
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION memory_change_log_after_delete();
+    DROP TRIGGER IF EXISTS memory_change_log_truncate ON memory;
+    CREATE TRIGGER memory_change_log_truncate AFTER TRUNCATE ON memory
+        FOR EACH STATEMENT EXECUTE FUNCTION memory_change_log_after_truncate();
+"""
+
+# Oldest retained seq (NULL when empty) and the highest seq handed out so far
+CHANGE_LOG_BOUNDS_SQL = """
+    SELECT (SELECT MIN(seq) FROM memory_change_log),
+           (SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM memory_change_log_seq_seq)
+"""
+
+# Prunes whole transactions: everything below one txid goes, and since that is at
+# most the oldest running transaction, nothing below it can still commit. So no
+# change a resume position has not seen is lost while it is >= MIN(txid) (see
+# replay_changes). The newest transaction is kept past CHANGES_RETENTION, which
+# leaves MIN(txid) to show where the log starts.
+CHANGE_LOG_PRUNE_SQL = """
+    DELETE FROM memory_change_log WHERE txid < LEAST(
+        (SELECT MIN(txid) FROM memory_change_log WHERE changed_at >= now() - make_interval(secs => %s)),
+        (SELECT MAX(txid) FROM memory_change_log),
+        pg_snapshot_xmin(pg_current_snapshot())::text::bigint)"""
+
+CHANGE_SNAPSHOT_SQL = "SELECT pg_current_snapshot()::text"
+
+# Changes of the transactions the %(since)s snapshot had not seen finish;
+# txid >= its xmin narrows the scan, as every older transaction had
+CHANGE_LOG_SINCE_CONDITION = """
+    c.txid >= %(xmin)s AND NOT pg_visible_in_snapshot(c.txid::text::xid8, %(since)s::pg_snapshot)"""
+
+# Fields of the memory JSON sent with insert and update events
+CHANGE_MEMORY_FIELDS = ("categories", "details", "id", "timestamp", "title")
+
+CHANGES_STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+class ChangeSnapshot(namedtuple("ChangeSnapshot", "xmin xmax xip")):
+    """
+    A /changes resume position: the pg_current_snapshot() the changes sent so far
+    were read at, as text xmin:xmax:xip,... (the SSE event id). Every transaction
+    it sees as finished has been sent and no other, so resuming sends exactly the
+    changes committed since, however long their transactions ran.
+    """
+
+    PATTERN = re.compile(r"(\d+):(\d+):((?:\d+(?:,\d+)*)?)")
+
+    @classmethod
+    def parse(cls, text):
+        """The snapshot written as `text`, or None if it is not a valid one."""
+        match = cls.PATTERN.fullmatch(text)
+        if not match:
+            return None
+        xmin, xmax = int(match.group(1)), int(match.group(2))
+        xip = frozenset(int(txid) for txid in match.group(3).split(",") if txid)
+        if not 0 < xmin <= xmax or any(not xmin <= txid < xmax for txid in xip):
+            return None
+        return cls(xmin, xmax, xip)
+
+    def __str__(self):
+        return f"{self.xmin}:{self.xmax}:{','.join(str(txid) for txid in sorted(self.xip))}"
+
+    def visible(self, txid):
+        """Whether transaction `txid` had finished when the snapshot was taken."""
+        return txid < self.xmin or (txid < self.xmax and txid not in self.xip)
+
+    def includes(self, other):
+        """Whether every transaction finished in `other` had finished here too."""
+        return other.xmax <= self.xmax and not any(other.visible(txid) for txid in self.xip)
+
+
+# The position of a client that has seen nothing; stands in for the plain seq ids
+# /changes used to send, which can't tell what a client has missed
+CHANGE_LOG_START = ChangeSnapshot(1, 1, frozenset())
+
+# A live batch: the changes committed after the feed's snapshot `start` up to `end`
+ChangeBatch = namedtuple("ChangeBatch", "start end events")
+
+
+def change_log_query(condition):
+    """
+    memory_change_log rows matching `condition` as (seq, txid, op, memory_id,
+    memory_json), in seq order. memory_json is the memory's current API JSON for
+    inserts and updates (NULL once it has been deleted); run with the display
+    time zone set.
+    """
+    memory_json = ", ".join(f"'{key}', {RECALL_JSON_VALUES[key]}" for key in CHANGE_MEMORY_FIELDS)
+    return f"""
+        SELECT c.seq, c.txid, c.op, c.memory_id,
+               CASE WHEN m.id IS NOT NULL THEN json_build_object({memory_json})::text END AS memory_json
+        FROM memory_change_log AS c
+        LEFT JOIN memory AS m ON m.id = c.memory_id AND c.op IN ('insert', 'update')
+        WHERE {condition}
+        ORDER BY c.seq"""
+
+
+def change_log_since_query(limit=False):
+    """
+    The changes committed after %(since)s (up to %(limit)s of them) in one
+    statement with the snapshot it reads at and the oldest retained txid, as
+    (snapshot, oldest txid, *change_log_query row); a single row of NULL
+    changes when there are none.
+    """
+    changes = change_log_query(CHANGE_LOG_SINCE_CONDITION) + (" LIMIT %(limit)s" if limit else "")
+    return f"""
+        SELECT pg_current_snapshot()::text, (SELECT MIN(txid) FROM memory_change_log), c.*
+        FROM (SELECT 1) AS one LEFT JOIN ({changes}) AS c ON true
+        ORDER BY c.seq"""
+
+
+def change_event(row):
+    """A change_log_query row as a (txid, event, data) SSE event."""
+    _, txid, op, memory_id, memory_json = row
+    if memory_json is None:
+        memory_json = json.dumps({"id": memory_id}) if memory_id is not None else "{}"
+    return txid, op, memory_json
+
+
+def format_sse(event_id, event, data):
+    """One Server-Sent Events frame (without an id line when event_id is None); data is single-line JSON."""
+    id_line = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{id_line}event: {event}\ndata: {data}\n\n"
+
+
+def change_frames(events, position):
+    """
+    The frames of a batch of events. Only the last carries the position after
+    the batch, so a client cut off mid-batch resumes from before it and gets it whole.
+    """
+    return [format_sse(position if index == len(events) - 1 else None, op, data)
+            for index, (_, op, data) in enumerate(events)]
+
+
+def parse_changes_since(headers, args):
+    """The resume position of a /changes request as (ChangeSnapshot or None, error)."""
+    # EventSource reconnects to the same URL, so its Last-Event-ID beats ?since=
+    value = headers.get("Last-Event-ID") or args.get("since")
+    if not value:
+        return None, None
+    if value.isdigit():
+        return CHANGE_LOG_START, None
+    since = ChangeSnapshot.parse(value)
+    if since is None:
+        return None, "since (or Last-Event-ID) must be a /changes event id"
+    return since, None
+
+
+def replay_changes(since, limit=CHANGES_REPLAY_MAX):
+    """
+    Changes committed after the `since` position as (events, position, reset),
+    position being the snapshot they were read at. reset is True when replay
+    cannot bring the client up to date: changes it has not seen were pruned,
+    there are more than `limit` of them, or `since` is ahead of the database
+    (e.g. a restored one). Without `since` nothing is replayed.
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Database connection failed")
+    cursor = conn.cursor()
+    try:
+        with timed_phase("query"):
+            if since is None:
+                cursor.execute(CHANGE_SNAPSHOT_SQL)
+                return [], ChangeSnapshot.parse(cursor.fetchone()[0]), False
+            cursor.execute(RECALL_JSON_TIMEZONE_SQL)
+            cursor.execute(change_log_since_query(limit=True),
+                           {"since": str(since), "xmin": since.xmin, "limit": limit + 1})
+            rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+    position, oldest = ChangeSnapshot.parse(rows[0][0]), rows[0][1]
+    events = [change_event(row[2:]) for row in rows if row[2] is not None]
+    if since.xmax > position.xmax or (oldest is not None and since.xmin < oldest) or len(events) > limit:
+        return [], position, True
+    return events, position, False
+
+
+def changes_preamble(events, position, reset):
+    """
+    The frames opening a /changes stream: the reconnect delay, then either a
+    `reset` or the replayed events followed by `ready`. Both carry the position
+    the client resumes from.
+    """
+    frames = [f"retry: {CHANGES_RETRY_MS}\n\n"]
+    if reset:
+        frames.append(format_sse(position, "reset", json.dumps({"position": str(position)})))
+        return frames
+    frames += change_frames(events, None)
+    frames.append(format_sse(position, "ready", json.dumps({"position": str(position), "replayed": len(events)})))
+    return frames
+
+
+class ChangeSubscription:
+    """
+    One /changes client's bounded queue of event batches. A client that falls
+    CHANGES_QUEUE_SIZE batches behind, or that may have missed events, is marked
+    lagged; its stream then ends and the client resumes from its last id.
+    """
+
+    def __init__(self, maxsize=CHANGES_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize)
+        self.lagged = False
+        self.replayed_at = self.position = None
+
+    def push(self, batch):
+        """Queue a ChangeBatch (None: events may have been missed); False once lagged."""
+        if batch is None:
+            self.lagged = True
+        try:
+            self.queue.put_nowait(batch)
+        except queue.Full:
+            self.lagged = True
+        return not self.lagged
+
+    def start(self, position):
+        """Send live batches from `position`, where the stream's replay read up to."""
+        self.replayed_at = self.position = position
+
+    def frames(self, batch):
+        """
+        The frames of a live batch, less the events replay already sent. A batch
+        starting past this stream's position (the feed's first snapshot can be
+        newer than the replay's) may lack changes committed in between, so the
+        subscription lags instead.
+        """
+        if not self.position.includes(batch.start):
+            self.lagged = True
+            return []
+        self.position = batch.end
+        return change_frames([event for event in batch.events if not self.replayed_at.visible(event[0])], batch.end)
+
+
+class ChangeFeed:
+    """
+    Fans one LISTEN connection out to every /changes subscriber in this process.
+
+    Each notification follows a commit: the memory_change_log rows committed
+    since the feed's last snapshot, with the memories' current JSON, are read
+    once and pushed to all subscribers as a ChangeBatch, so N streaming clients
+    cost one connection and one query per write. The same thread prunes log rows
+    older than CHANGES_RETENTION. If the connection drops, subscribers are made
+    to resume, since notifications may have been missed.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._snapshot = None
+        self.counters = {"notifications": 0, "events": 0, "lagged_subscribers": 0, "pruned": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and DATABASE_URL:
+                self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+                self._thread.start()
+
+    def subscribe(self, subscription):
+        self.start()
+        with self._lock:
+            self._subscribers.add(subscription)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["subscribers"] = len(self._subscribers)
+        return stats
+
+    def _run(self):
+        backoff = 1
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(DATABASE_URL, connect_timeout=DB_CONNECT_TIMEOUT)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"SET TIME ZONE '{DISPLAY_TIMEZONE}'")
+                    cursor.execute(f"LISTEN {CHANGES_NOTIFY_CHANNEL}")
+                    cursor.execute(CHANGE_SNAPSHOT_SQL)
+                    self._snapshot = ChangeSnapshot.parse(cursor.fetchone()[0])
+                backoff = 1
+                prune_at = 0
+                while True:
+                    if time.monotonic() >= prune_at:
+                        self._prune(conn)
+                        prune_at = time.monotonic() + CHANGES_PRUNE_INTERVAL
+                    if select.select([conn], [], [], min(30, CHANGES_PRUNE_INTERVAL)) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        self._publish(conn, len(conn.notifies))
+                        conn.notifies.clear()
+            except Exception as e:
+                logging.warning(f"⚠️ Change feed disconnected, subscribers will resume: {str(e).strip()}")
+                self._broadcast(None)
+                if conn is not None:
+                    conn.close()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def _publish(self, conn, notifications):
+        self.counters["notifications"] += notifications
+        with conn.cursor() as cursor:
+            if not self._subscribers:
+                # Nobody is streaming (clients that connect later replay from the log); just move on
+                cursor.execute(CHANGE_SNAPSHOT_SQL)
+                self._snapshot = ChangeSnapshot.parse(cursor.fetchone()[0])
+                return
+            cursor.execute(change_log_since_query(), {"since": str(self._snapshot), "xmin": self._snapshot.xmin})
+            rows = cursor.fetchall()
+        batch = ChangeBatch(self._snapshot, ChangeSnapshot.parse(rows[0][0]),
+                            [change_event(row[2:]) for row in rows if row[2] is not None])
+        self._snapshot = batch.end
+        if batch.events:
+            self.counters["events"] += len(batch.events)
+            self._broadcast(batch)
+
+    def _broadcast(self, batch):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                delivered = subscription.push(batch)
+            except RuntimeError:  # an asgi subscriber whose event loop has closed
+                delivered = False
+            if not delivered:
+                self.unsubscribe(subscription)
+                self.counters["lagged_subscribers"] += 1
+
+    def _prune(self, conn):
+        with conn.cursor() as cursor:
+            cursor.execute(CHANGE_LOG_PRUNE_SQL, (CHANGES_RETENTION,))
+            self.counters["pruned"] += cursor.rowcount
+
+
+change_feed = ChangeFeed()
+
+
+@app.route("/changes", methods=["GET"])
+def changes_stream():
+    """
+    Stream memory changes as Server-Sent Events instead of polling /recall-or-search.
+
+    Events are `insert` and `update` (data: the memory's current JSON), `delete`
+    (data: {"id": ...}) and `truncate`. The last event of each batch carries the
+    position to resume from as its id (see ChangeSnapshot). After a disconnect the
+    client resumes with Last-Event-ID (EventSource sends it) or ?since=<id>, and
+    exactly the changes committed since are replayed first; `ready` ends the
+    replay. `reset` means replay is impossible: refetch, then carry on from its id.
+    Here each open stream holds a worker thread; asgi_app serves many more.
+    """
+    if not check_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    since, error = parse_changes_since(request.headers, request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # Subscribe before replaying, so a change committed in between is not lost
+    subscription = ChangeSubscription()
+    change_feed.subscribe(subscription)
+    try:
+        events, position, reset = replay_changes(since)
+    except Exception as e:
+        change_feed.unsubscribe(subscription)
+        logging.error(f"❌ ERROR in /changes: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    subscription.start(position)
+
+    def stream():
+        try:
+            yield from changes_preamble(events, position, reset)
+            while True:
+                try:
+                    batch = subscription.queue.get(timeout=CHANGES_HEARTBEAT)
+                except queue.Empty:
+                    batch = None
+                frames = subscription.frames(batch) if batch else []
+                if subscription.lagged:
+                    return
+                yield "".join(frames) if frames else ": keepalive\n\n"
+        finally:
+            change_feed.unsubscribe(subscription)
+
+    return Response(stream(), mimetype="text/event-stream", headers=CHANGES_STREAM_HEADERS)
+
+###############################################################################
+#                             INIT DB                                         #
+###############################################################################
+
+class MigrationError(RuntimeError):
+    """Raised when the schema cannot be brought up to date; the service must not start."""
+
+
+# Transactional migrations run as one transaction. The others run statement by
+# statement in autocommit mode, which CREATE INDEX CONCURRENTLY needs so index
+# builds don't block writes. An optional migration that fails (e.g. pg_trgm
+# without privileges) is logged and retried on the next start.
+Migration = namedtuple("Migration", "version name statements transactional optional")
+
+# Every statement is idempotent, so databases created before schema_version
+# existed are adopted by running the whole list once. Append new migrations;
+# never edit one that has shipped.
+MIGRATIONS = [
+    Migration(1, "memory table and category enum", ["""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'memory_category') THEN
+                CREATE TYPE memory_category AS ENUM (
+                    'work_and_military',
+                    'personal_growth',
+                    'adventure_and_travel',
+                    'hobbies_and_interests',
+                    'romantic_relationships',
+                    'friends_and_family',
+                    'upbringing_and_lore',
+                    'infobuddy_relationship',
+                    'infobuddy_technical',
+                    'miscellaneous'
+                );
+            END IF;
+        END $$;
+
+        CREATE TABLE IF NOT EXISTS memory (
+            id SERIAL PRIMARY KEY,
+            title TEXT NOT NULL,
+            details JSONB,
+            categories memory_category[] NOT NULL,
+            timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        );
+    """], True, False),
+    Migration(2, "title, category and timestamp indexes", [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_title ON memory (title)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_categories ON memory USING gin (categories)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_timestamp ON memory (timestamp)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_timestamp_id ON memory (timestamp, id)",
+    ], False, False),
+    # updated_at tracks the last modification (used by /export?updated_since=)
+    Migration(3, "updated_at column and trigger", ["""
+        ALTER TABLE memory ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP;
+
+        CREATE OR REPLACE FUNCTION memory_touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            -- Only content changes count (not e.g. embedding backfills)
+            IF ROW(NEW.title, NEW.details, NEW.categories, NEW.timestamp)
+               IS DISTINCT FROM ROW(OLD.title, OLD.details, OLD.categories, OLD.timestamp) THEN
+                NEW.updated_at := CURRENT_TIMESTAMP;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS memory_touch_updated_at ON memory;
+        CREATE TRIGGER memory_touch_updated_at BEFORE UPDATE ON memory
+            FOR EACH ROW EXECUTE FUNCTION memory_touch_updated_at();
+    """], True, False),
+    # Semantic recall: float32 embedding bytes, stamped by trigger so the
+    # in-process EmbeddingIndex can sync incrementally
+    Migration(4, "embedding columns and trigger", ["""
+        ALTER TABLE memory ADD COLUMN IF NOT EXISTS embedding BYTEA;
+        ALTER TABLE memory ADD COLUMN IF NOT EXISTS embedded_at TIMESTAMPTZ;
+
+        CREATE OR REPLACE FUNCTION memory_stamp_embedding() RETURNS trigger AS $$
+        BEGIN
+            NEW.embedded_at := CASE WHEN NEW.embedding IS NULL THEN NULL ELSE clock_timestamp() END;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS memory_stamp_embedding ON memory;
+        CREATE TRIGGER memory_stamp_embedding BEFORE INSERT OR UPDATE OF embedding ON memory
+            FOR EACH ROW EXECUTE FUNCTION memory_stamp_embedding();
+    """], True, False),
+    # Full-text search: title weighted above details text. Adding a stored
+    # generated column rewrites the table, so it cannot avoid a lock.
+    Migration(5, "full-text search vector", ["""
+        ALTER TABLE memory ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(details->>'text', '')), 'B')
+            ) STORED;
+    """], True, False),
+    Migration(6, "updated_at, embedded_at and search_vector indexes", [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_updated_at ON memory (updated_at)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_embedded_at ON memory (embedded_at)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_search_vector ON memory USING gin (search_vector)",
+    ], False, False),
+    # Trigram indexes serve both substring (ILIKE) and fuzzy searches.
+    # pg_trgm may need elevated privileges, so both are optional.
+    Migration(7, "pg_trgm extension", ["CREATE EXTENSION IF NOT EXISTS pg_trgm"], True, True),
+    Migration(8, "trigram indexes", [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_title_trgm ON memory USING gin (title gin_trgm_ops)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_details_trgm "
+        "ON memory USING gin ((details->>'text') gin_trgm_ops)",
+    ], False, True),
+    # Rebuilt from scratch in the same transaction that installs the triggers,
+    # which blocks writes until commit, so no write slips in between
+    Migration(9, "memory_stats_daily summary and store version", [
+        MEMORY_STATS_SQL,
+        "DELETE FROM memory_stats_daily",
+        MEMORY_STATS_BACKFILL_SQL,
+    ], True, False),
+    # Feeds GET /changes; installed with its triggers so no committed write goes unlogged
+    Migration(10, "memory_change_log feed and triggers", [MEMORY_CHANGE_LOG_SQL], True, False),
+    # Owner key for sharded storage (see SHARDING). Writes to an owner listed in
+    # memory_owner_moved fail, so a process with stale placements cannot write to
+    # the shard an owner has left; the mover sets infobuddy.owner_mover to pass.
+    Migration(11, "memory owner column, shard placement and moved-owner guard", ["""
+        ALTER TABLE memory ADD COLUMN IF NOT EXISTS owner TEXT NOT NULL DEFAULT 'default';
+
+        CREATE TABLE IF NOT EXISTS memory_owner_shards (
+            owner TEXT PRIMARY KEY,
+            shard TEXT NOT NULL,
+            placed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE TABLE IF NOT EXISTS memory_owner_moved (
+            owner TEXT PRIMARY KEY,
+            shard TEXT NOT NULL,
+            moved_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+
+        CREATE OR REPLACE FUNCTION memory_owner_guard() RETURNS trigger AS $$
+        DECLARE
+            moved TEXT;
+        BEGIN
+            IF current_setting('infobuddy.owner_mover', true) = 'on'
+               OR NOT EXISTS (SELECT 1 FROM memory_owner_moved) THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'DELETE' THEN
+                SELECT m.owner INTO moved FROM old_rows o JOIN memory_owner_moved m ON m.owner = o.owner LIMIT 1;
+            ELSE
+                SELECT m.owner INTO moved FROM new_rows n JOIN memory_owner_moved m ON m.owner = n.owner LIMIT 1;
+            END IF;
+            IF moved IS NOT NULL THEN
+                RAISE EXCEPTION 'owner % has moved to another shard', moved
+                    USING ERRCODE = 'object_not_in_prerequisite_state';
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS memory_owner_guard_insert ON memory;
+        CREATE TRIGGER memory_owner_guard_insert AFTER INSERT ON memory
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION memory_owner_guard();
+        DROP TRIGGER IF EXISTS memory_owner_guard_update ON memory;
+        CREATE TRIGGER memory_owner_guard_update AFTER UPDATE ON memory
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION memory_owner_guard();
+        DROP TRIGGER IF EXISTS memory_owner_guard_delete ON memory;
+        CREATE TRIGGER memory_owner_guard_delete AFTER DELETE ON memory
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION memory_owner_guard();
+    """], True, False),
+    Migration(12, "owner index", [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_owner_timestamp_id ON memory (owner, timestamp, id)",
+    ], False, False),
+    # Content hash of the normalized title and details, kept by trigger so every
+    # write path (inserts, edits, the write buffer, shard moves) stamps it. Rows
+    # stored before this stay NULL until `python main.py dedupe` hashes them.
+    Migration(13, "content hash and idempotency keys", ["""
+        CREATE OR REPLACE FUNCTION memory_content_hash(title TEXT, details JSONB) RETURNS TEXT AS $$
+            SELECT md5(lower(regexp_replace(btrim(title), '\\s+', ' ', 'g')) || chr(31) ||
+                       lower(regexp_replace(btrim(COALESCE(details->>'text', details::text, '')), '\\s+', ' ', 'g')))
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+        ALTER TABLE memory ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+        CREATE OR REPLACE FUNCTION memory_stamp_content_hash() RETURNS trigger AS $$
+        BEGIN
+            NEW.content_hash := memory_content_hash(NEW.title, NEW.details);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS memory_stamp_content_hash ON memory;
+        CREATE TRIGGER memory_stamp_content_hash BEFORE INSERT OR UPDATE OF title, details ON memory
+            FOR EACH ROW EXECUTE FUNCTION memory_stamp_content_hash();
+
+        CREATE TABLE IF NOT EXISTS memory_idempotency (
+            key TEXT PRIMARY KEY,
+            request_hash TEXT NOT NULL,
+            status SMALLINT NOT NULL,
+            body TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS idx_memory_idempotency_created_at ON memory_idempotency (created_at);
+    """], True, False),
+    # The arbiter index of build_insert_query. Only rows written since migration
+    # 13 are hashed yet; duplicates among them (normally none) stop the migration
+    # until `python main.py dedupe` has folded them.
+    Migration(14, "unique content hash index", [
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM memory WHERE content_hash IS NOT NULL
+                       GROUP BY owner, content_hash HAVING COUNT(*) > 1) THEN
+                RAISE EXCEPTION 'duplicate memories share a content hash; run `python main.py dedupe` first'
+                    USING ERRCODE = 'unique_violation';
+            END IF;
+        END $$
+        """,
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_owner_content_hash ON memory (owner, content_hash)",
+    ], False, False),
+]
+
+# Serializes migrations between processes starting at the same time
+MIGRATION_LOCK_ID = 0x6d656d6f
+MIGRATION_LOCK_TIMEOUT = float(os.getenv("MIGRATION_LOCK_TIMEOUT", "600"))
+
+_CONCURRENT_INDEX_NAME = re.compile(r"INDEX CONCURRENTLY IF NOT EXISTS (\w+)")
+
+
+def applied_migrations(cursor):
+    """Versions recorded in schema_version (empty before the first migration run)."""
+    cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        return set()
+    cursor.execute("SELECT version FROM schema_version")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _apply_migration(conn, cursor, migration):
+    if migration.transactional:
+        conn.autocommit = False
+        try:
+            for statement in migration.statements:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                           (migration.version, migration.name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+        return
+
+    for statement in migration.statements:
+        # An interrupted concurrent build leaves an INVALID index that IF NOT EXISTS would keep
+        match = _CONCURRENT_INDEX_NAME.search(statement)
+        if match:
+            cursor.execute("""
+                SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(%s) AND NOT indisvalid
+            """, (match.group(1),))
+            if cursor.fetchone():
+                cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}")
+        cursor.execute(statement)
+    cursor.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                   (migration.version, migration.name))
+
+
+def migrate(conn):
+    """
+    Apply pending MIGRATIONS in order under an advisory lock. Returns the
+    versions applied. Raises MigrationError if a required migration fails.
+    """
+    conn.autocommit = True
+    cursor = conn.cursor()
+    # Poll rather than block in pg_advisory_lock(): a session waiting inside a
+    # statement holds a snapshot, which CREATE INDEX CONCURRENTLY would wait on
+    deadline = time.monotonic() + MIGRATION_LOCK_TIMEOUT
+    while True:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        if cursor.fetchone()[0]:
+            break
+        if time.monotonic() > deadline:
+            raise MigrationError("Timed out waiting for another process to finish migrating")
+        time.sleep(0.5)
+    applied = []
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # Another process may have migrated while we waited for the lock
+        done = applied_migrations(cursor)
+        for migration in MIGRATIONS:
+            if migration.version in done:
+                continue
+            started = time.perf_counter()
+            try:
+                _apply_migration(conn, cursor, migration)
+            except psycopg2.Error as e:
+                if not migration.optional:
+                    raise MigrationError(f"Migration {migration.version} ({migration.name}) failed: "
+                                         f"{str(e).strip()}") from e
+                logging.warning(f"⚠️ Optional migration {migration.version} ({migration.name}) "
+                                f"skipped: {str(e).strip()}")
+                continue
+            applied.append(migration.version)
+            logging.info(f"🛠️ Applied migration {migration.version} ({migration.name}) "
+                         f"in {(time.perf_counter() - started) * 1000:.0f}ms")
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        cursor.close()
+    return applied
+
+
+def safe_init_db():
+    """
+    Bring the schema up to date, preserving existing data.
+
+    When every migration is already recorded in schema_version this costs two
+    catalog lookups and the summary-table count. Raises MigrationError when the
+    database is unreachable or a required migration fails, so a misconfigured
+    worker stops instead of serving errors. With STORAGE_BACKEND=sqlite this
+    creates the SQLite schema instead (see SqliteMemoryStore.migrate); with
+    sharded it migrates every shard in SHARD_URLS.
+    """
+    started = time.perf_counter()
+    if STORAGE_BACKEND not in STORAGE_BACKENDS:
+        raise MigrationError(f"Invalid STORAGE_BACKEND '{STORAGE_BACKEND}'. Must be one of: {list(STORAGE_BACKENDS)}")
+    if DUPLICATE_POLICY not in DUPLICATE_POLICIES:
+        raise MigrationError(f"Invalid DUPLICATE_POLICY '{DUPLICATE_POLICY}'. Must be one of: {list(DUPLICATE_POLICIES)}")
+    if STORAGE_BACKEND == "sqlite":
+        store = get_memory_store()
+        try:
+            if store.migrate():
+                logging.info(f"🛠️ Created SQLite schema in {SQLITE_PATH}")
+            else:
+                logging.info("✅ Schema is current, no migrations to run.")
+            logging.info(f"📊 Current record count in memory table: {store.count()}")
+        except Exception as e:
+            raise MigrationError(f"SQLite initialization failed: {str(e).strip()}") from e
+        startup_timings["init_db"] = time.perf_counter() - started
+        return
+    if STORAGE_BACKEND == "sharded":
+        if not SHARD_URLS:
+            raise MigrationError("SHARD_URLS is not set")
+        if len(SHARD_URLS) > SHARD_ID_STRIDE:
+            raise MigrationError(f"At most {SHARD_ID_STRIDE} shards are supported")
+        for index, url in enumerate(SHARD_URLS):
+            _init_postgres(url, f"shard{index}")
+    else:
+        if not DATABASE_URL:
+            raise MigrationError("DATABASE_URL is not set")
+        _init_postgres(DATABASE_URL)
+    startup_timings["init_db"] = time.perf_counter() - started
+
+
+def _init_postgres(dsn, label=None):
+    """Migrate one Postgres database and log its record count."""
+    where = f" on {label}" if label else ""
+    try:
+        conn = psycopg2.connect(dsn, connect_timeout=DB_CONNECT_TIMEOUT)
+    except psycopg2.Error as e:
+        raise MigrationError(f"Database unreachable{where}: {str(e).strip()}") from e
+
+    try:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        pending = [m.version for m in MIGRATIONS if m.version not in applied_migrations(cursor)]
+        if pending:
+            logging.info(f"🛠️ Schema migrations pending{where}: {pending}")
+            migrate(conn)
+        else:
+            logging.info(f"✅ Schema is current{where}, no migrations to run.")
+
+        # Log current record count (from the summary, not a full scan)
+        cursor.execute(STATS_TOTAL_SQL)
+        count = cursor.fetchone()[0]
+        logging.info(f"📊 Current record count in memory table{where}: {count}")
+        cursor.close()
+    except psycopg2.Error as e:
+        raise MigrationError(f"Database initialization failed{where}: {str(e).strip()}") from e
+    finally:
+        conn.close()
+
+###############################################################################
+#                             STARTUP                                          #
+###############################################################################
+
+# Seconds spent importing this module and in safe_init_db (see log_startup_ready)
+startup_timings = {}
+
+
+def log_startup_ready():
+    """Log how long this process took to become ready and warn past STARTUP_TARGET_SECONDS."""
+    total = sum(startup_timings.values())
+    breakdown = ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in startup_timings.items())
+    if total > STARTUP_TARGET_SECONDS:
+        logging.warning(f"🐢 Ready in {total * 1000:.0f}ms ({breakdown}), "
+                        f"over the {STARTUP_TARGET_SECONDS * 1000:.0f}ms target")
+    else:
+        logging.info(f"🚀 Ready in {total * 1000:.0f}ms ({breakdown})")
+
+
+###############################################################################
+#                             STREAMING EXPORT                                 #
+###############################################################################
+
+EXPORT_FORMATS = ("ndjson", "json")
+
+
+def build_export_query(category=None, since=None, until=None, updated_since=None):
+    """Build the SELECT used by exports and snapshots, ordered by primary key."""
+    conditions = []
+    params = []
+    if category:
+        conditions.append("categories @> ARRAY[%s]::memory_category[]")
+        params.append(category)
+    if since:
+        conditions.append("timestamp >= %s")
+        params.append(since)
+    if until:
+        conditions.append("timestamp < %s")
+        params.append(until)
+    if updated_since:
+        conditions.append("updated_at >= %s")
+        params.append(updated_since)
+
+    query = """
+        SELECT id, title, details, categories::text[], timestamp, updated_at
+        FROM memory"""
+    if conditions:
+        query += """
+        WHERE """ + " AND ".join(conditions)
+    query += """
+        ORDER BY id"""
+    return query, params
+
+
+def iter_export_records(itersize=None, **filters):
+    """
+    Yield backup-shaped memory records using a named (server-side) cursor.
+
+    Only `itersize` rows are held in memory at a time regardless of table size.
+    The connection is checked out when iteration starts and released when the
+    generator finishes or is closed (e.g. when an export client disconnects).
+    """
+    query, params = build_export_query(**filters)
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Database connection failed")
+    try:
+        cursor = conn.cursor(name=f"memory_export_{uuid.uuid4().hex}")
+        cursor.itersize = itersize or EXPORT_ITERSIZE
+        cursor.execute(query, params)
+        for row in cursor:
+            yield _memory_row_to_backup(row)
+        cursor.close()
+    finally:
+        conn.rollback()
+        release_db_connection(conn)
+
+
+def stream_export(records, fmt="ndjson", chunk_size=65536):
+    """Serialize records as NDJSON or as one JSON array, yielding ~chunk_size text chunks."""
+    buffer = []
+    buffered = 0
+    if fmt == "json":
+        buffer.append("[")
+    separator = "\n" if fmt == "ndjson" else ",\n"
+    first = True
+    for record in records:
+        line = json.dumps(record)
+        if fmt == "ndjson":
+            line += separator
+        elif not first:
+            line = separator + line
+        first = False
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= chunk_size:
+            yield "".join(buffer)
+            buffer = []
+            buffered = 0
+    if fmt == "json":
+        buffer.append("]\n")
+    if buffer:
+        yield "".join(buffer)
+
+
+def parse_export_filters(args):
+    """
+    Validate export filters from a mapping of strings (request args or CLI options).
+    Returns (filters, error) where error is a message or None.
+    """
+    filters = {}
+    category = (args.get("category") or "").strip()
+    if category:
+        if category not in CATEGORY_SET:
+            return None, f"Invalid category '{category}'"
+        filters["category"] = category
+    for name in ("since", "until", "updated_since"):
+        raw = (args.get(name) or "").strip()
+        if raw:
+            try:
+                filters[name] = datetime.fromisoformat(raw)
+            except ValueError:
+                return None, f"Invalid {name} timestamp format"
+    return filters, None
+
+
+@app.route("/export", methods=["GET"])
+def export_memories():
+    """
+    Stream memories as NDJSON (default) or a JSON array.
+
+    Query parameters:
+      - format: ndjson or json
+      - category: only memories in this category
+      - since / until: ISO timestamps bounding the memory timestamp
+      - updated_since: ISO timestamp; only memories modified at or after it
+      - itersize: rows fetched per server-side cursor round trip
+    """
+    if not check_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    fmt = request.args.get("format", "ndjson").strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Invalid format '{fmt}'. Must be one of: {list(EXPORT_FORMATS)}"}), 400
+
+    filters, error = parse_export_filters(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        itersize = max(100, min(int(request.args.get("itersize", EXPORT_ITERSIZE)), 50000))
+    except ValueError:
+        return jsonify({"error": "itersize must be an integer"}), 400
+
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return Response(stream_export(iter_export_records(itersize=itersize, **filters), fmt=fmt),
+                    mimetype=mimetype)
+
+###############################################################################
+#                             BACKUP FUNCTIONS                                 #
+###############################################################################
+
+def _backup_stamp():
+    return datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+
+
+def _memory_row_to_backup(row):
+    """Convert an (id, title, details, categories, timestamp, updated_at) row into a backup record."""
+    return {
+        "id": row[0],
+        "title": row[1],
+        "details": row[2],
+        "categories": row[3],
+        "timestamp": row[4].isoformat() if row[4] else None,
+        "updated_at": row[5].isoformat() if len(row) > 5 and row[5] else None
+    }
+
+
+def backup_database():
+    """
+    Write a full JSON snapshot of all memories.
+
+    Snapshots are the compaction points of the backup subsystem: restoring means
+    loading the newest snapshot and replaying the change logs written after it.
+    Rows are streamed through the export writer, so memory use stays flat.
+    """
+    try:
+        # Create backups directory if it doesn't exist
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+
+        # Write to a temporary file first so a crash never leaves a truncated snapshot
+        backup_file = os.path.join(BACKUP_DIR, f"memory_backup_{_backup_stamp()}.json")
+        with open(backup_file + ".tmp", "w") as f:
+            for chunk in stream_export(iter_export_records(), fmt="json"):
+                f.write(chunk)
+        os.replace(backup_file + ".tmp", backup_file)
+
+        logging.info(f"✅ Backup created successfully: {backup_file}")
+        return backup_file
+
+    except Exception as e:
+        logging.error(f"❌ Backup failed: {str(e)}")
+    return None
+
+
+# Session advisory lock of the one process that takes snapshots (see BackupWorker)
+BACKUP_LOCK_ID = 0x6d656d62
+# Seconds between a non-leader's attempts to take over snapshotting
+BACKUP_LEADER_RETRY = 60
+
+
+class BackupWorker:
+    """
+    Background backup writer that keeps backups off the request path.
+
+    Handlers call `record(op, row)` after committing a write; the worker thread
+    coalesces bursts (waiting BACKUP_COALESCE_SECONDS after the first change),
+    appends them to an NDJSON change log with a single fsync, and periodically
+    compacts everything into a fresh snapshot via backup_database(). Each change
+    carries the full row image keyed by id, so replaying a log over the snapshot
+    taken before it is idempotent.
+
+    Every gunicorn worker appends its own change logs, but only the process
+    holding the BACKUP_LOCK_ID session lock snapshots and applies retention. It
+    counts changes from all workers through memory_change_log, and when it dies
+    its lock goes with its session so another worker takes over.
+    """
+
+    def __init__(self, backup_dir, coalesce_seconds, snapshot_every_changes,
+                 snapshot_interval, keep_snapshots):
+        self.backup_dir = backup_dir
+        self.coalesce_seconds = coalesce_seconds
+        self.snapshot_every_changes = snapshot_every_changes
+        self.snapshot_interval = snapshot_interval
+        self.keep_snapshots = keep_snapshots
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._changelog = None
+        self._changes_since_snapshot = 0
+        self._last_snapshot = None
+        self._snapshot_seq = 0
+        self._leader_conn = None
+        self._leader_checked = None
+        self.counters = {"changes_logged": 0, "flushes": 0, "snapshots": 0, "errors": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="backup-worker", daemon=True)
+                self._thread.start()
+
+    def record(self, op, row=None, memory_id=None):
+        """Queue a change: op is 'insert', 'update' or 'delete'."""
+        self.start()
+        record = _memory_row_to_backup(row) if row else {"id": memory_id}
+        record["op"] = op
+        record["recorded_at"] = datetime.now().astimezone().isoformat()
+        self._queue.put(record)
+
+    def record_many(self, op, rows):
+        """Queue many row changes as a single item so they are flushed together."""
+        self.start()
+        recorded_at = datetime.now().astimezone().isoformat()
+        records = []
+        for row in rows:
+            record = _memory_row_to_backup(row)
+            record["op"] = op
+            record["recorded_at"] = recorded_at
+            records.append(record)
+        self._queue.put(records)
+
+    def request_snapshot(self):
+        """Ask the worker to compact into a new snapshot at the next opportunity."""
+        self.start()
+        self._queue.put(None)
+
+    def flush(self, timeout=None):
+        """Block until every queued change has been written (used at shutdown)."""
+        if self._thread is not None and self._thread.is_alive():
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self._queue.unfinished_tasks:
+                if deadline is not None and time.monotonic() > deadline:
+                    break
+                time.sleep(0.05)
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats.update({
+            "queue_depth": self._queue.qsize(),
+            "changes_since_snapshot": self._changes_since_snapshot,
+            "changelog": self._changelog,
+            "leader": self._leader_conn is not None,
+        })
+        return stats
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=min(self.snapshot_interval, BACKUP_LEADER_RETRY))
+            except queue.Empty:
+                try:
+                    self._compact()
+                except Exception as e:
+                    self.counters["errors"] += 1
+                    logging.error(f"❌ Backup worker error: {str(e)}")
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.coalesce_seconds
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                changes = []
+                for item in batch:
+                    if isinstance(item, list):
+                        changes.extend(item)
+                    elif item is not None:
+                        changes.append(item)
+                if changes:
+                    self._append(changes)
+                self._compact(force=None in batch)
+            except Exception as e:
+                self.counters["errors"] += 1
+                logging.error(f"❌ Backup worker error: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _append(self, changes):
+        os.makedirs(self.backup_dir, exist_ok=True)
+        if self._changelog is None:
+            self._changelog = os.path.join(self.backup_dir, f"memory_changes_{_backup_stamp()}.ndjson")
+        with open(self._changelog, "a") as f:
+            for change in changes:
+                f.write(json.dumps(change) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._changes_since_snapshot += len(changes)
+        self.counters["changes_logged"] += len(changes)
+        self.counters["flushes"] += 1
+
+    def _compact(self, force=False):
+        """Snapshot when due if this process is the leader, otherwise just rotate a long change log."""
+        latest = self._leader_seq()
+        if latest is not None:
+            if self._snapshot_due(latest, force):
+                self._snapshot(latest)
+        elif self._changes_since_snapshot >= self.snapshot_every_changes:
+            # Cap the log's size; retention expires it once a later snapshot is old enough
+            self._changelog = None  # _append starts the next log
+            self._changes_since_snapshot = 0
+
+    def _leader_seq(self):
+        """
+        The latest memory_change_log seq if this process holds the snapshot lock
+        (taking it when free), else None. Attempts are spaced BACKUP_LEADER_RETRY apart.
+        """
+        if self._leader_conn is not None:
+            try:
+                cursor = self._leader_conn.cursor()
+                cursor.execute(CHANGE_LOG_BOUNDS_SQL)
+                return cursor.fetchone()[1]
+            except psycopg2.Error as e:
+                logging.warning(f"⚠️ Lost the backup snapshot lock: {str(e)}")
+                self._leader_conn.close()
+                self._leader_conn = None
+        now = time.monotonic()
+        if self._leader_checked is not None and now - self._leader_checked < BACKUP_LEADER_RETRY:
+            return None
+        self._leader_checked = now
+
+        conn = psycopg2.connect(DATABASE_URL, connect_timeout=DB_CONNECT_TIMEOUT)
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (BACKUP_LOCK_ID,))
+        if not cursor.fetchone()[0]:
+            conn.close()
+            return None
+        self._leader_conn = conn
+        self._last_snapshot = None
+        logging.info(f"💾 Process {os.getpid()} now takes the backup snapshots.")
+        cursor.execute(CHANGE_LOG_BOUNDS_SQL)
+        return cursor.fetchone()[1]
+
+    def _snapshot_due(self, latest, force=False):
+        if force or self._last_snapshot is None:
+            return True
+        changes = latest - self._snapshot_seq
+        if changes >= self.snapshot_every_changes:
+            return True
+        return changes > 0 and time.monotonic() - self._last_snapshot >= self.snapshot_interval
+
+    def _snapshot(self, latest):
+        # Start the next change log before snapshotting: changes committed while the
+        # snapshot runs land in the new log and are simply re-applied on restore.
+        self._changelog = os.path.join(self.backup_dir, f"memory_changes_{_backup_stamp()}.ndjson")
+        self._changes_since_snapshot = 0
+        if backup_database():
+            self._last_snapshot = time.monotonic()
+            self._snapshot_seq = latest
+            self.counters["snapshots"] += 1
+            self._apply_retention()
+
+    def _apply_retention(self):
+        """Keep the newest `keep_snapshots` snapshots and the change logs that follow them."""
+        def files(prefix):
+            paths = [os.path.join(self.backup_dir, name) for name in os.listdir(self.backup_dir)
+                     if name.startswith(prefix) and not name.endswith(".tmp")]
+            return sorted(paths, key=os.path.getmtime)
+
+        snapshots = files("memory_backup_")
+        if len(snapshots) <= self.keep_snapshots:
+            return
+        expired = snapshots[:-self.keep_snapshots]
+        oldest_kept = os.path.getmtime(snapshots[-self.keep_snapshots])
+        expired += [path for path in files("memory_changes_")
+                    if os.path.getmtime(path) < oldest_kept and path != self._changelog]
+        for path in expired:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.warning(f"⚠️ Could not remove expired backup {path}: {str(e)}")
+        logging.info(f"🧹 Backup retention removed {len(expired)} file(s).")
+
+
+backup_worker = BackupWorker(
+    BACKUP_DIR,
+    BACKUP_COALESCE_SECONDS,
+    BACKUP_SNAPSHOT_EVERY_CHANGES,
+    BACKUP_SNAPSHOT_INTERVAL,
+    BACKUP_KEEP_SNAPSHOTS,
+)
+atexit.register(backup_worker.flush, 10)
+
+
+def record_memory_change(op, row=None, memory_id=None):
+    """Hand a committed write to the background backup worker."""
+    if BACKUP_ENABLED:
+        with timed_phase("backup"):
+            backup_worker.record(op, row=row, memory_id=memory_id)
+
+
+def record_memory_changes(op, rows):
+    """Hand a batch of committed writes to the backup worker in one go."""
+    if BACKUP_ENABLED and rows:
+        with timed_phase("backup"):
+            backup_worker.record_many(op, rows)
+
+###############################################################################
+#                             READ CACHE                                       #
+###############################################################################
+
+class QueryCache:
+    """
+    Bounded LRU + TTL cache of serialized /recall-or-search responses.
+
+    Every entry carries invalidation tags: "all" for queries any write can affect
+    (recent memories, text searches) and "category:<value>" for single-category
+    lookups, so a write only evicts the entries it can actually change.
+
+    `generation` counts invalidations. Read it before querying and pass it to
+    put(): a write whose invalidation ran while the query was in flight then
+    keeps the possibly stale result out of the cache.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            expires_at, tags, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.counters["expirations"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return value
+
+    def put(self, key, value, tags, generation=None):
+        """Store an entry; False (nothing stored) if invalidated since `generation` was read."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, tags, value)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.counters["evictions"] += 1
+        return True
+
+    def invalidate(self, tags):
+        with self._lock:
+            self.generation += 1
+            keys = set()
+            for tag in tags:
+                keys |= self._tags.get(tag, set())
+            for key in keys:
+                self._remove(key)
+            self.counters["invalidations"] += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self.counters["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        _, tags, _ = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats.update({"entries": len(self._entries), "max_entries": self.max_entries, "ttl_seconds": self.ttl})
+        return stats
+
+
+query_cache = QueryCache(CACHE_MAX_ENTRIES, CACHE_TTL)
+
+CACHE_NOTIFY_CHANNEL = "memory_cache_invalidate"
+
+
+def write_invalidation_tags(*category_lists):
+    """Tags to invalidate for a write touching memories with the given category lists."""
+    tags = {"all"}
+    for categories in category_lists:
+        if isinstance(categories, str):
+            categories = categories.strip("{}").split(",")
+        tags.update(f"category:{category}" for category in categories or [] if category)
+    return tags
+
+
+def cache_invalidation_statement(tags):
+    """The (sql, params) NOTIFY announcing a write's tags, or None when not listening."""
+    if CACHE_ENABLED and CACHE_LISTEN:
+        return "SELECT pg_notify(%s, %s)", (CACHE_NOTIFY_CHANNEL, json.dumps({"pid": os.getpid(), "tags": sorted(tags)}))
+    return None
+
+
+def publish_cache_invalidation(cursor, tags):
+    """
+    Queue a NOTIFY for other worker processes; Postgres delivers it on commit.
+    Call before committing the write, then invalidate_cache() after.
+    """
+    statement = cache_invalidation_statement(tags)
+    if statement:
+        cursor.execute(*statement)
+
+
+def invalidate_cache(tags):
+    """Drop this process's cached entries affected by a committed write."""
+    if CACHE_ENABLED:
+        query_cache.invalidate(tags)
+
+
+class CacheInvalidationListener:
+    """
+    LISTENs on CACHE_NOTIFY_CHANNEL over a dedicated connection and applies the
+    invalidations published by other processes. If the connection drops the
+    whole cache is cleared, since notifications may have been missed.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and DATABASE_URL:
+                self._thread = threading.Thread(target=self._run, name="cache-listener", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        backoff = 1
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(DATABASE_URL, connect_timeout=DB_CONNECT_TIMEOUT)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CACHE_NOTIFY_CHANNEL}")
+                backoff = 1
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._apply(conn.notifies.pop(0).payload)
+            except Exception as e:
+                logging.warning(f"⚠️ Cache listener disconnected, clearing cache: {str(e).strip()}")
+                query_cache.clear()
+                if conn is not None:
+                    conn.close()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def _apply(self, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            query_cache.clear()
+            return
+        if message.get("pid") != os.getpid():
+            query_cache.invalidate(message.get("tags", []))
+            replica_router.note_write()
+
+
+cache_listener = CacheInvalidationListener()
+
+###############################################################################
+#                             SEMANTIC RECALL                                  #
+###############################################################################
+
+class HashingEmbedder:
+    """
+    Offline embedding fallback: signed feature hashing of words, word bigrams and
+    character trigrams into `dim` buckets, L2-normalized. No model files or network
+    needed, and stable across processes (crc32, not Python's salted hash()).
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim):
+        self.dim = dim
+
+    def _features(self, text):
+        words = re.findall(r"\w+", text.lower())
+        for word in words:
+            yield word, 1.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], 0.5
+        for first, second in zip(words, words[1:]):
+            yield f"{first} {second}", 0.7
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode())
+                vectors[row, h % self.dim] += weight if h & 0x80000000 else -weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model (works offline once the model is cached)."""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.name = model_name
+        self._model = SentenceTransformer(model_name)
+        self.dim = self._model.get_sentence_embedding_dimension()
+
+    def embed(self, texts):
+        return np.asarray(self._model.encode(list(texts), normalize_embeddings=True), dtype=np.float32)
+
+
+_embedder = None
+
+
+def get_embedder():
+    """The configured embedder (EMBEDDING_MODEL), falling back to hashing."""
+    global _embedder
+    if _embedder is None:
+        if EMBEDDING_MODEL and EMBEDDING_MODEL != "hashing":
+            try:
+                _embedder = SentenceTransformerEmbedder(EMBEDDING_MODEL)
+            except Exception as e:
+                logging.warning(f"⚠️ Could not load embedding model {EMBEDDING_MODEL!r}, using hashing: {str(e)}")
+        if _embedder is None:
+            _embedder = HashingEmbedder(EMBEDDING_DIM)
+    return _embedder
+
+
+def _embedding_text(title, details):
+    if isinstance(details, dict):
+        details = details.get("text", json.dumps(details))
+    return f"{title}\n{details or ''}"
+
+
+def embed_memories(items):
+    """Embedding bytes (float32) for (title, details) pairs, or Nones when disabled."""
+    if not EMBEDDINGS_ENABLED or not items:
+        return [None] * len(items)
+    vectors = get_embedder().embed([_embedding_text(title, details) for title, details in items])
+    return [vector.tobytes() for vector in vectors]
+
+
+def embedding_update_statements(rows):
+    """Statements re-embedding rows returned by build_edit_query (title is col 1, details col 2)."""
+    if not EMBEDDINGS_ENABLED or not rows:
+        return []
+    embeddings = embed_memories([(row[1], row[2]) for row in rows])
+    return [("UPDATE memory SET embedding = %s WHERE id = %s", (embedding, row[0]))
+            for row, embedding in zip(rows, embeddings)]
+
+
+def category_mask(categories):
+    """Bitmask of category values (bit order follows MemoryCategory)."""
+    if isinstance(categories, str):
+        categories = categories.strip("{}").split(",")
+    bits = {value: 1 << i for i, value in enumerate(CATEGORY_VALUES)}
+    mask = 0
+    for category in categories or []:
+        mask |= bits.get(category, 0)
+    return mask
+
+
+class EmbeddingIndex:
+    """
+    In-process matrix of memory embeddings for brute-force cosine top-k.
+
+    Loaded from the `embedding` column and kept current incrementally: rows
+    embedded since the last sync (embedded_at, with an overlap window for slow
+    commits) are upserted before a search once EMBEDDING_SYNC_INTERVAL has passed.
+    Deleted memories are dropped lazily when a search fails to find them in SQL.
+    """
+
+    def __init__(self, dim):
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._size = 0
+        self._ids = np.full(1024, -1, dtype=np.int64)
+        self._vectors = np.zeros((1024, dim), dtype=np.float32)
+        self._masks = np.zeros(1024, dtype=np.int64)
+        self._positions = {}
+        self._synced_at = None
+        self._last_sync_check = 0.0
+
+    def __len__(self):
+        return len(self._positions)
+
+    def upsert(self, ids, vectors, masks):
+        with self._lock:
+            for memory_id, vector, mask in zip(ids, vectors, masks):
+                position = self._positions.get(memory_id)
+                if position is None:
+                    if self._size == len(self._ids):
+                        self._grow()
+                    position = self._size
+                    self._size += 1
+                    self._positions[memory_id] = position
+                    self._ids[position] = memory_id
+                self._vectors[position] = vector
+                self._masks[position] = mask
+
+    def remove(self, ids):
+        with self._lock:
+            for memory_id in ids:
+                position = self._positions.pop(memory_id, None)
+                if position is not None:
+                    self._ids[position] = -1
+                    self._vectors[position] = 0
+                    self._masks[position] = 0
+
+    def _grow(self):
+        capacity = len(self._ids) * 2
+        self._ids = np.concatenate([self._ids, np.full(capacity - len(self._ids), -1, dtype=np.int64)])
+        self._vectors = np.vstack([self._vectors, np.zeros((capacity - len(self._vectors), self.dim), np.float32)])
+        self._masks = np.concatenate([self._masks, np.zeros(capacity - len(self._masks), dtype=np.int64)])
+
+    def search(self, query_vector, k, mask=0):
+        """Return (ids, scores) of the k most similar memories, optionally within a category mask."""
+        with self._lock:
+            size = self._size
+            scores = self._vectors[:size] @ query_vector
+            valid = self._ids[:size] >= 0
+            if mask:
+                valid &= (self._masks[:size] & mask) != 0
+            scores = np.where(valid, scores, -np.inf)
+            ids = self._ids[:size].copy()
+        k = min(k, int(valid.sum()))
+        if k <= 0:
+            return [], []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return ids[top].tolist(), scores[top].tolist()
+
+    def sync(self, conn, force=False):
+        """Pull embeddings written since the last sync (all of them on first use)."""
+        now = time.monotonic()
+        if not force and self._synced_at is not None and now - self._last_sync_check < EMBEDDING_SYNC_INTERVAL:
+            return
+        self._last_sync_check = now
+        query = "SELECT id, embedding, categories::text[], embedded_at FROM memory WHERE embedding IS NOT NULL"
+        params = []
+        if self._synced_at is not None:
+            query += " AND embedded_at > %s"
+            params.append(self._synced_at - timedelta(seconds=60))
+        cursor = conn.cursor(name=f"embedding_sync_{uuid.uuid4().hex}")
+        cursor.itersize = 10000
+        cursor.execute(query, params)
+        latest = self._synced_at
+        loaded = 0
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            rows = [row for row in rows if len(row[1]) == self.dim * 4]
+            if rows:
+                vectors = np.frombuffer(b"".join(bytes(row[1]) for row in rows), dtype=np.float32)
+                self.upsert([row[0] for row in rows], vectors.reshape(-1, self.dim),
+                            [category_mask(row[2]) for row in rows])
+                latest = max([latest] + [row[3] for row in rows] if latest else [row[3] for row in rows])
+                loaded += len(rows)
+        cursor.close()
+        conn.rollback()
+        self._synced_at = latest or datetime.now(timezone.utc)
+        if loaded:
+            logging.info(f"🧭 Embedding index synced {loaded} vector(s); {len(self)} indexed.")
+
+
+_embedding_index = None
+
+
+def get_embedding_index():
+    global _embedding_index
+    if _embedding_index is None:
+        _embedding_index = EmbeddingIndex(get_embedder().dim)
+    return _embedding_index
+
+
+def semantic_recall(cursor, spec):
+    """
+    Top-k cosine search for /recall-or-search?mode=semantic.
+
+    Candidates come from the in-process index (restricted to the category, if
+    given); their rows are then fetched by primary key. Returns (columns, rows)
+    with a trailing `score` column, best match first.
+    """
+    index = get_embedding_index()
+    index.sync(cursor.connection)
+    query_vector = get_embedder().embed([spec["search_term"]])[0]
+    limit = spec["limit"]
+    mask = category_mask([spec["category"]]) if spec["category"] else 0
+    ids, scores = index.search(query_vector, limit, mask)
+
+    cursor.execute(f"SELECT {spec['query']['columns']} FROM memory WHERE id = ANY(%s)", (ids,))
+    columns = [column.name for column in cursor.description] + ["score"]
+    found = {row[0]: row for row in cursor.fetchall()}
+    index.remove([memory_id for memory_id in ids if memory_id not in found])
+    rows = [found[memory_id] + (score,) for memory_id, score in zip(ids, scores) if memory_id in found]
+    return columns, rows
+
+
+def backfill_embeddings(batch_size=1000, force=False):
+    """Compute embeddings for memories without one (or for all, with force). Returns the count."""
+    if not EMBEDDINGS_ENABLED:
+        raise RuntimeError("Embeddings are disabled (numpy missing or EMBEDDINGS_ENABLED=false)")
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Database connection failed")
+    done = 0
+    last_id = 0
+    try:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute(f"""
+                SELECT id, title, details FROM memory
+                WHERE id > %s {"" if force else "AND embedding IS NULL"}
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            embeddings = embed_memories([(row[1], row[2]) for row in rows])
+            psycopg2.extras.execute_values(
+                cursor,
+                "UPDATE memory SET embedding = data.embedding FROM (VALUES %s) AS data(id, embedding) "
+                "WHERE memory.id = data.id",
+                [(row[0], embedding) for row, embedding in zip(rows, embeddings)],
+                template="(%s, %s::bytea)",
+            )
+            conn.commit()
+            done += len(rows)
+            last_id = rows[-1][0]
+            logging.info(f"🧭 Backfilled embeddings for {done} memories...")
+        cursor.close()
+    finally:
+        release_db_connection(conn)
+    return done
+
+###############################################################################
+#                             WRITE BUFFER                                     #
+###############################################################################
+
+class WriteBufferUnavailable(Exception):
+    """Raised when a buffered write cannot be accepted (no reserved ids left and the database is down)."""
+
+
+WRITE_BUFFER_SECONDS = Histogram(
+    "memory_api_write_buffer_seconds",
+    "Buffered writes: flush transaction time and accept-to-commit lag of the oldest entry.",
+    ("stage",),
+)
+
+# No conflict target: an entry already flushed (same id) or duplicating a stored
+# memory (same content hash) is dropped rather than failing the flush forever
+BUFFERED_INSERT_SQL = """
+    INSERT INTO memory (id, title, details, categories, timestamp, embedding)
+    VALUES %s
+    ON CONFLICT DO NOTHING
+    RETURNING id, title, details, categories::text[], timestamp, updated_at
+"""
+
+
+class BufferedWriter:
+    """
+    Write-ahead buffer for /remember (WRITE_BUFFER_ENABLED=true).
+
+    append() writes the memory to a local NDJSON journal segment (fsync'ed when
+    WRITE_JOURNAL_FSYNC) and returns an id taken from a block reserved ahead of
+    time from memory's id sequence, so the request never waits on an INSERT.
+    A background thread seals the open segment, inserts its entries in grouped
+    transactions of up to WRITE_FLUSH_MAX_BATCH rows and deletes the segment
+    once committed, retrying with exponential backoff while Postgres is away.
+
+    Segments are flock'ed by the owning process. On start, segments no live
+    process holds (left by a crash or a stopped worker) are replayed; inserts
+    use ON CONFLICT DO NOTHING, so replaying an already flushed entry is
+    harmless. Buffered memories become visible to reads once flushed; one that
+    duplicates a stored memory is dropped then (DUPLICATE_POLICY is not applied),
+    and its acknowledged id never appears.
+    """
+
+    def __init__(self, journal_dir, max_batch, linger, max_backoff, id_block, fsync):
+        self.journal_dir = journal_dir
+        self.max_batch = max_batch
+        self.linger = linger
+        self.max_backoff = max_backoff
+        self.id_block = id_block
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._id_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._segment = None
+        self._segment_path = None
+        self._segment_number = 0
+        self._pending = []   # entries in the open segment
+        self._sealed = []    # (path, file, entries) awaiting flush, oldest first
+        self._ids = deque()
+        self.counters = {"accepted": 0, "flushed": 0, "replayed": 0, "flush_failures": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self._replay_orphans()
+            self._open_segment()
+            self._thread = threading.Thread(target=self._run, name="write-buffer", daemon=True)
+            self._thread.start()
+
+    def append(self, memory, timestamp):
+        """Journal a validated memory and return its id. Raises WriteBufferUnavailable."""
+        self.start()
+        memory_id = self._next_id()
+        entry = {
+            "id": memory_id,
+            "title": memory["title"],
+            "details": memory["details"],
+            "details_json": memory["details_json"],
+            "categories": memory["categories"],
+            "timestamp": memory.get("timestamp", timestamp).isoformat(),
+            "accepted_at": time.time(),
+        }
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self._segment.write(line)
+            self._segment.flush()
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+            self._pending.append(entry)
+            self.counters["accepted"] += 1
+        self._wakeup.set()
+        return memory_id
+
+    def flush(self, timeout=None):
+        """Block until every accepted entry is in Postgres (used at shutdown)."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.stats()["queue_depth"]:
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            self._wakeup.set()
+            time.sleep(0.05)
+
+    def stats(self):
+        with self._lock:
+            depth = len(self._pending) + sum(len(entries) for _, _, entries in self._sealed)
+            segments = len(self._sealed) + (1 if self._segment else 0)
+        stats = dict(self.counters)
+        stats.update({"queue_depth": depth, "segments": segments, "reserved_ids": len(self._ids)})
+        return stats
+
+    def _next_id(self):
+        with self._id_lock:
+            if not self._ids:
+                self._reserve_ids()
+            if not self._ids:
+                raise WriteBufferUnavailable("No reserved memory ids left and the database is unreachable")
+            return self._ids.popleft()
+
+    def _reserve_ids(self):
+        """Take a block of ids from memory's sequence; a no-op when the database is down."""
+        conn = get_db_connection()
+        if not conn:
+            return
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT nextval(pg_get_serial_sequence('memory', 'id')) FROM generate_series(1, %s)",
+                           (self.id_block,))
+            self._ids.extend(row[0] for row in cursor.fetchall())
+            conn.commit()
+            cursor.close()
+        except psycopg2.Error as e:
+            conn.rollback()
+            logging.warning(f"⚠️ Could not reserve memory ids: {str(e).strip()}")
+        finally:
+            release_db_connection(conn)
+
+    def _open_segment(self):
+        self._segment_number += 1
+        self._segment_path = os.path.join(
+            self.journal_dir, f"remember-{os.getpid()}-{int(time.time() * 1000)}-{self._segment_number:06d}.ndjson")
+        self._segment = open(self._segment_path, "a")
+        fcntl.flock(self._segment.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _seal(self):
+        """Close the open segment (if it has entries) and queue it for flushing."""
+        with self._lock:
+            if not self._pending:
+                return
+            self._sealed.append((self._segment_path, self._segment, self._pending))
+            self._pending = []
+            self._open_segment()
+
+    def _replay_orphans(self):
+        for name in sorted(os.listdir(self.journal_dir)):
+            if not (name.startswith("remember-") and name.endswith(".ndjson")):
+                continue
+            path = os.path.join(self.journal_dir, name)
+            f = open(path, "r+")
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()  # owned by a live process
+                continue
+            entries = []
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logging.warning(f"⚠️ Skipping torn journal line in {name}")
+            self._sealed.append((path, f, entries))
+            self.counters["replayed"] += len(entries)
+            logging.info(f"♻️ Replaying {len(entries)} journaled memories from {name}")
+
+    def _run(self):
+        backoff = 0.5
+        while True:
+            self._wakeup.wait(timeout=1.0)
+            self._wakeup.clear()
+            time.sleep(self.linger)  # let a burst accumulate into one transaction
+            try:
+                self._seal()
+            except OSError as e:
+                logging.error(f"❌ Could not rotate write journal: {str(e)}")
+            while self._sealed:
+                path, f, entries = self._sealed[0]
+                try:
+                    self._flush_entries(entries)
+                except Exception as e:
+                    self.counters["flush_failures"] += 1
+                    logging.warning(f"⚠️ Buffered write flush failed, retrying in {backoff:.1f}s: {str(e).strip()}")
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+                backoff = 0.5
+                with self._lock:
+                    self._sealed.pop(0)
+                try:
+                    os.remove(path)
+                finally:
+                    f.close()
+            if len(self._ids) < self.id_block // 2:
+                with self._id_lock:
+                    self._reserve_ids()
+
+    def _flush_entries(self, entries):
+        if not entries:
+            return  # e.g. an empty segment left by a clean shutdown
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError("Database connection failed")
+        try:
+            cursor = conn.cursor()
+            for start in range(0, len(entries), self.max_batch):
+                chunk = entries[start:start + self.max_batch]
+                started = time.perf_counter()
+                memories = [dict(entry, timestamp=datetime.fromisoformat(entry["timestamp"])) for entry in chunk]
+                params = [(entry["id"],) + values
+                          for entry, values in zip(chunk, insert_memory_params(memories, None))]
+                rows = psycopg2.extras.execute_values(
+                    cursor,
+                    BUFFERED_INSERT_SQL,
+                    params,
+                    template="(%s, %s, %s::jsonb, %s::memory_category[], %s, %s)",
+                    page_size=len(chunk),
+                    fetch=True,
+                )
+                tags = write_invalidation_tags(*(entry["categories"] for entry in chunk))
+                publish_cache_invalidation(cursor, tags)
+                conn.commit()
+                invalidate_cache(tags)
+                record_memory_changes("insert", rows)
+                self.counters["flushed"] += len(rows)
+                WRITE_BUFFER_SECONDS.observe(("flush",), time.perf_counter() - started)
+                WRITE_BUFFER_SECONDS.observe(("lag",), time.time() - min(entry["accepted_at"] for entry in chunk))
+            cursor.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            release_db_connection(conn)
+
+
+write_buffer = BufferedWriter(
+    WRITE_JOURNAL_DIR,
+    WRITE_FLUSH_MAX_BATCH,
+    WRITE_FLUSH_LINGER,
+    WRITE_FLUSH_MAX_BACKOFF,
+    WRITE_ID_BLOCK,
+    WRITE_JOURNAL_FSYNC,
+)
+if WRITE_BUFFER_ENABLED:
+    atexit.register(write_buffer.flush, 10)
+
+###############################################################################
+#                             ARCHIVE                                          #
+###############################################################################
+
+# /recall-or-search?archive=: none (hot table only), fallback (consult the
+# archive when the hot table can't fill the page) or include (always merge it in)
+ARCHIVE_MODES = ("none", "fallback", "include")
+
+ARCHIVE_LOCK_ID = 0x6d656d61
+
+# Memory columns kept per archived record, in recall row order
+ARCHIVE_COLUMNS = ("id", "title", "details", "categories", "timestamp")
+
+ARCHIVE_SELECT_SQL = """
+    SELECT id, title, details, categories::text[], timestamp, updated_at
+    FROM memory
+    WHERE timestamp < %s
+    ORDER BY timestamp, id
+    LIMIT %s
+"""
+
+# Rows edited after they were copied out stay hot and are picked up by the next batch
+ARCHIVE_DELETE_SQL = """
+    DELETE FROM memory AS m
+    USING unnest(%s::integer[], %s::timestamptz[]) AS archived(id, updated_at)
+    WHERE m.id = archived.id AND m.updated_at IS NOT DISTINCT FROM archived.updated_at
+    RETURNING m.id, m.categories::text[]
+"""
+
+
+def archive_record_matches(record, term, category):
+    """Substring recall semantics for an archived record: search term OR category, everything without either."""
+    if not term and not category:
+        return True
+    if category and category in record["categories"]:
+        return True
+    if term:
+        details = record["details"]
+        text = details.get("text", "") if isinstance(details, dict) else str(details)
+        return term in record["title"].lower() or term in text.lower()
+    return False
+
+
+class MemoryArchive:
+    """
+    Cold tier for old memories: one gzip NDJSON file per month (UTC) named
+    memories-YYYY-MM.ndjson.gz, plus a sidecar memories-YYYY-MM.index.json with
+    the archived ids, the timestamp range, the categories present and the number
+    of data bytes the index covers.
+
+    Only archive_memories writes here, one process at a time. Each append is a new
+    gzip member, fsynced before the index is atomically replaced, so readers that
+    stop at the indexed byte count never see a half-written member. Readers prune
+    months with the index and keep the parsed records of the last `cache_months`
+    months in memory.
+    """
+
+    def __init__(self, directory, cache_months=3):
+        self.directory = directory
+        self.cache_months = cache_months
+        self.lock = threading.Lock()
+        self._indexes = {}  # index path -> (mtime_ns, index)
+        self._records = OrderedDict()  # (month, bytes) -> records, newest first
+
+    def _path(self, month, suffix):
+        return os.path.join(self.directory, f"memories-{month}.{suffix}")
+
+    def indexes(self):
+        """Sidecar indexes of all archived months, newest month first."""
+        if not os.path.isdir(self.directory):
+            return []
+        found = []
+        for entry in os.scandir(self.directory):
+            if not (entry.name.startswith("memories-") and entry.name.endswith(".index.json")):
+                continue
+            mtime = entry.stat().st_mtime_ns
+            with self.lock:
+                cached = self._indexes.get(entry.path)
+            if cached is None or cached[0] != mtime:
+                with open(entry.path) as f:
+                    cached = (mtime, json.load(f))
+                with self.lock:
+                    self._indexes[entry.path] = cached
+            found.append(cached[1])
+        return sorted(found, key=lambda index: index["month"], reverse=True)
+
+    def append(self, month, records):
+        """Append backup-shaped records (UTC timestamps) to a month's file and update its index."""
+        os.makedirs(self.directory, exist_ok=True)
+        index_path = self._path(month, "index.json")
+        index = {"month": month, "bytes": 0, "ids": [], "categories": [], "first": None, "last": None}
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+
+        payload = "".join(json.dumps(record) + "\n" for record in records).encode()
+        with open(self._path(month, "ndjson.gz"), "ab") as f:
+            # Drop a member left behind by an append that crashed before its index was written
+            f.truncate(index["bytes"])
+            f.write(gzip.compress(payload))
+            f.flush()
+            os.fsync(f.fileno())
+            size = os.fstat(f.fileno()).st_size
+
+        stamps = [datetime.fromisoformat(value) for value in (index["first"], index["last"]) if value]
+        stamps += [datetime.fromisoformat(record["timestamp"]) for record in records]
+        ids = set(index["ids"]).union(record["id"] for record in records)
+        index.update({
+            "bytes": size,
+            "memories": len(ids),
+            "ids": sorted(ids),
+            "categories": sorted(set(index["categories"]).union(*(record["categories"] for record in records))),
+            "first": min(stamps).isoformat(),
+            "last": max(stamps).isoformat(),
+            "archived_at": datetime.now(timezone.utc).isoformat(),
+        })
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, index_path)
+
+    def records(self, index):
+        """Records of one archived month, newest first; the last archived copy of an id wins."""
+        key = (index["month"], index["bytes"])
+        with self.lock:
+            if key in self._records:
+                self._records.move_to_end(key)
+                return self._records[key]
+
+        with open(self._path(index["month"], "ndjson.gz"), "rb") as f:
+            data = gzip.decompress(f.read(index["bytes"]))
+        by_id = {}
+        for line in data.splitlines():
+            if line.strip():
+                record = json.loads(line)
+                record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+                by_id[record["id"]] = record
+        records = sorted(by_id.values(), key=lambda record: (record["timestamp"], record["id"]), reverse=True)
+
+        with self.lock:
+            self._records[key] = records
+            while len(self._records) > self.cache_months:
+                self._records.popitem(last=False)
+        return records
+
+    def search(self, search_term, category, limit, after=None, count=False):
+        """
+        Archived memories matching a substring recall, ordered by (timestamp, id)
+        descending and starting below the `after` keys of a recall cursor.
+        Returns (records, total); total counts every match and is None unless `count`.
+        """
+        term = search_term.lower()
+        after_key = (datetime.fromisoformat(after[0]), after[1]) if after else None
+        matches = []
+        total = 0
+        # Months are disjoint and visited newest first, so matches stay in order
+        for index in self.indexes():
+            if category and not term and category not in index["categories"]:
+                continue
+            if not count:
+                if len(matches) >= limit:
+                    break
+                if after_key and datetime.fromisoformat(index["first"]) > after_key[0]:
+                    continue
+            for record in self.records(index):
+                if not archive_record_matches(record, term, category):
+                    continue
+                total += 1
+                if len(matches) < limit and (after_key is None or (record["timestamp"], record["id"]) < after_key):
+                    matches.append(record)
+        return matches, total if count else None
+
+    def get(self, memory_id):
+        """One archived memory by id, or None."""
+        for index in self.indexes():
+            position = bisect.bisect_left(index["ids"], memory_id)
+            if position < len(index["ids"]) and index["ids"][position] == memory_id:
+                for record in self.records(index):
+                    if record["id"] == memory_id:
+                        return record
+        return None
+
+    def stats(self):
+        indexes = self.indexes()
+        with self.lock:
+            cached = len(self._records)
+        return {
+            "months": len(indexes),
+            "memories": sum(index["memories"] for index in indexes),
+            "oldest": indexes[-1]["first"] if indexes else None,
+            "cached_months": cached
+        }
+
+
+memory_archive = MemoryArchive(ARCHIVE_DIR, ARCHIVE_CACHE_MONTHS)
+
+
+def merge_archive_recall(spec, columns, rows, total=None):
+    """
+    Add archived memories to a recall page according to spec["archive"]; `rows`
+    are the hot rows (limit + 1 of them at most) with column names `columns`.
+    A hot row shadows an archived copy of the same id. With a count, the total
+    covers both tiers. Returns (rows, total).
+    """
+    wanted = spec["query"]["limit"]
+    if spec["archive"] == "none" or (spec["archive"] == "fallback" and len(rows) >= wanted
+                                     and not spec["count_mode"]):
+        return rows, total
+
+    records, archived_total = memory_archive.search(spec["search_term"], spec["category"], wanted,
+                                                    spec["query"]["after"], count=bool(spec["count_mode"]))
+    id_at, timestamp_at = columns.index("id"), columns.index("timestamp")
+    hot_ids = {row[id_at] for row in rows}
+    merged = list(rows) + [tuple(record.get(column) for column in columns)
+                           for record in records if record["id"] not in hot_ids]
+    merged.sort(key=lambda row: (row[timestamp_at], row[id_at]), reverse=True)
+    if total is not None and archived_total:
+        total += archived_total
+    return merged[:wanted], total
+
+
+def archive_memories(older_than_days=None, batch_size=1000):
+    """
+    Move memories older than `older_than_days` (default ARCHIVE_AFTER_DAYS) out of
+    the memory table into the archive, in timestamp order.
+
+    Each batch is fsynced to its month files before its rows are deleted, so a
+    crash leaves at worst a copy in both tiers (recall prefers the hot one). The
+    delete goes through delete_memories: stats, the store version, caches and the
+    backup change log treat archived memories as deleted. Returns the number archived.
+    """
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    archived = 0
+
+    # A dedicated connection holds the session lock for the whole run
+    lock_conn = psycopg2.connect(DATABASE_URL, connect_timeout=DB_CONNECT_TIMEOUT)
+    lock_conn.autocommit = True
+    try:
+        cursor = lock_conn.cursor()
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (ARCHIVE_LOCK_ID,))
+        if not cursor.fetchone()[0]:
+            logging.warning("⚠️ Another archive run is in progress; skipping.")
+            return 0
+
+        while True:
+            cursor.execute(ARCHIVE_SELECT_SQL, (cutoff, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            months = {}
+            for row in rows:
+                timestamp = row[4].astimezone(timezone.utc)
+                record = _memory_row_to_backup(row)
+                record["timestamp"] = timestamp.isoformat()
+                months.setdefault(timestamp.strftime("%Y-%m"), []).append(record)
+            for month, records in months.items():
+                memory_archive.append(month, records)
+
+            deleted = delete_memories(ARCHIVE_DELETE_SQL, ([row[0] for row in rows], [row[5] for row in rows]))
+            if deleted is None:
+                raise RuntimeError("Database connection failed")
+            if not deleted:
+                logging.warning("⚠️ Archive batch was edited concurrently; stopping this run.")
+                break
+            archived += len(deleted)
+            logging.info(f"🗄️ Archived {archived} memories older than {cutoff.date()}...")
+        cursor.close()
+    finally:
+        lock_conn.close()
+    return archived
+
+###############################################################################
+#                         SECURITY FUNCTION                                    #
+###############################################################################
+
+def request_token(req):
+    """
+    The token a request presents: a Bearer token in the Authorization header,
+    else an X-API-KEY header, else an 'api_key' query parameter.
+    """
+    token = None
+
+    # 1. Check Authorization header (expecting "Bearer <token>")
+    auth_header = req.headers.get("Authorization")
+    if auth_header and auth_header.lower().startswith("bearer "):
+        token = auth_header.split(" ", 1)[1].strip()
+
+    # 2. Fallback: Check X-API-KEY header
+    if not token:
+        token = req.headers.get("X-API-KEY")
+
+    # 3. Fallback: Check query parameter (e.g., ?api_key=YOUR_API_KEY)
+    if not token:
+        token = req.args.get("api_key")
+    return token
+
+
+def check_api_key(req):
+    """Check that the request has a valid API key (see request_token for where it may be)."""
+    token = request_token(req)
+    if not token:
+        logging.warning("🚨 Missing API key in request (headers or query parameter).")
+        return False
+
+    expected_key = API_KEY.strip() if API_KEY else None
+    if token != expected_key:
+        logging.warning("🚨 API key mismatch: provided token does not match expected key.")
+        return False
+
+    return True
+
+
+def check_monitoring_access(req):
+    """Check access to /metrics and /health: METRICS_TOKEN when set, else the API key."""
+    if METRICS_TOKEN and request_token(req) == METRICS_TOKEN.strip():
+        return True
+    return check_api_key(req)
+
+
+###############################################################################
+#                         DEDUPLICATION & IDEMPOTENCY                          #
+###############################################################################
+
+# What an insert does with a memory whose content hash is already stored (for
+# the same owner): keep the stored one as is, add the new categories to it, or
+# move its timestamp forward. The hash covers the normalized title and details
+# (see migration 13), so a re-emitted memory with other categories still matches.
+ON_DUPLICATE_SET = {
+    "skip": "content_hash = memory.content_hash",
+    "merge_categories": """categories = ARRAY(
+            SELECT c FROM unnest(memory.categories || EXCLUDED.categories) WITH ORDINALITY AS u(c, n)
+            GROUP BY c ORDER BY min(n))""",
+    "bump_timestamp": "timestamp = GREATEST(memory.timestamp, EXCLUDED.timestamp)",
+}
+
+# Duplicates within one statement are folded into the first before inserting,
+# combining categories and timestamps the same way
+PROPOSED_DUPLICATE_VALUES = {
+    "skip": ("f.categories", "f.timestamp"),
+    "merge_categories": ("""ARRAY(
+            SELECT c FROM proposed p, unnest(p.categories) WITH ORDINALITY AS u(c, n)
+            WHERE p.content_hash = f.content_hash
+            GROUP BY c ORDER BY min(p.ord), min(n))""", "f.timestamp"),
+    "bump_timestamp": ("f.categories", "(SELECT max(timestamp) FROM proposed p WHERE p.content_hash = f.content_hash)"),
+}
+
+
+def build_insert_query(policy, values="%s", owner=False):
+    """
+    Single INSERT for validated memories that resolves content-hash duplicates
+    per `policy` (see ON_DUPLICATE_SET) with ON CONFLICT, in one round trip.
+
+    `values` is the VALUES list: %s for execute_values, or one row's
+    placeholders. Each row is (ord, title, details, categories, timestamp,
+    embedding[, owner]). Rows come back in `ord` order as (id, title, details,
+    categories, timestamp, updated_at, inserted); inserted is false when the
+    memory was already stored.
+    """
+    owner_column = ", owner" if owner else ""
+    categories, timestamp = PROPOSED_DUPLICATE_VALUES[policy]
+    return f"""
+        WITH proposed AS (
+            SELECT v.*, memory_content_hash(v.title, v.details) AS content_hash
+            FROM (VALUES {values}) AS v(ord, title, details, categories, timestamp, embedding{owner_column})
+        ), firsts AS (
+            SELECT DISTINCT ON (content_hash) * FROM proposed ORDER BY content_hash, ord
+        ), written AS (
+            INSERT INTO memory (title, details, categories, timestamp, embedding{owner_column})
+            SELECT f.title, f.details, {categories}, {timestamp}, f.embedding{owner_column}
+            FROM firsts f
+            ORDER BY f.ord
+            ON CONFLICT (owner, content_hash) DO UPDATE SET {ON_DUPLICATE_SET[policy]}
+            RETURNING id, title, details, categories::text[], timestamp, updated_at, content_hash,
+                      xmax = 0 AS inserted
+        )
+        SELECT w.id, w.title, w.details, w.categories, w.timestamp, w.updated_at, w.inserted AND p.ord = f.ord
+        FROM proposed p
+        JOIN firsts f USING (content_hash)
+        JOIN written w USING (content_hash)
+        ORDER BY p.ord
+    """
+
+
+# execute_values row template for build_insert_query (append ", %s" for owner)
+INSERT_VALUES_TEMPLATE = "(%s, %s, %s::jsonb, %s::memory_category[], %s::timestamptz, %s::bytea)"
+
+
+# An edit that would make a memory's title and details match another's
+DUPLICATE_EDIT_ERROR = "Another memory already has this title and details"
+
+
+def parse_duplicate_policy(args):
+    """(policy, error) from ?on_duplicate=, defaulting to DUPLICATE_POLICY."""
+    policy = args.get("on_duplicate", DUPLICATE_POLICY).lower()
+    if policy not in DUPLICATE_POLICIES:
+        return None, f"Invalid on_duplicate '{policy}'. Must be one of: {list(DUPLICATE_POLICIES)}"
+    return policy, None
+
+
+# Stored responses of requests sent with an Idempotency-Key (Postgres backend)
+IDEMPOTENCY_LOOKUP_SQL = """
+    SELECT request_hash, status, body FROM memory_idempotency
+    WHERE key = %s AND created_at > now() - %s * interval '1 second'
+"""
+
+IDEMPOTENCY_SAVE_SQL = """
+    INSERT INTO memory_idempotency (key, request_hash, status, body) VALUES (%s, %s, %s, %s)
+    ON CONFLICT (key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash, status = EXCLUDED.status, body = EXCLUDED.body,
+            created_at = now()
+        WHERE memory_idempotency.created_at <= now() - %s * interval '1 second'
+"""
+
+IDEMPOTENCY_PRUNE_SQL = "DELETE FROM memory_idempotency WHERE created_at <= now() - %s * interval '1 second'"
+
+# Expired keys are deleted by whichever save comes first after this many seconds
+IDEMPOTENCY_PRUNE_INTERVAL = 300
+_idempotency_pruned = 0.0
+
+
+def request_fingerprint(method, path, args, body):
+    """Hash of what makes two requests the same request, to catch a reused Idempotency-Key."""
+    digest = hashlib.sha256(f"{method} {path}?{sorted(args)}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def lookup_idempotent_response(key, fingerprint):
+    """
+    The stored (status, body) for a repeated Idempotency-Key, as (stored, error):
+    stored is None for a new key; error is a message when the key was used for a
+    different request. A database failure counts as a new key.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None, None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(IDEMPOTENCY_LOOKUP_SQL, (key, IDEMPOTENCY_TTL))
+        row = cursor.fetchone()
+        conn.commit()
+        cursor.close()
+    except psycopg2.Error as e:
+        conn.rollback()
+        logging.warning(f"⚠️ Idempotency lookup failed: {str(e).strip()}")
+        return None, None
+    finally:
+        release_db_connection(conn)
+    if row is None:
+        return None, None
+    request_hash, status, body = row
+    if request_hash != fingerprint:
+        return None, "Idempotency-Key was already used for a different request"
+    return (status, body), None
+
+
+def save_idempotent_response(key, fingerprint, status, body):
+    """Remember a response for IDEMPOTENCY_TTL seconds."""
+    global _idempotency_pruned
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        cursor = conn.cursor()
+        cursor.execute(IDEMPOTENCY_SAVE_SQL, (key, fingerprint, status, body, IDEMPOTENCY_TTL))
+        if time.monotonic() - _idempotency_pruned > IDEMPOTENCY_PRUNE_INTERVAL:
+            _idempotency_pruned = time.monotonic()
+            cursor.execute(IDEMPOTENCY_PRUNE_SQL, (IDEMPOTENCY_TTL,))
+        conn.commit()
+        cursor.close()
+    except psycopg2.Error as e:
+        conn.rollback()
+        logging.warning(f"⚠️ Could not store idempotent response: {str(e).strip()}")
+    finally:
+        release_db_connection(conn)
+
+
+def idempotent(view):
+    """
+    Honor an Idempotency-Key header on a write endpoint (Postgres backend).
+
+    The first response to a key, unless it is a 5xx, is stored for
+    IDEMPOTENCY_TTL seconds and replayed to retries of the same request with
+    Idempotent-Replayed: true; reusing the key for another request is a 422.
+    Concurrent first attempts both run, and the content hash folds their
+    memories into one.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key", "").strip()
+        if not key or not POSTGRES_BACKEND:
+            return view(*args, **kwargs)
+        if not check_api_key(request):
+            return jsonify({"error": "Unauthorized"}), 403
+        if len(key) > 255:
+            return jsonify({"error": "Idempotency-Key must be at most 255 characters"}), 400
+
+        fingerprint = request_fingerprint(request.method, request.path, request.args.items(multi=True),
+                                          request.get_data())
+        stored, error = lookup_idempotent_response(key, fingerprint)
+        if error:
+            return jsonify({"error": error}), 422
+        if stored is not None:
+            status, body = stored
+            return Response(body, status=status, mimetype="application/json",
+                            headers={"Idempotent-Replayed": "true"})
+
+        response = app.make_response(view(*args, **kwargs))
+        if response.status_code < 500:
+            save_idempotent_response(key, fingerprint, response.status_code, response.get_data(as_text=True))
+        return response
+
+    return wrapper
+
+
+DEDUPE_BATCH_SQL = """
+    SELECT id, owner, memory_content_hash(title, details), categories::text[]
+    FROM memory
+    WHERE content_hash IS NULL AND id > %s
+    ORDER BY id
+    LIMIT %s
+    FOR UPDATE
+"""
+
+# Hashes held by more than one of an owner's memories, in hash order
+DEDUPE_DUPLICATED_SQL = """
+    SELECT content_hash
+    FROM memory
+    WHERE content_hash > %s
+    GROUP BY owner, content_hash
+    HAVING COUNT(*) > 1
+    ORDER BY content_hash
+    LIMIT %s
+"""
+
+DEDUPE_MATCHES_SQL = """
+    SELECT id, owner, content_hash, categories::text[]
+    FROM memory
+    WHERE content_hash = ANY(%s)
+    FOR UPDATE
+"""
+
+DEDUPE_DELETE_SQL = "DELETE FROM memory WHERE id = ANY(%s) RETURNING id, categories::text[]"
+
+DEDUPE_KEEP_SQL = """
+    UPDATE memory AS m
+    SET content_hash = k.content_hash, categories = k.categories::memory_category[]
+    FROM (VALUES %s) AS k(id, content_hash, categories)
+    WHERE m.id = k.id
+    RETURNING m.id, m.title, m.details, m.categories::text[], m.timestamp, m.updated_at
+"""
+
+
+def dedupe_memories(batch_size=1000, dry_run=False):
+    """
+    One-off job for memories stored before content hashes: hash them in id
+    order and fold each set of duplicates (same owner and hash) into its oldest
+    memory, which gains the others' categories. Then fold duplicates among
+    memories that were already hashed, which keep migration 14 from building
+    its unique index. Safe to interrupt and rerun. Returns (hashed, removed).
+
+    A dry run changes nothing, so it remembers the memories each (owner, hash)
+    group has gathered so far to count duplicates that span batches.
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Database connection failed")
+    hashed = removed = 0
+    last_id = 0
+    last_hash = ""
+    seen = {}
+    try:
+        cursor = conn.cursor()
+        while True:
+            try:
+                if last_id is not None:
+                    cursor.execute(DEDUPE_BATCH_SQL, (last_id, batch_size))
+                    batch = cursor.fetchall()
+                    if not batch:
+                        last_id = None  # every memory is hashed; go on to the hashed duplicates
+                        conn.rollback()
+                        continue
+                    hashes = {row[2] for row in batch}
+                else:
+                    cursor.execute(DEDUPE_DUPLICATED_SQL, (last_hash, batch_size))
+                    batch = []
+                    hashes = {row[0] for row in cursor.fetchall()}
+                    if not hashes:
+                        break
+                cursor.execute(DEDUPE_MATCHES_SQL, (list(hashes),))
+                groups = {}
+                for memory_id, owner, content_hash, categories in sorted(batch + cursor.fetchall()):
+                    groups.setdefault((owner, content_hash), []).append((memory_id, categories))
+
+                if dry_run:
+                    dropped = 0
+                    for key, members in groups.items():
+                        ids = seen.setdefault(key, set())
+                        before = max(len(ids), 1)
+                        ids.update(memory_id for memory_id, _ in members)
+                        dropped += len(ids) - before
+                    conn.rollback()
+                else:
+                    keep, drop, grown = [], [], set()
+                    for (_, content_hash), members in groups.items():
+                        merged = list(dict.fromkeys(category for _, categories in members for category in categories))
+                        keep.append((members[0][0], content_hash, merged))
+                        drop.extend(memory_id for memory_id, _ in members[1:])
+                        if merged != list(members[0][1]):
+                            grown.add(members[0][0])
+                    deleted = []
+                    if drop:
+                        cursor.execute(DEDUPE_DELETE_SQL, (drop,))
+                        deleted = cursor.fetchall()
+                    kept = psycopg2.extras.execute_values(cursor, DEDUPE_KEEP_SQL, keep, page_size=len(keep), fetch=True)
+                    merged_rows = [row for row in kept if row[0] in grown]
+                    tags = write_invalidation_tags(*(row[1] for row in deleted), *(row[3] for row in merged_rows))
+                    if drop:
+                        publish_cache_invalidation(cursor, tags)
+                    conn.commit()
+                    dropped = len(drop)
+                    if drop:
+                        invalidate_cache(tags)
+                        for row in deleted:
+                            record_memory_change("delete", memory_id=row[0])
+                        record_memory_changes("update", merged_rows)
+            except psycopg2.errors.UniqueViolation:
+                # A matching memory was inserted meanwhile; take the batch again
+                conn.rollback()
+                continue
+            if batch:
+                last_id = batch[-1][0]
+            else:
+                last_hash = max(hashes)
+            hashed += len(batch)
+            removed += dropped
+            logging.info(f"🧹 Hashed {hashed} memories, {'would remove' if dry_run else 'removed'} "
+                         f"{removed} duplicates so far.")
+        cursor.close()
+    finally:
+        release_db_connection(conn)
+    return hashed, removed
+
+###############################################################################
+#                             MEMORY HANDLERS                                  #
+###############################################################################
+
+def validate_new_memory(data, allow_timestamp=False):
+    """
+    Validate a memory submitted for storage.
+    Returns (memory, error): memory holds title, details_json, categories
+    (and timestamp when allow_timestamp is set); error is a message or None.
+    """
+    if not isinstance(data, dict):
+        return None, "Each memory must be a JSON object"
+
+    title = str(data.get("title", "")).strip()
+    details = str(data.get("details", "")).strip()
+    categories = data.get("categories", [])
+
+    if not title or not details or not categories:
+        return None, "Missing title, details, or categories"
+
+    if not isinstance(categories, list):
+        return None, "Categories must be provided as a list"
+
+    # Validate categories
+    categories = [cat.strip() if isinstance(cat, str) else cat for cat in categories]
+    invalid_categories = [cat for cat in categories if cat not in CATEGORY_SET]
+    if invalid_categories:
+        return None, f"Invalid categories: {invalid_categories}. Must be one or more of: {list(CATEGORY_VALUES)}"
+
+    memory = {
+        "title": title,
+        "details": details,
+        # Ensure details is proper JSONB
+        "details_json": json.dumps({"text": details}),
+        "categories": categories,
+    }
+
+    if allow_timestamp and data.get("timestamp"):
+        try:
+            memory["timestamp"] = datetime.fromisoformat(str(data["timestamp"]))
+        except ValueError:
+            return None, "Invalid timestamp format"
+
+    return memory, None
+
+
+def insert_memory_params(memories, timestamp):
+    """
+    (title, details, categories, timestamp, embedding) tuples for validated
+    memories (embeddings computed in one call); build_insert_query rows prefix
+    them with their position.
+    """
+    embeddings = embed_memories([(m["title"], m["details"]) for m in memories])
+    return [
+        (m["title"], m["details_json"], m["categories"], m.get("timestamp", timestamp), embedding)
+        for m, embedding in zip(memories, embeddings)
+    ]
+
+
+def insert_query_params(memories, timestamp, owner=None):
+    """build_insert_query rows for validated memories: position, insert_memory_params[, owner]."""
+    extra = (owner,) if owner is not None else ()
+    return [(ord,) + values + extra for ord, values in enumerate(insert_memory_params(memories, timestamp))]
+
+
+@app.route("/remember", methods=["POST"])
+@idempotent
+def remember():
+    """
+    Store a memory with title, details, and multiple categories.
+
+    A memory with the same title and details as a stored one is a duplicate:
+    the response carries the stored memory's id and categories, and
+    ?on_duplicate= (default DUPLICATE_POLICY) says what happens to it.
+
+    With WRITE_BUFFER_ENABLED the memory is journaled locally and acknowledged
+    with 202 and its final id; it is inserted (and readable) shortly after.
+    """
+    if not check_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "No JSON data provided"}), 400
+
+        memory, error = validate_new_memory(data)
+        if error:
+            return jsonify({"error": error}), 400
+        on_duplicate, error = parse_duplicate_policy(request.args)
+        if error:
+            return jsonify({"error": error}), 400
+        title = memory["title"]
+        categories = memory["categories"]
+
+        logging.info(f"Attempting to store memory - Title: {title}, Categories: {categories}")
+
+        timestamp = datetime.now(DISPLAY_TZ)
+
+        if WRITE_BUFFER_ENABLED:
+            try:
+                with timed_phase("journal"):
+                    memory_id = write_buffer.append(memory, timestamp)
+            except WriteBufferUnavailable as e:
+                return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+            return jsonify({
+                "message": f"Memory accepted: '{title}'",
+                "id": memory_id,
+                "categories": categories,
+                "status": "queued"
+            }), 202
+
+        rows = get_memory_store().insert([memory], timestamp, on_duplicate)
+        if rows is None:
+            return jsonify({"error": "Database connection failed"}), 500
+        stored = rows[0]
+
+        if not stored[6]:
+            return jsonify({
+                "message": f"Memory already stored: '{title}'",
+                "id": stored[0],
+                "categories": list(stored[3]),
+                "duplicate": True,
+                "on_duplicate": on_duplicate
+            }), 200
+        return jsonify({
+            "message": f"Memory stored: '{title}'",
+            "id": stored[0],
+            "categories": categories,
+            "duplicate": False
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+
+@app.route("/remember/batch", methods=["POST"])
+@idempotent
+def remember_batch():
+    """
+    Store many memories in one request.
+
+    The body is either a JSON array of memories (or {"memories": [...]}) or NDJSON
+    (one memory per line, Content-Type application/x-ndjson). Each memory takes the
+    same fields as /remember plus an optional ISO `timestamp`, which makes the
+    endpoint suitable for importing historic logs.
+
+    Valid items are inserted in chunked transactions of BATCH_CHUNK_SIZE rows (one
+    execute_values statement each on Postgres); the response carries a status per
+    item, in input order. Items duplicating a stored memory, or an earlier item,
+    are reported as "duplicate" with that memory's id (see /remember).
+    """
+    if not check_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 403
+    on_duplicate, error = parse_duplicate_policy(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    body = request.get_data(as_text=True)
+    if not body.strip():
+        return jsonify({"error": "No data provided"}), 400
+
+    try:
+        if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+            if isinstance(items, dict):
+                items = items.get("memories")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid JSON: {str(e)}"}), 400
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Expected a non-empty list of memories"}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Too many memories in one batch (max {MAX_BATCH_SIZE})"}), 413
+
+    results = [None] * len(items)
+    valid = []
+    now = datetime.now(DISPLAY_TZ)
+    for index, item in enumerate(items):
+        memory, error = validate_new_memory(item, allow_timestamp=True)
+        if error:
+            results[index] = {"index": index, "status": "invalid", "error": error}
+        else:
+            valid.append((index, memory))
+
+    stored_rows = []
+    store = get_memory_store()
+    for start in range(0, len(valid), BATCH_CHUNK_SIZE):
+        chunk = valid[start:start + BATCH_CHUNK_SIZE]
+        try:
+            rows = store.insert([m for _, m in chunk], now, on_duplicate)
+            if rows is None:
+                if not stored_rows:
+                    return jsonify({"error": "Database connection failed"}), 500
+                raise RuntimeError("Database connection failed")
+        except Exception as e:
+            logging.error(f"❌ Batch chunk failed: {str(e)}")
+            for index, _ in chunk:
+                results[index] = {"index": index, "status": "failed", "error": str(e)}
+            continue
+        for (index, _), row in zip(chunk, rows):
+            results[index] = {"index": index, "status": "stored" if row[6] else "duplicate", "id": row[0]}
+        stored_rows.extend(rows)
+
+    stored = sum(1 for row in stored_rows if row[6])
+    duplicates = len(stored_rows) - stored
+    logging.info(f"📥 Batch stored {stored}/{len(items)} memories ({duplicates} duplicates).")
+    return jsonify({
+        "message": f"Stored {stored} of {len(items)} memories",
+        "stored": stored,
+        "duplicates": duplicates,
+        "failed": len(items) - len(stored_rows),
+        "results": results
+    }), 200 if len(stored_rows) == len(items) else 207
+
+
+
+SEARCH_MODES = ("substring", "fulltext", "fuzzy", "semantic")
+COUNT_MODES = ("exact", "estimate")
+
+MEMORY_COLUMNS = "id, title, details, categories, timestamp"
+
+# Values accepted by /recall-or-search?fields=; the last three only appear in
+# some modes (rank: fulltext/fuzzy, snippet: highlight, score: semantic)
+RECALL_FIELDS = ("id", "title", "details", "categories", "timestamp", "rank", "snippet", "score")
+
+
+def recall_columns(fields):
+    """Memory columns to select for a field selection; id and timestamp are always needed for paging."""
+    if not fields:
+        return MEMORY_COLUMNS
+    return ", ".join(column for column in MEMORY_COLUMNS.split(", ")
+                     if column in ("id", "timestamp") or column in fields)
+
+# Columns used internally (keyset ordering) that are not part of a memory's JSON
+HIDDEN_COLUMNS = {"tsq"}
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded or doesn't fit the query."""
+
+
+def encode_cursor(keys):
+    """Encode the sort-key values of the last row on a page into an opaque cursor."""
+    values = [key.isoformat() if isinstance(key, datetime) else key for key in keys]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, expected_length):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list) or len(values) != expected_length:
+        raise InvalidCursor("Cursor does not match this query")
+    return values
+
+
+def build_recall_query(search_term, category, mode="substring", highlight=False, limit=None, after=None,
+                       columns=MEMORY_COLUMNS, owner=None):
+    """
+    Build the SQL, parameters and keyset sort keys for /recall-or-search.
+
+    Modes:
+      - substring: case-insensitive substring match (ILIKE, served by the trigram indexes)
+      - fulltext:  websearch_to_tsquery against search_vector, ordered by ts_rank
+      - fuzzy:     pg_trgm word similarity, ordered by best similarity
+    Search term and category conditions are OR-ed together; `owner` (sharded
+    storage) restricts them to one owner's memories.
+
+    Results are ordered by (timestamp, id) or, for ranked modes, (rank, timestamp, id),
+    all descending; `after` holds those key values from the previous page's last row.
+    `columns` narrows the memory columns returned (see recall_columns).
+    Returns (query, params, sort_keys).
+    """
+    select = [columns]
+    sources = ["memory"]
+    conditions = []
+    params = []
+    where_params = []
+    ranked = False
+
+    if search_term and mode == "fulltext":
+        sources.append("websearch_to_tsquery('english', %s) AS tsq")
+        params.append(search_term)
+        select.append("ts_rank(search_vector, tsq) AS rank")
+        conditions.append("search_vector @@ tsq")
+        ranked = True
+        if highlight:
+            select.append("tsq")
+    elif search_term and mode == "fuzzy":
+        select.append("GREATEST(word_similarity(%s, title), word_similarity(%s, details->>'text')) AS rank")
+        params.extend([search_term, search_term])
+        conditions.append("(%s <%% title OR %s <%% (details->>'text'))")
+        where_params.extend([search_term, search_term])
+        ranked = True
+    elif search_term:
+        conditions.append("(title ILIKE %s OR details->>'text' ILIKE %s)")
+        where_params.extend([f"%{search_term}%", f"%{search_term}%"])
+
+    if category:
+        # Containment (@>) lets the planner use the GIN index on categories
+        conditions.append("categories @> ARRAY[%s]::memory_category[]")
+        where_params.append(category)
+
+    inner = f"""
+            SELECT {', '.join(select)}
+            FROM {', '.join(sources)}"""
+    if owner is not None:
+        inner += """
+            WHERE owner = %s""" + (f" AND ({' OR '.join(conditions)})" if conditions else "")
+        params.append(owner)
+    elif conditions:
+        inner += """
+            WHERE """ + " OR ".join(conditions)
+    params += where_params
+
+    sort_keys = ["rank", "timestamp", "id"] if ranked else ["timestamp", "id"]
+    outer_select = "*"
+    if ranked and highlight and mode == "fulltext":
+        outer_select = (
+            "*, ts_headline('english', coalesce(details->>'text', ''), tsq, "
+            "'StartSel=<b>, StopSel=</b>, MaxFragments=2, MaxWords=20, MinWords=5') AS snippet"
+        )
+
+    query = f"SELECT {outer_select} FROM ({inner}\n        ) AS matches"
+    if after is not None:
+        casts = {"rank": "%s::real", "timestamp": "%s::timestamptz", "id": "%s"}
+        query += f"""
+        WHERE ({', '.join(sort_keys)}) < ({', '.join(casts[key] for key in sort_keys)})"""
+        params += list(after)
+    query += f"""
+        ORDER BY {', '.join(key + ' DESC' for key in sort_keys)}"""
+    if limit is not None:
+        query += """
+        LIMIT %s"""
+        params.append(limit)
+    return query, params, sort_keys
+
+
+def build_count_query(search_term, category, mode, estimate=False, owner=None):
+    """SQL that counts all matches of a recall query, exactly or via the planner's estimate."""
+    query, params, _ = build_recall_query(search_term, category, mode, owner=owner)
+    if estimate:
+        return "EXPLAIN (FORMAT JSON) " + query, params
+    return f"SELECT COUNT(*) FROM ({query}) AS counted", params
+
+
+def count_from_result(row, estimate=False):
+    """Read the total out of the single row returned by build_count_query's SQL."""
+    if not estimate:
+        return row[0]
+    plan = row[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+# json_build_object() value per recall field, mirroring serialize_memory_row; keys
+# are listed in the sorted order jsonify uses
+RECALL_JSON_VALUES = {
+    "categories": "categories",
+    "details": "CASE WHEN jsonb_typeof(details) = 'object' AND details ? 'text' "
+               "THEN details->'text' ELSE to_jsonb(details::text) END",
+    "id": "id",
+    "rank": "round(rank::numeric, 6)",
+    "snippet": "snippet",
+    "timestamp": "timestamp",
+    "title": "title",
+}
+
+# Run before build_recall_json_query's SQL so timestamps render in Chicago time
+RECALL_JSON_TIMEZONE_SQL = f"SET LOCAL TIME ZONE '{DISPLAY_TIMEZONE}'"
+
+
+def build_recall_json_query(spec):
+    """
+    The recall query for a parse_recall_args spec, with Postgres building each
+    memory's API JSON. Rows are (sort keys..., memory_json text), so a page is
+    spliced together by render_recall_body without decoding a row in Python.
+    Returns (query, params, sort_keys).
+    """
+    options = spec["query"]
+    query, params, sort_keys = build_recall_query(**options)
+    available = set(options["columns"].split(", "))
+    if sort_keys[0] == "rank":
+        available.add("rank")
+        if options["highlight"] and options["mode"] == "fulltext":
+            available.add("snippet")
+    keys = [key for key in RECALL_JSON_VALUES if key in available and (not spec["fields"] or key in spec["fields"])]
+    memory_json = ", ".join(f"'{key}', {RECALL_JSON_VALUES[key]}" for key in keys)
+    json_query = f"""
+        SELECT {', '.join(sort_keys)}, json_build_object({memory_json})::text AS memory_json
+        FROM ({query}
+        ) AS page
+        ORDER BY {', '.join(key + ' DESC' for key in sort_keys)}"""
+    return json_query, params, sort_keys
+
+
+def render_recall_body(spec, columns, rows, total=None):
+    """
+    Serialize a recall result to (body bytes, status). Rows from
+    build_recall_json_query are spliced in as Postgres built them; any other
+    rows go through build_recall_payload and dumps_json.
+    """
+    if not rows or columns[-1] != "memory_json":
+        payload, status = build_recall_payload(spec, columns, rows, total)
+        return dumps_json(payload), status
+
+    limit = spec["limit"]
+    page = rows[:limit]
+    rest = {
+        "next_cursor": encode_cursor(page[-1][:-1]) if len(rows) > limit else None,
+        "total_found": total if total is not None else len(page),
+    }
+    if spec["count_mode"] == "estimate":
+        rest["total_is_estimate"] = True
+    # "memories" sorts before the remaining keys, matching jsonify's key order
+    return b'{"memories":[' + ",".join(row[-1] for row in page).encode() + b"]," + dumps_json(rest)[1:], 200
+
+
+def count_recall_matches(cursor, search_term, category, mode, estimate=False, owner=None):
+    """Count all matches of a recall query, exactly or from the planner's row estimate."""
+    cursor.execute(*build_count_query(search_term, category, mode, estimate, owner))
+    return count_from_result(cursor.fetchone(), estimate)
+
+
+def serialize_memory_row(row, columns, tz=DISPLAY_TZ, fields=None):
+    """
+    Turn a memory row (with column names `columns`) into the API's JSON shape,
+    keeping only `fields` when given.
+    """
+    values = dict(zip(columns, row))
+    memory = {"id": values.pop("id")}
+    if "title" in values:
+        memory["title"] = values.pop("title")
+    if "details" in values:
+        details = values.pop("details")
+        if isinstance(details, str):
+            details = json.loads(details)
+        memory["details"] = details["text"] if isinstance(details, dict) and "text" in details else str(details)
+    if "categories" in values:
+        categories = values.pop("categories")
+        # psycopg2 hands enum arrays back as '{a,b}' text
+        if isinstance(categories, str):
+            categories = categories[1:-1].split(",") if len(categories) > 2 else []
+        memory["categories"] = categories
+    if "timestamp" in values:
+        # Convert timestamp to Chicago time
+        timestamp = values.pop("timestamp")
+        memory["timestamp"] = timestamp.astimezone(tz).isoformat() if timestamp else None
+    for name, value in values.items():
+        if name not in HIDDEN_COLUMNS:
+            memory[name] = round(value, 6) if isinstance(value, float) else value
+    if fields:
+        memory = {name: value for name, value in memory.items() if name in fields}
+    return memory
+
+
+def _parse_limit(raw, default):
+    """Parse a `limit` query parameter, clamped to MAX_PAGE_SIZE."""
+    if raw in (None, ""):
+        return default
+    limit = int(raw)
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_recall_args(args):
+    """
+    Validate /recall-or-search query parameters.
+
+    Returns (spec, error). spec holds the normalized parameters, the keyword
+    arguments for build_recall_query under "query" (fetching one extra row to
+    learn whether another page exists) and a "cache_key".
+    """
+    search_term = args.get("search", "").strip()
+    category = args.get("category", "").strip()
+    mode = args.get("mode", "substring").strip().lower()
+    highlight = args.get("highlight", "").lower() in ("1", "true", "yes")
+    page_cursor = args.get("cursor", "").strip()
+    count_mode = args.get("count", "").strip().lower()
+    fields = tuple(sorted({field.strip().lower() for field in args.get("fields", "").split(",") if field.strip()}))
+    archive = args.get("archive", "").strip().lower()
+
+    if mode not in SEARCH_MODES:
+        return None, f"Invalid mode '{mode}'. Must be one of: {list(SEARCH_MODES)}"
+    if count_mode and count_mode not in COUNT_MODES:
+        return None, f"Invalid count '{count_mode}'. Must be one of: {list(COUNT_MODES)}"
+    invalid_fields = [field for field in fields if field not in RECALL_FIELDS]
+    if invalid_fields:
+        return None, f"Invalid fields: {invalid_fields}. Must be a comma-separated subset of: {list(RECALL_FIELDS)}"
+
+    try:
+        # Recent memories (no search parameters) default to the latest 10
+        default_limit = DEFAULT_PAGE_SIZE if search_term or category else 10
+        limit = _parse_limit(args.get("limit"), default_limit)
+    except ValueError:
+        return None, "limit must be a positive integer"
+
+    if mode == "semantic":
+        if not search_term:
+            return None, "mode=semantic requires a search term"
+        if not EMBEDDINGS_ENABLED:
+            return None, "Semantic recall is unavailable (numpy is not installed or EMBEDDINGS_ENABLED=false)"
+        if page_cursor:
+            return None, "mode=semantic returns a single top-k page and does not take a cursor"
+
+    if archive:
+        if archive not in ARCHIVE_MODES:
+            return None, f"Invalid archive '{archive}'. Must be one of: {list(ARCHIVE_MODES)}"
+        if archive != "none" and not ARCHIVE_ENABLED:
+            return None, "The archive is not enabled (ARCHIVE_ENABLED=false)"
+        if archive != "none" and mode != "substring":
+            return None, "archive search only supports mode=substring"
+    else:
+        # Ranked modes have no archive counterpart, so they stay on the hot table by default
+        archive = ARCHIVE_RECALL_DEFAULT if ARCHIVE_ENABLED and mode == "substring" else "none"
+
+    try:
+        _, _, sort_keys = build_recall_query(search_term, category, mode)
+        after = decode_cursor(page_cursor, len(sort_keys)) if page_cursor else None
+    except InvalidCursor as e:
+        return None, str(e)
+
+    return {
+        "search_term": search_term,
+        "category": category,
+        "mode": mode,
+        "limit": limit,
+        "count_mode": count_mode,
+        "fields": fields or None,
+        "archive": archive,
+        "query": {
+            "search_term": search_term,
+            "category": category,
+            "mode": mode,
+            "highlight": highlight,
+            "limit": limit + 1,
+            "after": after,
+            "columns": recall_columns(fields),
+        },
+        # Normalized parameters (all search modes are case-insensitive)
+        "cache_key": (search_term.lower(), category, mode, highlight, limit, page_cursor, count_mode, fields, archive),
+    }, None
+
+
+def build_recall_payload(spec, columns, rows, total=None):
+    """Turn fetched recall rows into the (payload, status) returned to the client."""
+    limit = spec["limit"]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    memories = [serialize_memory_row(row, columns, DISPLAY_TZ, spec["fields"]) for row in rows]
+
+    if not memories:
+        return {
+            "message": "No memories found matching your search.",
+            "suggestion": "Try a different search term or category."
+        }, 404
+
+    next_cursor = None
+    if has_more:
+        last = dict(zip(columns, rows[-1]))
+        _, _, sort_keys = build_recall_query(spec["search_term"], spec["category"], spec["mode"])
+        next_cursor = encode_cursor([last[key] for key in sort_keys])
+
+    payload = {
+        "memories": memories,
+        "total_found": total if total is not None else len(memories),
+        "next_cursor": next_cursor
+    }
+    if spec["count_mode"] == "estimate":
+        payload["total_is_estimate"] = True
+    return payload, 200
+
+
+def _cached_recall_response(cache_key, search_term, category, body, status, validators, generation):
+    """
+    Wrap a serialized recall result in a response and store it in the read
+    cache, unless a write invalidated the cache after `generation` was read.
+    """
+    response = Response(body, status=status, mimetype="application/json")
+    _set_validators(response.headers, validators)
+    # A lagging replica may still miss the latest write, which has already invalidated the cache
+    if CACHE_ENABLED and (not g.get("read_replica") or replica_router.settled()):
+        # Only pure category lookups can be invalidated per category
+        tags = {f"category:{category}"} if category and not search_term else {"all"}
+        if query_cache.put(cache_key, (body, status, validators), tags, generation):
+            response.headers["X-Cache"] = "MISS"
+    return response
+
+
+def _set_validators(headers, validators):
+    etag, last_modified = validators
+    headers["ETag"] = etag
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+
+
+@app.route("/recall-or-search", methods=["GET"])
+def recall_or_search():
+    """
+    Retrieve memories by title, details, or categories, converting timestamps to Chicago time.
+
+    Query parameters:
+      - search: text to look for in titles and details
+      - category: a single category value
+      - mode: substring (default), fulltext (ranked), fuzzy (trigram similarity) or
+              semantic (embedding cosine similarity; category becomes an AND filter)
+      - highlight: with mode=fulltext, include a highlighted `snippet` per memory
+      - limit: page size (default 10 without filters, DEFAULT_PAGE_SIZE with; capped at MAX_PAGE_SIZE)
+      - cursor: the `next_cursor` from a previous page
+      - count: exact or estimate, to report the total number of matches in `total_found`
+      - fields: comma-separated subset of RECALL_FIELDS to return per memory, e.g. title,timestamp
+      - archive: none, fallback or include (see ARCHIVE_MODES); substring mode only,
+                 defaults to ARCHIVE_RECALL_DEFAULT when ARCHIVE_ENABLED
+
+    Responses carry an ETag and Last-Modified derived from the store version;
+    a matching If-None-Match (or If-Modified-Since) gets a 304 without running the query.
+    """
+    if not check_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    spec, error = parse_recall_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    store = get_memory_store()
+    if spec["mode"] not in store.search_modes:
+        return jsonify({"error": f"mode={spec['mode']} is not available with STORAGE_BACKEND={store.name}"}), 400
+
+    # Sharded storage serves each owner its own page
+    cache_key = spec["cache_key"] + (g.get("owner"),)
+    if CACHE_ENABLED:
+        if CACHE_LISTEN:
+            cache_listener.start()
+        cached = query_cache.get(cache_key)
+        if cached is not None and not CACHE_LISTEN:
+            # Without LISTEN other processes' writes never reach this cache: check the store version
+            version = store.version()
+            if version is None or store_validators(*version)[0] != cached[2][0]:
+                cached = None
+        if cached is not None:
+            body, status, validators = cached
+            if is_not_modified(request.headers, *validators):
+                return not_modified_response(*validators)
+            response = Response(body, status=status, mimetype="application/json", headers={"X-Cache": "HIT"})
+            _set_validators(response.headers, validators)
+            return response
+
+    # Read before the query, so a write landing while it runs keeps the result out of the cache
+    generation = query_cache.generation
+    try:
+        fetched = store.recall(spec, lambda version: is_not_modified(request.headers, *store_validators(*version)))
+        if fetched is None:
+            return jsonify({"error": "Database connection failed"}), 500
+        version, result = fetched
+        validators = store_validators(*version)
+        if result is None:
+            return not_modified_response(*validators)
+        columns, rows, total = result
+
+        if spec["archive"] != "none":
+            with timed_phase("archive"):
+                rows, total = merge_archive_recall(spec, columns, rows, total)
+
+        with timed_phase("serialize"):
+            body, status = render_recall_body(spec, columns, rows, total)
+        return _cached_recall_response(cache_key, spec["search_term"], spec["category"], body, status, validators,
+                                       generation)
+
+    except Exception as e:
+        logging.error(f"❌ ERROR in /recall-or-search: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+
+def parse_memory_changes(data):
+    """
+    Validate an /edit body.
+    Returns (changes, error): changes maps title, details (a JSON document),
+    categories and timestamp to their new values; error is a message or None.
+    """
+    if not data:
+        return None, "No JSON data provided for update"
+
+    new_title = data.get("title")
+    new_details = data.get("details")
+    new_categories = data.get("categories")
+    new_timestamp = data.get("timestamp")  # new timestamp for updating
+
+    if new_title is None and new_details is None and new_categories is None and new_timestamp is None:
+        return None, "No update fields provided"
+
+    if new_categories is not None:
+        if not isinstance(new_categories, list):
+            return None, "Categories must be provided as a list"
+        new_categories = [cat.strip() if isinstance(cat, str) else cat for cat in new_categories]
+        invalid_categories = [cat for cat in new_categories if cat not in CATEGORY_SET]
+        if invalid_categories:
+            return None, f"Invalid categories: {invalid_categories}. Must be one or more of: {list(CATEGORY_VALUES)}"
+
+    if new_timestamp is not None:
+        try:
+            new_timestamp_parsed = datetime.fromisoformat(new_timestamp)
+        except (TypeError, ValueError):
+            return None, "Invalid new timestamp format"
+
+    changes = {}
+
+    if new_title is not None:
+        changes["title"] = str(new_title).strip()
+
+    if new_details is not None:
+        if isinstance(new_details, str):
+            changes["details"] = json.dumps({"text": new_details.strip()})
+        elif isinstance(new_details, dict):
+            changes["details"] = json.dumps(new_details)
+        else:
+            return None, "Invalid format for details"
+
+    if new_categories is not None:
+        changes["categories"] = new_categories
+
+    if new_timestamp is not None:
+        changes["timestamp"] = new_timestamp_parsed
+
+    if not changes:
+        return None, "No valid fields to update"
+    return changes, None
+
+
+# SET clause per field of parse_memory_changes
+UPDATE_SET_CLAUSES = {
+    "title": "title = %s",
+    "details": "details = %s::jsonb",
+    "categories": "categories = %s::memory_category[]",
+    "timestamp": "timestamp = %s",
+}
+
+
+def parse_memory_update(data):
+    """
+    Validate an /edit body and turn it into SET clauses.
+    Returns (update_parts, values, error) where error is a message or None.
+    """
+    changes, error = parse_memory_changes(data)
+    if error:
+        return None, None, error
+    return [UPDATE_SET_CLAUSES[name] for name in changes], list(changes.values()), None
+
+
+SELECT_BY_ID_SQL = f"SELECT {MEMORY_COLUMNS} FROM memory WHERE id = %s"
+
+# Each delete is a single statement; the title variant picks the most recent match.
+DELETE_BY_ID_SQL = """
+    DELETE FROM memory
+    WHERE id = %s
+    RETURNING id, categories::text[]
+"""
+
+DELETE_LATEST_BY_TITLE_SQL = """
+    DELETE FROM memory
+    WHERE id = (
+        SELECT id FROM memory
+        WHERE title = %s
+        ORDER BY timestamp DESC
+        LIMIT 1
+        FOR UPDATE
+    )
+    RETURNING id, categories::text[]
+"""
+
+# How an update identifies its row; parameters follow the SET values.
+UPDATE_MATCHES = {
+    "id": "m.id = %s",
+    "title_timestamp": "m.title = %s AND m.timestamp = %s::timestamptz",
+    "title_latest": """m.id = (
+            SELECT id FROM memory
+            WHERE title = %s
+            ORDER BY timestamp DESC
+            LIMIT 1
+            FOR UPDATE
+        )""",
+}
+
+
+def build_edit_query(update_parts, match="title_timestamp", matches=UPDATE_MATCHES):
+    """
+    Single UPDATE statement for /edit and PUT /memory/<id>.
+
+    Parameters are the SET values followed by the identifiers named by `match`
+    (see UPDATE_MATCHES, or SHARD_UPDATE_MATCHES for owner-scoped updates).
+    Self-joins so RETURNING also reports the categories before the update,
+    which tells the read cache exactly which category entries went stale.
+    """
+    return f"""
+        UPDATE memory AS m
+        SET {', '.join(update_parts)}
+        FROM memory AS old
+        WHERE old.id = m.id AND {matches[match]}
+        RETURNING m.id, m.title, m.details, m.categories::text[], m.timestamp, m.updated_at,
+                  old.categories::text[]
+    """
+
+
+def delete_memories(query, params):
+    """
+    Run a DELETE ... RETURNING id, categories statement and do the cache and
+    backup bookkeeping. Returns the deleted ids, or None if the database is
+    unreachable.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+    cursor = conn.cursor()
+    try:
+        with timed_phase("query"):
+            cursor.execute(query, params)
+            deleted_rows = cursor.fetchall()
+            tags = write_invalidation_tags(*(row[1] for row in deleted_rows))
+            if deleted_rows:
+                publish_cache_invalidation(cursor, tags)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+
+    invalidate_cache(tags)
+    for row in deleted_rows:
+        record_memory_change("delete", memory_id=row[0])
+    return [row[0] for row in deleted_rows]
+
+
+def update_memories(query, params):
+    """
+    Run an UPDATE built by build_edit_query and do the cache and backup
+    bookkeeping. Returns the updated rows, or None if the database is unreachable.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+    cursor = conn.cursor()
+    try:
+        with timed_phase("query"):
+            cursor.execute(query, params)
+            updated_rows = cursor.fetchall()
+            for statement in embedding_update_statements(updated_rows):
+                cursor.execute(*statement)
+            tags = write_invalidation_tags(*(row[3] for row in updated_rows), *(row[6] for row in updated_rows))
+            if updated_rows:
+                publish_cache_invalidation(cursor, tags)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+
+    invalidate_cache(tags)
+    for row in updated_rows:
+        record_memory_change("update", row=row)
+    return updated_rows
+
+
+@app.route("/delete", methods=["DELETE"])
+def delete_memory():
+    """
+    Delete a specific memory by title. If multiple exist, deletes the most recent one.
+    Prefer DELETE /memory/<id> when the id is known.
+    """
+    if not check_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    title = request.args.get("title")
+    if not title:
+        return jsonify({"error": "Missing title"}), 400
+
+    try:
+        deleted_ids = get_memory_store().delete("title_latest", title)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if deleted_ids is None:
+        return jsonify({"error": "Database connection failed"}), 500
+
+    if deleted_ids:
+        return jsonify({"message": f"Memory deleted: '{title}'", "id": deleted_ids[0]}), 200
+    else:
+        return jsonify({"error": "Memory not found"}), 404
+
+
+
+@app.route("/edit", methods=["PUT"])
+def edit_memory():
+    """
+    Edit an existing memory.
+
+    Identification:
+      Provide original_title and (optionally) original_timestamp as query parameters.
+      If original_timestamp is omitted, the most recent memory with that title is used.
+      Prefer PUT /memory/<id> when the id is known.
+
+    In the JSON body, include any fields to update:
+      - title: New title (optional)
+      - details: New details (optional; string or dict)
+      - categories: New categories (optional; must be a list of valid category values)
+      - timestamp: New timestamp (optional; to update the memory's timestamp)
+    """
+    if not check_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    # Use the new query parameter names for identifying the memory.
+    original_title = request.args.get("original_title")
+    original_timestamp_str = request.args.get("original_timestamp")  # optional
+
+    if not original_title:
+        return jsonify({"error": "Missing original title to identify the memory"}), 400
+
+    if original_timestamp_str:
+        try:
+            datetime.fromisoformat(original_timestamp_str)
+        except ValueError:
+            return jsonify({"error": "Invalid original timestamp format"}), 400
+
+    changes, error = parse_memory_changes(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
+
+    # Without original_timestamp, the most recent memory with that title is updated.
+    if original_timestamp_str:
+        match, identifiers = "title_timestamp", (original_title, original_timestamp_str)
+        not_found = "Memory not found or no changes made"
+    else:
+        match, identifiers = "title_latest", (original_title,)
+        not_found = "Memory not found for the given title"
+
+    try:
+        updated_rows = get_memory_store().update(changes, match, identifiers)
+    except psycopg2.errors.UniqueViolation:
+        return jsonify({"error": DUPLICATE_EDIT_ERROR}), 409
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if updated_rows is None:
+        return jsonify({"error": "Database connection failed"}), 500
+    if not updated_rows:
+        return jsonify({"error": not_found}), 404
+
+    return jsonify({"message": "Memory updated successfully", "id": updated_rows[0][0]}), 200
+
+
+@app.route("/memory/<int:memory_id>", methods=["GET"])
+def get_memory(memory_id):
+    """Fetch one memory by id."""
+    if not check_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    try:
+        found = get_memory_store().get(memory_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if found is None:
+        return jsonify({"error": "Database connection failed"}), 500
+
+    columns, row = found
+    if not row:
+        record = memory_archive.get(memory_id) if ARCHIVE_ENABLED else None
+        if record is None:
+            return jsonify({"error": "Memory not found"}), 404
+        memory = serialize_memory_row([record[column] for column in ARCHIVE_COLUMNS], ARCHIVE_COLUMNS,
+                                      DISPLAY_TZ)
+        return jsonify({**memory, "archived": True}), 200
+    return jsonify(serialize_memory_row(row, columns, DISPLAY_TZ)), 200
+
+
+@app.route("/memory/<int:memory_id>", methods=["PUT"])
+def update_memory(memory_id):
+    """Update one memory by id; the JSON body takes the same fields as /edit."""
+    if not check_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    changes, error = parse_memory_changes(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        updated_rows = get_memory_store().update(changes, "id", (memory_id,))
+    except psycopg2.errors.UniqueViolation:
+        return jsonify({"error": DUPLICATE_EDIT_ERROR}), 409
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if updated_rows is None:
+        return jsonify({"error": "Database connection failed"}), 500
+    if not updated_rows:
+        return jsonify({"error": "Memory not found"}), 404
+    return jsonify({"message": "Memory updated successfully", "id": memory_id}), 200
+
+
+@app.route("/memory/<int:memory_id>", methods=["DELETE"])
+def delete_memory_by_id(memory_id):
+    """Delete one memory by id."""
+    if not check_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    try:
+        deleted_ids = get_memory_store().delete("id", memory_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if deleted_ids is None:
+        return jsonify({"error": "Database connection failed"}), 500
+    if not deleted_ids:
+        return jsonify({"error": "Memory not found"}), 404
+    return jsonify({"message": "Memory deleted", "id": memory_id}), 200
+
+
+###############################################################################
+#                             STORAGE BACKENDS                                 #
+###############################################################################
+
+class MemoryStore:
+    """
+    What /remember, /remember/batch, /recall-or-search, /edit, /delete and
+    /memory/<id> need from a storage backend (STORAGE_BACKEND).
+
+    Written rows are (id, title, details, categories, timestamp, updated_at);
+    insert adds whether each memory was new, false when it duplicated a stored
+    one (see DUPLICATE_POLICIES).
+    Methods return None when the backend is unreachable and do their own cache
+    bookkeeping after committing. SqliteMemoryStore (sqlite_store.py) follows
+    the same interface without importing this module.
+    """
+
+    name = None
+    search_modes = SEARCH_MODES
+
+    def insert(self, memories, timestamp, on_duplicate=DUPLICATE_POLICY):
+        """Store memories from validate_new_memory; returns their rows in input order."""
+        raise NotImplementedError
+
+    def recall(self, spec, not_modified=None):
+        """
+        Run a parse_recall_args spec. Returns (version, result): version is the
+        store's (version, modified_at), read before the rows; result is
+        (columns, rows, total), or None when not_modified(version) is true.
+        """
+        raise NotImplementedError
+
+    def version(self):
+        """The store's (version, modified_at) as recall reads it, without the rows."""
+        raise NotImplementedError
+
+    def get(self, memory_id):
+        """(columns, row) for one memory; row is None if it doesn't exist."""
+        raise NotImplementedError
+
+    def update(self, changes, match, identifiers):
+        """Apply parse_memory_changes output to the memory picked by `match` (see UPDATE_MATCHES); returns rows."""
+        raise NotImplementedError
+
+    def delete(self, match, identifier):
+        """Delete the memory picked by `match` ("id" or "title_latest"); returns the deleted ids."""
+        raise NotImplementedError
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+class PostgresMemoryStore(MemoryStore):
+    """The PostgreSQL backend: shared connection pool, NOTIFY cache invalidation and backups."""
+
+    name = "postgres"
+
+    def insert(self, memories, timestamp, on_duplicate=DUPLICATE_POLICY):
+        conn = get_db_connection()
+        if not conn:
+            return None
+        cursor = conn.cursor()
+        try:
+            with timed_phase("query"):
+                params = insert_query_params(memories, timestamp)
+                if len(params) == 1:
+                    values = INSERT_VALUES_TEMPLATE
+                    cursor.execute(build_insert_query(on_duplicate, values), params[0])
+                    rows = cursor.fetchall()
+                else:
+                    # One statement, so duplicates within the batch are folded too
+                    rows = psycopg2.extras.execute_values(
+                        cursor,
+                        build_insert_query(on_duplicate),
+                        params,
+                        template=INSERT_VALUES_TEMPLATE,
+                        page_size=len(params),
+                        fetch=True,
+                    )
+                # A merged or bumped duplicate also leaves its stored categories' entries stale
+                tags = write_invalidation_tags(*(memory["categories"] for memory in memories),
+                                               *(row[3] for row in rows))
+                publish_cache_invalidation(cursor, tags)
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            release_db_connection(conn)
+
+        invalidate_cache(tags)
+        # Log the writes for the background backup worker
+        record_memory_changes("insert", [row for row in rows if row[6]])
+        if on_duplicate != "skip":
+            record_memory_changes("update", [row for row in rows if not row[6]])
+        return rows
+
+    def recall(self, spec, not_modified=None):
+        # The embedding index syncs incrementally, so semantic recall stays on the primary
+        conn = get_db_connection(read_only=spec["mode"] != "semantic")
+        if not conn:
+            return None
+        cursor = conn.cursor()
+        try:
+            with timed_phase("query"):
+                # Read the version before the rows: a write landing in between only
+                # makes the next poll refetch, never serves stale rows as current
+                cursor.execute(STORE_VERSION_SQL)
+                version = cursor.fetchone()
+            if not_modified and not_modified(version):
+                return version, None
+
+            with timed_phase("query"):
+                if spec["mode"] == "semantic":
+                    columns, rows = semantic_recall(cursor, spec)
+                elif RECALL_SQL_JSON and spec["archive"] == "none":
+                    cursor.execute(RECALL_JSON_TIMEZONE_SQL)
+                    query, params, _ = build_recall_json_query(spec)
+                    cursor.execute(query, params)
+                    columns = [column.name for column in cursor.description]
+                    rows = cursor.fetchall()
+                else:
+                    query, params, _ = build_recall_query(**spec["query"])
+                    cursor.execute(query, params)
+                    columns = [column.name for column in cursor.description]
+                    rows = cursor.fetchall()
+
+                total = None
+                if spec["count_mode"] and spec["mode"] != "semantic":
+                    total = count_recall_matches(cursor, spec["search_term"], spec["category"], spec["mode"],
+                                                 estimate=spec["count_mode"] == "estimate")
+            return version, (columns, rows, total)
+        finally:
+            cursor.close()
+            release_db_connection(conn)
+
+    def version(self):
+        conn = get_db_connection(read_only=True)
+        if not conn:
+            return None
+        cursor = conn.cursor()
+        try:
+            with timed_phase("query"):
+                cursor.execute(STORE_VERSION_SQL)
+                return cursor.fetchone()
+        finally:
+            cursor.close()
+            release_db_connection(conn)
+
+    def get(self, memory_id):
+        conn = get_db_connection(read_only=True)
+        if not conn:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute(SELECT_BY_ID_SQL, (memory_id,))
+            columns = [column.name for column in cursor.description]
+            row = cursor.fetchone()
+            cursor.close()
+        finally:
+            release_db_connection(conn)
+        return columns, row
+
+    def update(self, changes, match, identifiers):
+        query = build_edit_query([UPDATE_SET_CLAUSES[name] for name in changes], match)
+        return update_memories(query, tuple(changes.values()) + tuple(identifiers))
 
-    if new_timestamp is not None:
-        update_parts.append("timestamp = %s")
-        values.append(new_timestamp_parsed)
+    def delete(self, match, identifier):
+        query = DELETE_BY_ID_SQL if match == "id" else DELETE_LATEST_BY_TITLE_SQL
+        return delete_memories(query, (identifier,))
 
-    if not update_parts:
-        cursor.close()
-        conn.close()
-        return jsonify({"error": "No valid fields to update"}), 400
 
-    query = f"""
-        UPDATE memory
-        SET {', '.join(update_parts)}
-        WHERE title = %s AND timestamp = %s::timestamptz
+_memory_store = None
+_memory_store_lock = threading.Lock()
+
+
+def get_memory_store():
+    """Return the MemoryStore for STORAGE_BACKEND, creating it on first use."""
+    global _memory_store
+    if _memory_store is None:
+        with _memory_store_lock:
+            if _memory_store is None:
+                if STORAGE_BACKEND == "sqlite":
+                    from sqlite_store import SqliteMemoryStore
+                    _memory_store = SqliteMemoryStore(
+                        SQLITE_PATH,
+                        CATEGORY_VALUES,
+                        on_write=lambda *category_lists: invalidate_cache(write_invalidation_tags(*category_lists)),
+                    )
+                elif STORAGE_BACKEND == "sharded":
+                    _memory_store = ShardedMemoryStore(SHARD_URLS, SHARD_PLACEMENT_TTL)
+                else:
+                    _memory_store = PostgresMemoryStore()
+    return _memory_store
+
+
+# Endpoints built on Postgres-only features: the trigger-maintained summary,
+# the structured query and /context SQL, server-side export cursors and LISTEN/NOTIFY
+POSTGRES_ONLY_ENDPOINTS = {"memory_stats", "structured_query", "export_memories", "changes_stream", "context_bundle"}
+
+
+@app.before_request
+def require_postgres_backend():
+    if not POSTGRES_BACKEND and request.endpoint in POSTGRES_ONLY_ENDPOINTS:
+        return jsonify({"error": f"{request.path} is not available with STORAGE_BACKEND={STORAGE_BACKEND}"}), 501
+
+
+###############################################################################
+#                             SHARDING                                         #
+###############################################################################
+
+# With STORAGE_BACKEND=sharded every memory belongs to the owner named by the
+# X-Owner-ID header; "*" reads across all owners (scatter-gather)
+DEFAULT_OWNER = "default"
+ALL_OWNERS = "*"
+OWNER_PATTERN = re.compile(r"^[A-Za-z0-9_.@:-]{1,128}$")
+
+# Each shard's id sequence steps by the stride from its own offset (see
+# init_shards), so ids stay unique across shards and survive moves
+SHARD_ID_STRIDE = 64
+
+SHARD_SELECT_BY_ID_SQL = f"SELECT {MEMORY_COLUMNS} FROM memory WHERE id = %s AND owner = %s"
+
+SHARD_DELETE_BY_ID_SQL = """
+    DELETE FROM memory
+    WHERE id = %s AND owner = %s
+    RETURNING id, categories::text[]
+"""
+
+SHARD_DELETE_LATEST_BY_TITLE_SQL = """
+    DELETE FROM memory
+    WHERE id = (
+        SELECT id FROM memory
+        WHERE title = %s AND owner = %s
+        ORDER BY timestamp DESC
+        LIMIT 1
+        FOR UPDATE
+    )
+    RETURNING id, categories::text[]
+"""
+
+# UPDATE_MATCHES scoped to one owner, whose id is the last parameter
+SHARD_UPDATE_MATCHES = {
+    "id": "m.id = %s AND m.owner = %s",
+    "title_timestamp": "m.title = %s AND m.timestamp = %s::timestamptz AND m.owner = %s",
+    "title_latest": """m.id = (
+            SELECT id FROM memory
+            WHERE title = %s AND owner = %s
+            ORDER BY timestamp DESC
+            LIMIT 1
+            FOR UPDATE
+        )""",
+}
+
+SHARD_PLACEMENTS_SQL = "SELECT owner, shard FROM memory_owner_shards"
+
+SHARD_PLACE_OWNER_SQL = """
+    INSERT INTO memory_owner_shards (owner, shard) VALUES (%s, %s)
+    ON CONFLICT (owner) DO UPDATE SET shard = EXCLUDED.shard, placed_at = now()
+"""
+
+# Rows as copied between shards, details and categories as text
+SHARD_COPY_COLUMNS = "id, title, details::text, categories::text, timestamp, updated_at, embedding, owner"
+
+SHARD_COPY_SQL = f"""
+    INSERT INTO memory (id, title, details, categories, timestamp, updated_at, embedding, owner)
+    VALUES %s
+    ON CONFLICT (id) DO UPDATE
+        SET title = EXCLUDED.title, details = EXCLUDED.details, categories = EXCLUDED.categories,
+            timestamp = EXCLUDED.timestamp, embedding = EXCLUDED.embedding, owner = EXCLUDED.owner
+"""
+
+# One fingerprint per memory, to find what changed while an owner was being copied
+SHARD_FINGERPRINT_SQL = """
+    SELECT id, md5(ROW(title, details, categories, timestamp)::text) FROM memory WHERE owner = %s
+"""
+
+SHARD_QUERY_SECONDS = Histogram(
+    "memory_api_shard_query_seconds",
+    "Time spent in each shard's transactions, by operation.",
+    ("shard", "op"),
+)
+
+
+def parse_owner(headers):
+    """The owner of a request as (owner, error): X-Owner-ID, DEFAULT_OWNER when absent."""
+    owner = headers.get("X-Owner-ID", DEFAULT_OWNER).strip()
+    if owner == ALL_OWNERS or OWNER_PATTERN.match(owner):
+        return owner, None
+    return None, "X-Owner-ID must be 1-128 letters, digits or _.@:- characters (or * to read across owners)"
+
+
+@app.before_request
+def resolve_owner():
+    if STORAGE_BACKEND != "sharded":
+        return None
+    owner, error = parse_owner(request.headers)
+    if error:
+        return jsonify({"error": error}), 400
+    if owner == ALL_OWNERS and is_write_request(request.method, request.path):
+        return jsonify({"error": "X-Owner-ID: * is read-only; name the owner to write"}), 400
+    g.owner = owner
+    return None
+
+
+def current_owner():
+    """The request's owner for ShardedMemoryStore, or None to span all owners."""
+    owner = g.get("owner", DEFAULT_OWNER) if has_app_context() else DEFAULT_OWNER
+    return None if owner == ALL_OWNERS else owner
+
+
+def owner_scoped_spec(spec, owner):
+    """A parse_recall_args spec whose queries only match `owner`'s memories."""
+    return dict(spec, query=dict(spec["query"], owner=owner))
+
+
+def merge_shard_recall(spec, results):
     """
-    values.extend([original_title, original_timestamp_str])
+    Merge per-shard recall results into one (columns, rows, total): every
+    shard's page is already sorted on the same keyset, so the merged page is
+    the first limit + 1 rows of the combined order.
+    """
+    columns = results[0][0]
+    _, _, sort_keys = build_recall_query(spec["search_term"], spec["category"], spec["mode"])
+    positions = [columns.index(key) for key in sort_keys]
+    rows = [row for _, shard_rows, _ in results for row in shard_rows]
+    rows.sort(key=lambda row: tuple(row[position] for position in positions), reverse=True)
+    totals = [total for _, _, total in results]
+    total = None if None in totals else sum(totals)
+    return columns, rows[:spec["limit"] + 1], total
 
-    try:
-        cursor.execute(query, tuple(values))
-        if cursor.rowcount == 0:
+
+class Shard:
+    """One SHARD_URLS database and its connection pool."""
+
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+        self.pool = None
+        self.counters = {"transactions": 0, "errors": 0}
+
+
+class ShardedMemoryStore(MemoryStore):
+    """
+    Spreads owners over the Postgres databases in SHARD_URLS.
+
+    An owner lives on one shard: the one named in the placement table on shard0
+    (memory_owner_shards, written by init_shards and move_owner), else its
+    rendezvous-hash home, so adding a shard only re-homes owners that have no
+    placement yet. Placements are cached for SHARD_PLACEMENT_TTL seconds; a
+    write that reaches the shard an owner has left is refused there (see
+    migration 11), and is retried once after reloading them. Reads across all
+    owners query every shard concurrently and merge the pages.
+    """
+
+    name = "sharded"
+    search_modes = ("substring", "fulltext", "fuzzy")
+
+    def __init__(self, urls, placement_ttl):
+        self.shards = [Shard(f"shard{index}", url) for index, url in enumerate(urls)]
+        self.by_name = {shard.name: shard for shard in self.shards}
+        self.placement_ttl = placement_ttl
+        self._placements = None
+        self._placements_loaded = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(self.shards)), thread_name_prefix="shard")
+        self.counters = {"placement_loads": 0, "moved_retries": 0, "scatter_reads": 0}
+
+    def home_shard(self, owner):
+        """The rendezvous-hash shard for an owner without a placement."""
+        return max(self.shards, key=lambda shard: hashlib.blake2b(
+            f"{shard.name}/{owner}".encode(), digest_size=8).digest())
+
+    def placements(self, refresh=False):
+        """owner -> shard name overrides from shard0, reloaded every placement_ttl seconds."""
+        if refresh or time.monotonic() - self._placements_loaded > self.placement_ttl:
+            try:
+                rows = self._run(self.shards[0], "placements", lambda cursor: (
+                    cursor.execute(SHARD_PLACEMENTS_SQL), cursor.fetchall())[1])
+            except psycopg2.Error as e:
+                rows = None
+                logging.error(f"❌ Loading shard placements failed: {str(e).strip()}")
+            if rows is not None:
+                self._placements = dict(rows)
+                self._placements_loaded = time.monotonic()
+                self.counters["placement_loads"] += 1
+            elif self._placements is None:
+                # Guessing the hash home could split an owner across shards
+                raise RuntimeError("Shard placements are unavailable (shard0 unreachable)")
+        return self._placements
+
+    def shard_for(self, owner):
+        name = self.placements().get(owner)
+        return self.by_name.get(name) or self.home_shard(owner)
+
+    def _getconn(self, shard):
+        with self._lock:
+            if shard.pool is None:
+                shard.pool = DatabasePool(shard.url, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE,
+                                          DB_POOL_TIMEOUT, DB_POOL_HEALTHCHECK_IDLE)
+        return shard.pool.getconn()
+
+    def _run(self, shard, op, work, *args):
+        """work(cursor, *args) in one transaction on `shard`; None when it is unreachable."""
+        try:
+            conn = self._getconn(shard)
+        except Exception as e:
+            shard.counters["errors"] += 1
+            logging.error(f"❌ Shard {shard.name} connection error: {str(e)}")
+            return None
+        started = time.perf_counter()
+        cursor = conn.cursor()
+        try:
+            result = work(cursor, *args)
             conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            shard.counters["errors"] += 1
+            raise
+        finally:
             cursor.close()
-            conn.close()
-            return jsonify({"error": "Memory not found or no changes made"}), 404
+            shard.pool.putconn(conn)
+            shard.counters["transactions"] += 1
+            SHARD_QUERY_SECONDS.observe((shard.name, op), time.perf_counter() - started)
+
+    def _run_for_owner(self, op, work, *args):
+        """work(cursor, owner, *args) on the current owner's shard."""
+        owner = current_owner()
+        with timed_phase("query"):
+            try:
+                return self._run(self.shard_for(owner), op, work, owner, *args)
+            except psycopg2.errors.ObjectNotInPrerequisiteState:
+                # The owner moved after our placements were loaded
+                self.counters["moved_retries"] += 1
+                self.placements(refresh=True)
+                return self._run(self.shard_for(owner), op, work, owner, *args)
+
+    def _scatter(self, op, work, *args):
+        """work(cursor, None, *args) on every shard concurrently; None if any is unreachable."""
+        self.counters["scatter_reads"] += 1
+        with timed_phase("query"):
+            futures = [self._executor.submit(self._run, shard, op, work, None, *args) for shard in self.shards]
+            results = [future.result() for future in futures]
+        return None if None in results else results
+
+    def insert(self, memories, timestamp, on_duplicate=DUPLICATE_POLICY):
+        def insert(cursor, owner):
+            params = insert_query_params(memories, timestamp, owner)
+            return psycopg2.extras.execute_values(
+                cursor,
+                build_insert_query(on_duplicate, owner=True),
+                params,
+                template=INSERT_VALUES_TEMPLATE[:-1] + ", %s)",
+                page_size=len(params),
+                fetch=True,
+            )
+
+        rows = self._run_for_owner("insert", insert)
+        if rows is not None:
+            invalidate_cache(write_invalidation_tags(*(memory["categories"] for memory in memories),
+                                                     *(row[3] for row in rows)))
+        return rows
+
+    @staticmethod
+    def _recall(cursor, owner, spec, not_modified):
+        cursor.execute(STORE_VERSION_SQL)
+        version = cursor.fetchone()
+        if not_modified and not_modified(version):
+            return version, None
+        scoped = owner_scoped_spec(spec, owner)
+        if RECALL_SQL_JSON:
+            cursor.execute(RECALL_JSON_TIMEZONE_SQL)
+            query, params, _ = build_recall_json_query(scoped)
+        else:
+            query, params, _ = build_recall_query(**scoped["query"])
+        cursor.execute(query, params)
+        columns = [column.name for column in cursor.description]
+        rows = cursor.fetchall()
+        total = None
+        if spec["count_mode"]:
+            total = count_recall_matches(cursor, spec["search_term"], spec["category"], spec["mode"],
+                                         estimate=spec["count_mode"] == "estimate", owner=owner)
+        return version, (columns, rows, total)
+
+    @staticmethod
+    def _version(cursor, owner):
+        cursor.execute(STORE_VERSION_SQL)
+        return cursor.fetchone()
+
+    def version(self):
+        if current_owner() is not None:
+            return self._run_for_owner("version", self._version)
+        versions = self._scatter("version", self._version)
+        if versions is None:
+            return None
+        # Combined as in recall
+        return sum(version for version, _ in versions), max(modified for _, modified in versions)
+
+    def recall(self, spec, not_modified=None):
+        if current_owner() is not None:
+            return self._run_for_owner("recall", self._recall, spec, not_modified)
+        results = self._scatter("recall", self._recall, spec, None)
+        if results is None:
+            return None
+        # Any shard's write changes the combined version
+        version = (sum(version for (version, _), _ in results), max(modified for (_, modified), _ in results))
+        if not_modified and not_modified(version):
+            return version, None
+        return version, merge_shard_recall(spec, [result for _, result in results])
+
+    @staticmethod
+    def _get(cursor, owner, memory_id):
+        if owner is None:
+            cursor.execute(SELECT_BY_ID_SQL, (memory_id,))
+        else:
+            cursor.execute(SHARD_SELECT_BY_ID_SQL, (memory_id, owner))
+        return [column.name for column in cursor.description], cursor.fetchone()
+
+    def get(self, memory_id):
+        if current_owner() is not None:
+            return self._run_for_owner("get", self._get, memory_id)
+        results = self._scatter("get", self._get, memory_id)
+        if results is None:
+            return None
+        return next((result for result in results if result[1] is not None), results[0])
+
+    def update(self, changes, match, identifiers):
+        def update(cursor, owner):
+            query = build_edit_query([UPDATE_SET_CLAUSES[name] for name in changes], match, SHARD_UPDATE_MATCHES)
+            cursor.execute(query, tuple(changes.values()) + tuple(identifiers) + (owner,))
+            return cursor.fetchall()
+
+        rows = self._run_for_owner("update", update)
+        if rows:
+            invalidate_cache(write_invalidation_tags(*(row[3] for row in rows), *(row[6] for row in rows)))
+        return rows
+
+    def delete(self, match, identifier):
+        def delete(cursor, owner):
+            query = SHARD_DELETE_BY_ID_SQL if match == "id" else SHARD_DELETE_LATEST_BY_TITLE_SQL
+            cursor.execute(query, (identifier, owner))
+            return cursor.fetchall()
+
+        rows = self._run_for_owner("delete", delete)
+        if rows is None:
+            return None
+        if rows:
+            invalidate_cache(write_invalidation_tags(*(row[1] for row in rows)))
+        return [row[0] for row in rows]
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "placements": len(self._placements or {}),
+            **self.counters,
+            "shards": [{
+                "name": shard.name,
+                **shard.counters,
+                "pool": shard.pool.stats() if shard.pool is not None else None,
+            } for shard in self.shards],
+        }
+
+
+@contextmanager
+def shard_admin_connection(shard):
+    """A dedicated connection for shard maintenance that the moved-owner guard lets through."""
+    conn = psycopg2.connect(shard.url, connect_timeout=DB_CONNECT_TIMEOUT)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET infobuddy.owner_mover = 'on'")
         conn.commit()
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
+        yield conn
+    finally:
         conn.close()
+
+
+def init_shards():
+    """
+    Prepare SHARD_URLS for sharded storage; rerun after adding a shard.
+
+    Restarts every shard's id sequence above the highest id on any shard, with
+    step SHARD_ID_STRIDE and the shard's index as offset, and pins each owner
+    already present to the shard holding it. Returns the number of owners pinned.
+    """
+    store = get_memory_store()
+    with ExitStack() as stack:
+        conns = [stack.enter_context(shard_admin_connection(shard)) for shard in store.shards]
+        highest = 0
+        for conn in conns:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM memory")
+                highest = max(highest, cursor.fetchone()[0])
+        base = (highest // SHARD_ID_STRIDE + 1) * SHARD_ID_STRIDE
+
+        pinned = 0
+        catalog = conns[0]
+        for index, (shard, conn) in enumerate(zip(store.shards, conns)):
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_get_serial_sequence('memory', 'id')")
+                sequence = cursor.fetchone()[0]
+                cursor.execute(f"ALTER SEQUENCE {sequence} INCREMENT BY {SHARD_ID_STRIDE} "
+                               f"RESTART WITH {base + index}")
+                cursor.execute("SELECT DISTINCT owner FROM memory")
+                owners = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+            with catalog.cursor() as cursor:
+                for owner in owners:
+                    cursor.execute("""
+                        INSERT INTO memory_owner_shards (owner, shard) VALUES (%s, %s)
+                        ON CONFLICT (owner) DO NOTHING
+                        RETURNING shard
+                    """, (owner, shard.name))
+                    if cursor.fetchone() is not None:
+                        pinned += 1
+                        continue
+                    cursor.execute("SELECT shard FROM memory_owner_shards WHERE owner = %s", (owner,))
+                    placed = cursor.fetchone()[0]
+                    if placed != shard.name:
+                        logging.warning(f"⚠️ Owner {owner} has memories on {shard.name} but is placed on {placed}.")
+            catalog.commit()
+    store.placements(refresh=True)
+    return pinned
+
+
+def move_owner(owner, target, batch_size=1000):
+    """
+    Move an owner's memories to the shard named `target` while the API keeps serving.
+
+    Copies the rows in batches, then freezes the owner on the source shard
+    (writes there are refused from then on), copies whatever changed during the
+    bulk copy, points the placement at the target and, once every process has
+    reloaded placements, deletes the source rows. The owner's writes fail only
+    between the freeze and the placement change. A failure before that change
+    leaves the owner where it was. Returns the number of memories moved.
+    """
+    store = get_memory_store()
+    store.placements(refresh=True)
+    source = store.shard_for(owner)
+    destination = store.by_name.get(target)
+    if destination is None:
+        raise ValueError(f"Unknown shard {target!r}; expected one of {', '.join(store.by_name)}")
+    if destination is source:
+        return 0
+
+    with ExitStack() as stack:
+        src = stack.enter_context(shard_admin_connection(source))
+        dst = stack.enter_context(shard_admin_connection(destination))
+        catalog = stack.enter_context(shard_admin_connection(store.shards[0]))
+
+        def copy_rows(rows):
+            with dst.cursor() as cursor:
+                psycopg2.extras.execute_values(
+                    cursor,
+                    SHARD_COPY_SQL,
+                    rows,
+                    template="(%s, %s, %s::jsonb, %s::memory_category[], %s, %s, %s, %s)",
+                    page_size=batch_size,
+                )
+            dst.commit()
+
+        try:
+            # Leftovers from an earlier move away from the target
+            with dst.cursor() as cursor:
+                cursor.execute("DELETE FROM memory_owner_moved WHERE owner = %s", (owner,))
+                cursor.execute("DELETE FROM memory WHERE owner = %s", (owner,))
+            dst.commit()
+
+            moved = 0
+            with src.cursor(name=f"move_owner_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(f"SELECT {SHARD_COPY_COLUMNS} FROM memory WHERE owner = %s", (owner,))
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    copy_rows(rows)
+                    moved += len(rows)
+            src.commit()
+            logging.info(f"📦 Copied {moved} memories of {owner} from {source.name} to {destination.name}.")
+
+            with src.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO memory_owner_moved (owner, shard) VALUES (%s, %s)
+                    ON CONFLICT (owner) DO UPDATE SET shard = EXCLUDED.shard, moved_at = now()
+                """, (owner, destination.name))
+            src.commit()
+            # Waits for writes that passed the guard before the freeze to finish
+            with src.cursor() as cursor:
+                cursor.execute("LOCK TABLE memory IN SHARE MODE")
+            src.commit()
+
+            fingerprints = []
+            for conn in (src, dst):
+                with conn.cursor() as cursor:
+                    cursor.execute(SHARD_FINGERPRINT_SQL, (owner,))
+                    fingerprints.append(dict(cursor.fetchall()))
+                conn.commit()
+            source_prints, target_prints = fingerprints
+            changed = [memory_id for memory_id, digest in source_prints.items() if target_prints.get(memory_id) != digest]
+            removed = [memory_id for memory_id in target_prints if memory_id not in source_prints]
+            # Deletes first, so a re-copied row cannot collide with a removed one's content hash
+            if removed:
+                with dst.cursor() as cursor:
+                    cursor.execute("DELETE FROM memory WHERE id = ANY(%s)", (removed,))
+                dst.commit()
+            if changed:
+                with src.cursor() as cursor:
+                    cursor.execute(f"SELECT {SHARD_COPY_COLUMNS} FROM memory WHERE id = ANY(%s)", (changed,))
+                    rows = cursor.fetchall()
+                src.commit()
+                copy_rows(rows)
+
+            with catalog.cursor() as cursor:
+                cursor.execute(SHARD_PLACE_OWNER_SQL, (owner, destination.name))
+            catalog.commit()
+        except Exception:
+            for conn in (src, dst):
+                conn.rollback()
+            with src.cursor() as cursor:
+                cursor.execute("DELETE FROM memory_owner_moved WHERE owner = %s", (owner,))
+            src.commit()
+            with dst.cursor() as cursor:
+                cursor.execute("DELETE FROM memory WHERE owner = %s", (owner,))
+            dst.commit()
+            raise
+
+        store.placements(refresh=True)
+        invalidate_cache({"all"})
+        # Other processes may route to the source until their placements expire
+        time.sleep(SHARD_PLACEMENT_TTL + 1)
+        with src.cursor() as cursor:
+            cursor.execute("DELETE FROM memory WHERE owner = %s", (owner,))
+        src.commit()
+    logging.info(f"✅ Moved {owner} to {destination.name} ({len(source_prints)} memories, "
+                 f"{len(changed)} re-copied after the freeze).")
+    return len(source_prints)
+
+
+def shard_status():
+    """Owners and memories per shard, plus the placements, for `python main.py shards status`."""
+    store = get_memory_store()
+    placements = store.placements(refresh=True)
+    shards = []
+    for shard in store.shards:
+        rows = store._run(shard, "status", lambda cursor: (
+            cursor.execute("SELECT owner, COUNT(*) FROM memory GROUP BY owner"), cursor.fetchall())[1])
+        counts = dict(rows) if rows is not None else None
+        shards.append({
+            "shard": shard.name,
+            "reachable": counts is not None,
+            "owners": len(counts) if counts is not None else None,
+            "memories": sum(counts.values()) if counts is not None else None,
+            "misplaced": sorted(owner for owner in counts or {} if store.shard_for(owner) is not shard),
+        })
+    return {"shards": shards, "placements": len(placements)}
+
+###############################################################################
+#                             STRUCTURED QUERY                                 #
+###############################################################################
+
+# Upper bound on queries in one POST /query body
+MAX_QUERIES_PER_REQUEST = int(os.getenv("MAX_QUERIES_PER_REQUEST", "20"))
+
+QUERY_TEXT_MODES = ("substring", "fulltext", "fuzzy")
+QUERY_SORTS = ("newest", "oldest", "relevance")
+
+
+def _category_list(value, name):
+    """Validate a list of category values from a structured query. Returns (categories, error)."""
+    if value is None:
+        return [], None
+    if not isinstance(value, list) or not all(isinstance(category, str) for category in value):
+        return None, f"'{name}' must be a list of categories"
+    categories = [category.strip() for category in value]
+    invalid = [category for category in categories if category not in CATEGORY_SET]
+    if invalid:
+        return None, f"Invalid categories in '{name}': {invalid}. Must be one or more of: {list(CATEGORY_VALUES)}"
+    return categories, None
+
+
+def parse_structured_query(data):
+    """
+    Validate one POST /query query object. Returns (spec, error).
+
+    Keys (all optional, all conditions AND-ed):
+      - categories_any / categories_all / categories_none: lists of categories
+      - since / until: ISO timestamps (since inclusive, until exclusive)
+      - text, mode: a search term and how to match it (substring, fulltext or fuzzy)
+      - sort: newest (default), oldest or relevance (fulltext/fuzzy text only)
+      - limit, cursor, fields: as for /recall-or-search (fields is a list)
+    """
+    if not isinstance(data, dict):
+        return None, "Each query must be a JSON object"
+    unknown = set(data) - {"categories_any", "categories_all", "categories_none", "since", "until",
+                           "text", "mode", "sort", "limit", "cursor", "fields"}
+    if unknown:
+        return None, f"Unknown query keys: {sorted(unknown)}"
+
+    spec = {}
+    for name in ("categories_any", "categories_all", "categories_none"):
+        spec[name], error = _category_list(data.get(name), name)
+        if error:
+            return None, error
+
+    for name in ("since", "until"):
+        spec[name] = None
+        if data.get(name):
+            try:
+                spec[name] = datetime.fromisoformat(str(data[name]))
+            except ValueError:
+                return None, f"Invalid {name} timestamp format"
+
+    text = data.get("text") or ""
+    if not isinstance(text, str):
+        return None, "'text' must be a string"
+    spec["text"] = text.strip()
+    spec["mode"] = str(data.get("mode") or "substring").strip().lower()
+    if spec["mode"] not in QUERY_TEXT_MODES:
+        return None, f"Invalid mode '{spec['mode']}'. Must be one of: {list(QUERY_TEXT_MODES)}"
+
+    spec["sort"] = str(data.get("sort") or "newest").strip().lower()
+    if spec["sort"] not in QUERY_SORTS:
+        return None, f"Invalid sort '{spec['sort']}'. Must be one of: {list(QUERY_SORTS)}"
+    if spec["sort"] == "relevance" and not (spec["text"] and spec["mode"] in ("fulltext", "fuzzy")):
+        return None, "sort=relevance needs text with mode fulltext or fuzzy"
+
+    try:
+        spec["limit"] = _parse_limit(data.get("limit"), DEFAULT_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return None, "limit must be a positive integer"
+
+    fields = data.get("fields") or []
+    if not isinstance(fields, list) or any(field not in RECALL_FIELDS for field in fields):
+        return None, f"'fields' must be a list drawn from: {list(RECALL_FIELDS)}"
+    spec["fields"] = tuple(fields) or None
+
+    spec["after"] = None
+    if data.get("cursor"):
+        try:
+            spec["after"] = decode_cursor(str(data["cursor"]), len(structured_sort_keys(spec)))
+        except InvalidCursor as e:
+            return None, str(e)
+    return spec, None
+
+
+def structured_sort_keys(spec):
+    return ["rank", "timestamp", "id"] if spec["sort"] == "relevance" else ["timestamp", "id"]
+
+
+def build_structured_query(spec, index=0, columns=None):
+    """
+    Compile a parsed structured query into one SELECT. Returns (query, params).
+
+    Every row carries `query_index` (so several queries can be UNION ALL-ed into
+    one statement) and a `rank` column, NULL unless text is ranked. Category
+    sets become @> / && / NOT && against the GIN index and time bounds use
+    idx_memory_timestamp_id, which also serves the newest/oldest orderings.
+    `columns` overrides the memory columns implied by the query's fields.
+    """
+    select_params = []
+    where = []
+    where_params = []
+
+    rank = "NULL::real"
+    text = spec["text"]
+    if text and spec["mode"] == "fulltext":
+        rank = "ts_rank(search_vector, websearch_to_tsquery('english', %s))"
+        select_params.append(text)
+        where.append("search_vector @@ websearch_to_tsquery('english', %s)")
+        where_params.append(text)
+    elif text and spec["mode"] == "fuzzy":
+        rank = "GREATEST(word_similarity(%s, title), word_similarity(%s, details->>'text'))::real"
+        select_params.extend([text, text])
+        where.append("(%s <%% title OR %s <%% (details->>'text'))")
+        where_params.extend([text, text])
+    elif text:
+        where.append("(title ILIKE %s OR details->>'text' ILIKE %s)")
+        where_params.extend([f"%{text}%", f"%{text}%"])
+
+    if spec["categories_all"]:
+        where.append("categories @> %s::memory_category[]")
+        where_params.append(spec["categories_all"])
+    if spec["categories_any"]:
+        where.append("categories && %s::memory_category[]")
+        where_params.append(spec["categories_any"])
+    if spec["categories_none"]:
+        where.append("NOT (categories && %s::memory_category[])")
+        where_params.append(spec["categories_none"])
+    if spec["since"]:
+        where.append("timestamp >= %s")
+        where_params.append(spec["since"])
+    if spec["until"]:
+        where.append("timestamp < %s")
+        where_params.append(spec["until"])
+
+    query = f"""
+        SELECT {int(index)} AS query_index, {columns or recall_columns(spec['fields'])}, {rank} AS rank
+        FROM memory"""
+    if where:
+        query += """
+        WHERE """ + " AND ".join(where)
+    params = select_params + where_params
+
+    sort_keys = structured_sort_keys(spec)
+    direction, comparison = ("ASC", ">") if spec["sort"] == "oldest" else ("DESC", "<")
+    if spec["after"] is not None:
+        casts = {"rank": "%s::real", "timestamp": "%s::timestamptz", "id": "%s"}
+        query = f"""
+        SELECT * FROM ({query}
+        ) AS matches
+        WHERE ({', '.join(sort_keys)}) {comparison} ({', '.join(casts[key] for key in sort_keys)})"""
+        params += list(spec["after"])
+    query += f"""
+        ORDER BY {', '.join(f'{key} {direction}' for key in sort_keys)}
+        LIMIT %s"""
+    params.append(spec["limit"] + 1)
+    return query, params
+
+
+def build_structured_batch(specs):
+    """UNION ALL several structured queries into a single statement. Returns (query, params)."""
+    # Every branch must return the same columns: the union of the requested fields
+    if all(spec["fields"] for spec in specs):
+        columns = recall_columns({field for spec in specs for field in spec["fields"]})
+    else:
+        columns = MEMORY_COLUMNS
+    parts, params = [], []
+    for index, spec in enumerate(specs):
+        query, query_params = build_structured_query(spec, index, columns)
+        parts.append(f"({query}\n        )")
+        params += query_params
+    return "\n        UNION ALL\n        ".join(parts), params
+
+
+def parse_structured_request(data):
+    """
+    Validate a POST /query body: one query object, or {"queries": [...]}.
+    Returns (specs, batched, error).
+    """
+    if not isinstance(data, dict):
+        return None, False, "Expected a JSON object"
+    if "queries" not in data:
+        spec, error = parse_structured_query(data)
+        return ([spec] if spec else None), False, error
+    queries = data["queries"]
+    if not isinstance(queries, list) or not queries:
+        return None, True, "'queries' must be a non-empty list"
+    if len(queries) > MAX_QUERIES_PER_REQUEST:
+        return None, True, f"Too many queries in one request (max {MAX_QUERIES_PER_REQUEST})"
+    specs = []
+    for index, query in enumerate(queries):
+        spec, error = parse_structured_query(query)
+        if error:
+            return None, True, f"queries[{index}]: {error}"
+        specs.append(spec)
+    return specs, True, None
+
+
+def build_structured_payload(specs, batched, columns, rows):
+    """Split the combined rows per query and serialize them. Returns the response payload."""
+    grouped = [[] for _ in specs]
+    for row in rows:
+        grouped[row[0]].append(row)
+
+    tz = DISPLAY_TZ
+    results = []
+    for spec, query_rows in zip(specs, grouped):
+        # UNION ALL doesn't promise to keep each branch's ORDER BY, so restore it
+        positions = [columns.index(key) for key in structured_sort_keys(spec)]
+        query_rows.sort(key=lambda row: [row[position] for position in positions],
+                        reverse=spec["sort"] != "oldest")
+        has_more = len(query_rows) > spec["limit"]
+        query_rows = query_rows[:spec["limit"]]
+        next_cursor = None
+        if has_more:
+            last = dict(zip(columns, query_rows[-1]))
+            next_cursor = encode_cursor([last[key] for key in structured_sort_keys(spec)])
+        memories = []
+        for row in query_rows:
+            memory = serialize_memory_row(row[1:], columns[1:], tz, spec["fields"])
+            if memory.get("rank", 0) is None:
+                del memory["rank"]
+            memories.append(memory)
+        results.append({"memories": memories, "returned": len(memories), "next_cursor": next_cursor})
+    return {"results": results} if batched else results[0]
+
+
+@app.route("/query", methods=["POST"])
+def structured_query():
+    """
+    Structured recall: AND-ed category sets, time ranges, text, sort and limit.
+
+    The body is one query object (see parse_structured_query) or
+    {"queries": [...]} for up to MAX_QUERIES_PER_REQUEST queries, which are
+    answered with a single SQL statement as {"results": [...]} in order.
+    """
+    if not check_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    specs, batched, error = parse_structured_request(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        conn = get_db_connection(read_only=True)
+        if not conn:
+            return jsonify({"error": "Database connection failed"}), 500
+        cursor = conn.cursor()
+        with timed_phase("query"):
+            cursor.execute(*build_structured_batch(specs))
+            columns = [column.name for column in cursor.description]
+            rows = cursor.fetchall()
+        cursor.close()
+        release_db_connection(conn)
+
+        with timed_phase("decode"):
+            payload = build_structured_payload(specs, batched, columns, rows)
+        with timed_phase("serialize"):
+            return Response(dumps_json(payload), status=200, mimetype="application/json")
+
+    except Exception as e:
+        logging.error(f"❌ ERROR in /query: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-    cursor.close()
-    conn.close()
+###############################################################################
+#                             CONTEXT BUNDLES                                  #
+###############################################################################
+
+CONTEXT_UNITS = ("tokens", "chars")
+CONTEXT_MODES = ("fulltext", "fuzzy", "substring")
+
+# Lane weights when ?weights= doesn't name them: "recent" is the latest
+# memories, "search" the memories matching ?q=; categories are opt-in
+CONTEXT_DEFAULT_WEIGHTS = {"recent": 1.0, "search": 2.0}
+
+# A memory that doesn't fit is cut to fit when at least this many characters remain
+CONTEXT_MIN_TRUNCATED = 200
+
+
+def parse_context_weights(value):
+    """Parse "recent:1,search:2,work_and_military:1.5" into (weights, error)."""
+    weights = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition(":")
+        name = name.strip()
+        if name not in ("recent", "search") and name not in CATEGORY_SET:
+            return None, f"Invalid weights lane '{name}'. Must be recent, search or one of: {list(CATEGORY_VALUES)}"
+        try:
+            weights[name] = float(weight) if weight.strip() else 1.0
+        except ValueError:
+            return None, f"Invalid weight for '{name}': {weight!r}"
+        if weights[name] < 0:
+            return None, f"Invalid weight for '{name}': weights cannot be negative"
+    return weights, None
+
+
+def parse_context_args(args):
+    """
+    Validate /context query parameters.
+    Returns (spec, error): spec holds the search term, lane weights, the budget
+    in characters and how to report it.
+    """
+    search_term = args.get("q", "").strip()
+    mode = args.get("mode", "fulltext").strip().lower()
+    unit = args.get("unit", "tokens").strip().lower()
+    if mode not in CONTEXT_MODES:
+        return None, f"Invalid mode '{mode}'. Must be one of: {list(CONTEXT_MODES)}"
+    if unit not in CONTEXT_UNITS:
+        return None, f"Invalid unit '{unit}'. Must be one of: {list(CONTEXT_UNITS)}"
+
+    weights, error = parse_context_weights(args.get("weights", ""))
+    if error:
+        return None, error
+    weights = {**CONTEXT_DEFAULT_WEIGHTS, **weights}
+    if not search_term:
+        weights.pop("search")
+    weights = {lane: weight for lane, weight in weights.items() if weight > 0}
+    if not weights:
+        return None, "Every lane has weight 0; name at least one with a positive weight"
 
-    backup_database()
+    try:
+        budget = int(args.get("budget", CONTEXT_DEFAULT_BUDGET))
+        lane_limit = int(args.get("per_lane", CONTEXT_LANE_LIMIT))
+    except ValueError:
+        return None, "budget and per_lane must be integers"
+    chars_per_unit = CONTEXT_CHARS_PER_TOKEN if unit == "tokens" else 1
+    if not 0 < budget * chars_per_unit <= CONTEXT_MAX_CHARS:
+        return None, f"budget must be between 1 and {CONTEXT_MAX_CHARS // chars_per_unit} {unit}"
+    if not 0 < lane_limit <= MAX_PAGE_SIZE:
+        return None, f"per_lane must be between 1 and {MAX_PAGE_SIZE}"
+
+    return {
+        "search_term": search_term,
+        "mode": mode,
+        "weights": weights,
+        "lane_limit": lane_limit,
+        "unit": unit,
+        "budget": budget,
+        "budget_chars": budget * chars_per_unit,
+        "chars_per_unit": chars_per_unit,
+    }, None
+
+
+def build_context_query(spec):
+    """
+    One statement that runs every lane of a /context request and scores the
+    memories they found.
+
+    Each lane is a build_recall_query (latest memories, latest per weighted
+    category, best matches for the search term) capped at lane_limit. A memory
+    found by several lanes appears once, scored
+
+        recency * (sum of its recent/category lane weights) + search weight * relevance
+
+    where recency halves every CONTEXT_HALF_LIFE_DAYS and relevance is the
+    search rank relative to the best match. Details are cut to the budget.
+    Returns (query, params).
+    """
+    lanes = []
+    params = []
+    for lane, weight in spec["weights"].items():
+        if lane == "search":
+            query, lane_params, _ = build_recall_query(spec["search_term"], None, spec["mode"],
+                                                       limit=spec["lane_limit"], columns="id, timestamp")
+            # Substring matches are unranked, so they count as equally relevant
+            relevance = "rank / NULLIF(max(rank) OVER (), 0)" if spec["mode"] != "substring" else "1.0"
+            lanes.append(f"SELECT id, %s::text AS lane, 0.0::float8 AS weight, %s::float8 * {relevance} AS relevance "
+                         f"FROM ({query}) AS lane")
+        else:
+            category = lane if lane != "recent" else None
+            query, lane_params, _ = build_recall_query(None, category, limit=spec["lane_limit"],
+                                                       columns="id, timestamp")
+            lanes.append(f"SELECT id, %s::text AS lane, %s::float8 AS weight, 0.0::float8 AS relevance "
+                         f"FROM ({query}) AS lane")
+        params += [lane, weight] + lane_params
+
+    union = "\n            UNION ALL\n            ".join(lanes)
+    query = f"""
+        WITH lanes AS (
+            {union}
+        ), found AS (
+            SELECT id, array_agg(lane ORDER BY lane) AS lanes, sum(weight) AS weight, sum(relevance) AS relevance
+            FROM lanes
+            GROUP BY id
+        )
+        SELECT m.id, m.title,
+               jsonb_build_object('text', left(COALESCE(m.details->>'text', m.details::text), %s)) AS details,
+               m.categories, m.timestamp, f.lanes,
+               f.weight * COALESCE(power(0.5, extract(epoch FROM now() - m.timestamp) / (%s * 86400.0)), 0)
+                   + f.relevance AS score
+        FROM found f
+        JOIN memory m USING (id)
+        ORDER BY score DESC, m.timestamp DESC, m.id DESC
+    """
+    return query, params + [spec["budget_chars"], CONTEXT_HALF_LIFE_DAYS]
+
+
+def _context_cost(memory):
+    """Characters a memory takes up in the bundle: its compact JSON."""
+    return len(json.dumps(memory, ensure_ascii=False, separators=(",", ":")))
+
+
+def pack_context(spec, columns, rows):
+    """
+    Fill the budget with the highest-scoring memories (rows come sorted by
+    score): each one that fits goes in whole, and when at least
+    CONTEXT_MIN_TRUNCATED characters are left over, the best memory that didn't
+    fit is cut down to them, marked "truncated". Returns the /context payload.
+    """
+    remaining = spec["budget_chars"]
+    packed = []
+    skipped = None
+    for index, row in enumerate(rows):
+        values = dict(zip(columns, row))
+        memory = serialize_memory_row(row, columns[:5], DISPLAY_TZ)
+        memory["lanes"] = values["lanes"]
+        memory["score"] = round(float(values["score"]), 4)
+        cost = _context_cost(memory)
+        if cost <= remaining:
+            packed.append((index, memory))
+            remaining -= cost
+        elif skipped is None:
+            skipped = (index, memory)
+
+    truncated = False
+    if skipped is not None and remaining >= CONTEXT_MIN_TRUNCATED:
+        index, memory = skipped
+        details = memory["details"]
+        memory["truncated"] = True
+        # JSON escaping makes a character of details cost 1-6, so search for
+        # the longest cut whose measured cost still fits
+        low, high = 0, len(details)
+        while low < high:
+            middle = (low + high + 1) // 2
+            memory["details"] = details[:middle] + "…"
+            if _context_cost(memory) <= remaining:
+                low = middle
+            else:
+                high = middle - 1
+        if low > 0:
+            memory["details"] = details[:low] + "…"
+            packed.append((index, memory))
+            packed.sort(key=lambda item: item[0])
+            remaining -= _context_cost(memory)
+            truncated = True
+
+    used = spec["budget_chars"] - remaining
+    return {
+        "memories": [memory for _, memory in packed],
+        "budget": {
+            "unit": spec["unit"],
+            "limit": spec["budget"],
+            "used": -(-used // spec["chars_per_unit"]),
+        },
+        "candidates": len(rows),
+        "omitted": len(rows) - len(packed),
+        "truncated": truncated,
+    }
+
+
+@app.route("/context", methods=["GET"])
+def context_bundle():
+    """
+    The memories worth putting in a prompt, packed into a size budget, in one request.
+
+    Query parameters:
+      - q: search term for the "search" lane (mode: fulltext (default), fuzzy or substring)
+      - weights: lane weights, e.g. recent:1,search:2,work_and_military:1.5; recent
+                 and search default to 1 and 2, categories are only used when named
+      - budget, unit: size of the bundle in tokens (default, ~CONTEXT_CHARS_PER_TOKEN
+                 characters each) or chars, counted as the memories' compact JSON
+      - per_lane: candidates taken from each lane (default CONTEXT_LANE_LIMIT)
+
+    All lanes run as one SQL statement; memories found by several lanes appear
+    once and are returned best score first (see build_context_query).
+    """
+    if not check_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 403
 
-    return jsonify({"message": "Memory updated successfully"}), 200
+    spec, error = parse_context_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
 
+    conn = get_db_connection(read_only=True)
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+    try:
+        cursor = conn.cursor()
+        with timed_phase("query"):
+            cursor.execute(*build_context_query(spec))
+            columns = [column.name for column in cursor.description]
+            rows = cursor.fetchall()
+        cursor.close()
+        with timed_phase("serialize"):
+            return Response(dumps_json(pack_context(spec, columns, rows)), status=200, mimetype="application/json")
+    except Exception as e:
+        logging.error(f"❌ ERROR in /context: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        release_db_connection(conn)
 
 ###############################################################################
 #                             MAIN APP RUN                                     #
 ###############################################################################
 
-if __name__ == "__main__":
-    safe_init_db()  # Initialize database safely
+def cli(argv=None):
+    """
+    Command line entry point.
+
+      python main.py                 run the API server (default)
+      python main.py export [...]    stream memories to stdout or --output
+      python main.py backfill-embeddings [--force]
+      python main.py archive [--older-than-days N]
+      python main.py shards init|status|move --owner O --to shardN
+      python main.py dedupe [--dry-run]
+    """
+    parser = argparse.ArgumentParser(description="InfoBuddy memory API")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("serve", help="Run the API server")
+
+    export = commands.add_parser("export", help="Stream memories as NDJSON or JSON")
+    export.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    export.add_argument("--category")
+    export.add_argument("--since", help="ISO timestamp, inclusive")
+    export.add_argument("--until", help="ISO timestamp, exclusive")
+    export.add_argument("--updated-since", dest="updated_since", help="ISO timestamp, inclusive")
+    export.add_argument("--itersize", type=int, default=EXPORT_ITERSIZE)
+    export.add_argument("--output", help="File to write (default: stdout)")
+
+    backfill = commands.add_parser("backfill-embeddings", help="Compute embeddings for existing memories")
+    backfill.add_argument("--batch-size", type=int, default=1000)
+    backfill.add_argument("--force", action="store_true", help="Recompute every embedding (e.g. after changing model)")
+
+    archive = commands.add_parser("archive", help="Move old memories into the compressed archive")
+    archive.add_argument("--older-than-days", dest="older_than_days", type=int, default=ARCHIVE_AFTER_DAYS)
+    archive.add_argument("--batch-size", type=int, default=1000)
+
+    dedupe = commands.add_parser("dedupe", help="Hash memories stored before content hashes and fold duplicates")
+    dedupe.add_argument("--batch-size", type=int, default=1000)
+    dedupe.add_argument("--dry-run", action="store_true", help="Report what would be removed without changing anything")
+
+    shards = commands.add_parser("shards", help="Manage owners across SHARD_URLS (STORAGE_BACKEND=sharded)")
+    shards.add_argument("action", choices=("init", "status", "move"))
+    shards.add_argument("--owner", help="owner to move")
+    shards.add_argument("--to", dest="target", help="shard to move the owner to, e.g. shard1")
+    shards.add_argument("--batch-size", type=int, default=1000)
+
+    args = parser.parse_args(argv)
+    if not POSTGRES_BACKEND and args.command in ("export", "backfill-embeddings", "archive", "dedupe"):
+        parser.error(f"{args.command} needs STORAGE_BACKEND=postgres")
+    if args.command == "shards":
+        if STORAGE_BACKEND != "sharded":
+            parser.error("shards needs STORAGE_BACKEND=sharded")
+        if args.action == "move" and not (args.owner and args.target):
+            parser.error("shards move needs --owner and --to")
+
+    if args.command in (None, "serve", "backfill-embeddings", "archive", "dedupe", "shards"):
+        try:
+            safe_init_db()
+        except MigrationError as e:
+            # Duplicates stop migration 14, and folding them is dedupe's job
+            if not (args.command == "dedupe" and isinstance(e.__cause__, psycopg2.errors.UniqueViolation)):
+                logging.error(f"❌ {e}")
+                return 1
+            logging.warning(f"⚠️ {e}")
+
+    if args.command == "backfill-embeddings":
+        count = backfill_embeddings(batch_size=args.batch_size, force=args.force)
+        logging.info(f"✅ Backfilled embeddings for {count} memories.")
+        return 0
+
+    if args.command == "archive":
+        count = archive_memories(older_than_days=args.older_than_days, batch_size=args.batch_size)
+        logging.info(f"✅ Archived {count} memories to {ARCHIVE_DIR}.")
+        return 0
+
+    if args.command == "dedupe":
+        hashed, removed = dedupe_memories(batch_size=args.batch_size, dry_run=args.dry_run)
+        verb = "would remove" if args.dry_run else "removed"
+        logging.info(f"✅ Hashed {hashed} memories, {verb} {removed} duplicates.")
+        if not args.dry_run:
+            try:
+                safe_init_db()  # builds the unique index if duplicates had held it back
+            except MigrationError as e:
+                logging.error(f"❌ {e}")
+                return 1
+        return 0
+
+    if args.command == "shards":
+        if args.action == "init":
+            count = init_shards()
+            logging.info(f"✅ Shards ready; pinned {count} owners to their current shards.")
+        elif args.action == "move":
+            move_owner(args.owner, args.target, batch_size=args.batch_size)
+        else:
+            print(json.dumps(shard_status(), indent=2))
+        return 0
+
+    if args.command == "export":
+        filters, error = parse_export_filters(vars(args))
+        if error:
+            parser.error(error)
+        out = open(args.output, "w") if args.output else sys.stdout
+        try:
+            for chunk in stream_export(iter_export_records(itersize=args.itersize, **filters), fmt=args.format):
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+        return 0
+
+    if WRITE_BUFFER_ENABLED:
+        write_buffer.start()  # replays any journal left by a previous run
+    if POSTGRES_BACKEND:
+        change_feed.start()
+    log_startup_ready()
     app.run(host="0.0.0.0", port=10000)
+    return 0
+
+
+startup_timings["import"] = time.perf_counter() - _IMPORT_STARTED
+
+if __name__ == "__main__":
+    sys.exit(cli())
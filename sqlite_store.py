@@ -0,0 +1,384 @@
+"""
+Embedded SQLite storage backend for the memory API (STORAGE_BACKEND=sqlite).
+
+Serves the core endpoints from one local database file, with no server to run,
+for local and edge deployments:
+
+  - WAL journal, so readers never wait for the single writer
+  - FTS5 (porter tokenizer) for mode=fulltext, ranked by bm25
+  - JSON1 for the details document, as in Postgres' jsonb column
+  - a memory_categories join table, indexed by category, for category filters
+
+Timestamps are stored as UTC ISO-8601 text with microseconds, so they sort
+lexically. This module only needs the standard library; main.py builds the
+store through get_memory_store() and hands in what it needs.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+SCHEMA_VERSION = 1
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS memory (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        details TEXT NOT NULL CHECK (json_valid(details)),
+        timestamp TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS memory_timestamp_id_idx ON memory (timestamp, id);
+    CREATE INDEX IF NOT EXISTS memory_title_timestamp_idx ON memory (title, timestamp);
+
+    CREATE TABLE IF NOT EXISTS memory_categories (
+        memory_id INTEGER NOT NULL REFERENCES memory (id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        category TEXT NOT NULL CHECK (category IN ({categories})),
+        PRIMARY KEY (memory_id, position)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS memory_categories_category_idx ON memory_categories (category, memory_id);
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS memory_fts USING fts5(title, text, tokenize = 'porter unicode61');
+
+    CREATE TRIGGER IF NOT EXISTS memory_fts_insert AFTER INSERT ON memory BEGIN
+        INSERT INTO memory_fts (rowid, title, text)
+        VALUES (new.id, new.title, coalesce(json_extract(new.details, '$.text'), ''));
+    END;
+    CREATE TRIGGER IF NOT EXISTS memory_fts_update AFTER UPDATE OF title, details ON memory BEGIN
+        UPDATE memory_fts SET title = new.title, text = coalesce(json_extract(new.details, '$.text'), '')
+        WHERE rowid = new.id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS memory_fts_delete AFTER DELETE ON memory BEGIN
+        DELETE FROM memory_fts WHERE rowid = old.id;
+    END;
+
+    -- Bumped by every write transaction; drives the ETag / Last-Modified validators
+    CREATE TABLE IF NOT EXISTS memory_store_version (
+        singleton INTEGER PRIMARY KEY CHECK (singleton = 1),
+        version INTEGER NOT NULL,
+        modified_at TEXT
+    );
+    INSERT OR IGNORE INTO memory_store_version VALUES (1, 0, NULL);
+"""
+
+CATEGORIES_EXPR = """(
+            SELECT json_group_array(category) FROM (
+                SELECT category FROM memory_categories AS c WHERE c.memory_id = m.id ORDER BY position
+            )
+        )"""
+
+# SQL expression per memory column name used by main.MEMORY_COLUMNS
+COLUMN_EXPRESSIONS = {
+    "id": "m.id",
+    "title": "m.title",
+    "details": "m.details",
+    "categories": CATEGORIES_EXPR,
+    "timestamp": "m.timestamp",
+}
+
+SELECT_WRITTEN_SQL = f"""
+    SELECT m.id, m.title, m.details, {CATEGORIES_EXPR}, m.timestamp, m.updated_at
+    FROM memory AS m
+    WHERE m.id IN ({{placeholders}})
+    ORDER BY m.id
+"""
+
+# How an update or delete identifies its row (same names as main.UPDATE_MATCHES)
+MATCHES = {
+    "id": "SELECT id FROM memory WHERE id = ?",
+    "title_timestamp": "SELECT id FROM memory WHERE title = ? AND timestamp = ?",
+    "title_latest": "SELECT id FROM memory WHERE title = ? ORDER BY timestamp DESC, id DESC LIMIT 1",
+}
+
+
+def to_utc_text(value):
+    """Stored form of a timestamp: UTC ISO-8601 with microseconds (naive values are taken as UTC)."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def fts_query(search_term):
+    """Quote each word of a search term so FTS5 ANDs them instead of parsing its own query syntax."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in re.findall(r"\w+", search_term))
+
+
+class SqliteMemoryStore:
+    """
+    MemoryStore (see main.py) over a local SQLite file.
+
+    Each thread gets its own connection; WAL lets those readers run alongside
+    the one writer, and busy_timeout makes concurrent writers queue instead of
+    failing. `on_write` is called with the category lists touched by each
+    committed write, for read cache invalidation.
+    """
+
+    name = "sqlite"
+    search_modes = ("substring", "fulltext")
+
+    def __init__(self, path, categories, on_write=None, busy_timeout=5.0):
+        self.path = path
+        self.categories = list(categories)
+        self.on_write = on_write
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA foreign_keys = ON")
+            self._local.conn = conn
+        return conn
+
+    def migrate(self):
+        """Create the schema if needed; PRAGMA user_version records what has been applied."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return False
+        categories = ", ".join("'" + category + "'" for category in self.categories)
+        try:
+            # One IMMEDIATE transaction, so concurrent starters apply the schema one at a time
+            conn.executescript("BEGIN IMMEDIATE;" + SCHEMA_SQL.format(categories=categories)
+                               + f"PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+
+    def _write(self, conn, statements):
+        """Run `statements(conn)` in one IMMEDIATE transaction that also bumps the store version."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = statements(conn)
+            conn.execute(
+                "UPDATE memory_store_version SET version = version + 1, modified_at = ? WHERE singleton = 1",
+                (to_utc_text(datetime.now(timezone.utc)),),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def _written_rows(self, conn, ids):
+        if not ids:
+            return []
+        query = SELECT_WRITTEN_SQL.format(placeholders=", ".join("?" * len(ids)))
+        return [self._decode(("id", "title", "details", "categories", "timestamp", "updated_at"), row)
+                for row in conn.execute(query, ids)]
+
+    @staticmethod
+    def _decode(columns, row):
+        """Turn stored text back into the Python values psycopg2 would return."""
+        values = []
+        for column, value in zip(columns, row):
+            if value is not None and column in ("timestamp", "updated_at"):
+                value = datetime.fromisoformat(value)
+            elif value is not None and column in ("details", "categories"):
+                value = json.loads(value)
+            values.append(value)
+        return tuple(values)
+
+    def _set_categories(self, conn, memory_id, categories):
+        conn.execute("DELETE FROM memory_categories WHERE memory_id = ?", (memory_id,))
+        conn.executemany(
+            "INSERT INTO memory_categories (memory_id, position, category) VALUES (?, ?, ?)",
+            [(memory_id, position, category) for position, category in enumerate(categories)],
+        )
+
+    def insert(self, memories, timestamp, on_duplicate=None):
+        """
+        Store validated memories; returns their (id, title, details, categories,
+        timestamp, updated_at, inserted) rows. There is no content-hash
+        deduplication here, so every memory is new and on_duplicate is unused.
+        """
+        now = to_utc_text(datetime.now(timezone.utc))
+
+        def statements(conn):
+            ids = []
+            for memory in memories:
+                cursor = conn.execute(
+                    "INSERT INTO memory (title, details, timestamp, updated_at) VALUES (?, ?, ?, ?)",
+                    (memory["title"], memory["details_json"], to_utc_text(memory.get("timestamp", timestamp)), now),
+                )
+                self._set_categories(conn, cursor.lastrowid, memory["categories"])
+                ids.append(cursor.lastrowid)
+            return ids
+
+        conn = self._connect()
+        rows = self._written_rows(conn, self._write(conn, statements))
+        self._notify([memory["categories"] for memory in memories])
+        return [row + (True,) for row in rows]
+
+    def _recall_query(self, spec):
+        """SQLite counterpart of main.build_recall_query; returns (query, params, sort_keys)."""
+        options = spec["query"]
+        search_term, category, mode = options["search_term"], options["category"], options["mode"]
+        columns = [column.strip() for column in options["columns"].split(",")]
+        select = [f"{COLUMN_EXPRESSIONS[column]} AS {column}" for column in columns]
+        sources = "memory AS m"
+        conditions = []
+        params = []
+        ranked = False
+
+        if search_term and mode == "fulltext":
+            hits = "SELECT rowid AS id, -bm25(memory_fts) AS rank"
+            if options["highlight"]:
+                hits += ", snippet(memory_fts, 1, '<b>', '</b>', '...', 20) AS snippet"
+                select.append("coalesce(hits.snippet, substr(json_extract(m.details, '$.text'), 1, 120)) AS snippet")
+            sources += f" LEFT JOIN ({hits} FROM memory_fts WHERE memory_fts MATCH ?) AS hits ON hits.id = m.id"
+            params.append(fts_query(search_term))
+            select.append("coalesce(hits.rank, 0.0) AS rank")
+            conditions.append("hits.id IS NOT NULL")
+            ranked = True
+        elif search_term:
+            conditions.append("(m.title LIKE ? OR json_extract(m.details, '$.text') LIKE ?)")
+            params.extend([f"%{search_term}%", f"%{search_term}%"])
+
+        if category:
+            conditions.append("m.id IN (SELECT memory_id FROM memory_categories WHERE category = ?)")
+            params.append(category)
+
+        query = f"SELECT {', '.join(select)} FROM {sources}"
+        if conditions:
+            query += " WHERE " + " OR ".join(conditions)
+        sort_keys = ["rank", "timestamp", "id"] if ranked else ["timestamp", "id"]
+        return query, params, sort_keys
+
+    def version(self):
+        """The store's (version, modified_at), one single-row read."""
+        version, modified_at = self._connect().execute(
+            "SELECT version, modified_at FROM memory_store_version").fetchone()
+        return version, datetime.fromisoformat(modified_at) if modified_at else None
+
+    def recall(self, spec, not_modified=None):
+        """
+        Run a recall spec from main.parse_recall_args. Returns (version, result):
+        version is the (version, modified_at) pair read before the rows and result
+        is (columns, rows, total), or None when `not_modified(version)` says the
+        client's copy is current.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            version, modified_at = conn.execute("SELECT version, modified_at FROM memory_store_version").fetchone()
+            version = (version, datetime.fromisoformat(modified_at) if modified_at else None)
+            if not_modified and not_modified(version):
+                return version, None
+
+            inner, params, sort_keys = self._recall_query(spec)
+            query = f"SELECT * FROM ({inner}) AS matches"
+            rows_params = list(params)
+            after = spec["query"]["after"]
+            if after is not None:
+                after = [to_utc_text(value) if key == "timestamp" else value for key, value in zip(sort_keys, after)]
+                query += f" WHERE ({', '.join(sort_keys)}) < ({', '.join('?' * len(sort_keys))})"
+                rows_params += after
+            query += f" ORDER BY {', '.join(key + ' DESC' for key in sort_keys)} LIMIT ?"
+            rows_params.append(spec["query"]["limit"])
+
+            cursor = conn.execute(query, rows_params)
+            columns = [description[0] for description in cursor.description]
+            rows = [self._decode(columns, row) for row in cursor.fetchall()]
+
+            total = None
+            if spec["count_mode"]:
+                total = conn.execute(f"SELECT COUNT(*) FROM ({inner})", params).fetchone()[0]
+            return version, (columns, rows, total)
+        finally:
+            conn.execute("COMMIT")
+
+    def get(self, memory_id):
+        """(columns, row) for one memory; row is None when it does not exist."""
+        columns = ["id", "title", "details", "categories", "timestamp"]
+        select = ", ".join(COLUMN_EXPRESSIONS[column] for column in columns)
+        row = self._connect().execute(f"SELECT {select} FROM memory AS m WHERE m.id = ?", (memory_id,)).fetchone()
+        return columns, self._decode(columns, row) if row else None
+
+    def update(self, changes, match, identifiers):
+        """
+        Apply `changes` (title, details JSON, categories, timestamp) to the memory
+        picked by `match`; returns the updated rows (empty when nothing matched).
+        """
+        identifiers = list(identifiers)
+        if match == "title_timestamp":
+            identifiers[1] = to_utc_text(identifiers[1])
+        touched = []
+
+        def statements(conn):
+            row = conn.execute(MATCHES[match], identifiers).fetchone()
+            if not row:
+                return []
+            memory_id = row[0]
+            touched.append([category for (category,) in conn.execute(
+                "SELECT category FROM memory_categories WHERE memory_id = ?", (memory_id,))])
+            assignments = {"updated_at": to_utc_text(datetime.now(timezone.utc))}
+            if "title" in changes:
+                assignments["title"] = changes["title"]
+            if "details" in changes:
+                assignments["details"] = changes["details"]
+            if "timestamp" in changes:
+                assignments["timestamp"] = to_utc_text(changes["timestamp"])
+            conn.execute(f"UPDATE memory SET {', '.join(name + ' = ?' for name in assignments)} WHERE id = ?",
+                         [*assignments.values(), memory_id])
+            if "categories" in changes:
+                self._set_categories(conn, memory_id, changes["categories"])
+                touched.append(changes["categories"])
+            return [memory_id]
+
+        conn = self._connect()
+        rows = self._written_rows(conn, self._write(conn, statements))
+        if rows:
+            self._notify(touched)
+        return rows
+
+    def delete(self, match, identifier):
+        """Delete the memory picked by `match` ("id" or "title_latest"); returns the deleted ids."""
+        touched = []
+
+        def statements(conn):
+            row = conn.execute(MATCHES[match], (identifier,)).fetchone()
+            if not row:
+                return []
+            touched.append([category for (category,) in conn.execute(
+                "SELECT category FROM memory_categories WHERE memory_id = ?", (row[0],))])
+            conn.execute("DELETE FROM memory WHERE id = ?", (row[0],))
+            return [row[0]]
+
+        deleted = self._write(self._connect(), statements)
+        if deleted:
+            self._notify(touched)
+        return deleted
+
+    def stats(self):
+        conn = self._connect()
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "journal_mode": conn.execute("PRAGMA journal_mode").fetchone()[0],
+            "sqlite_version": sqlite3.sqlite_version,
+        }
+
+    def _notify(self, category_lists):
+        if self.on_write:
+            try:
+                self.on_write(*category_lists)
+            except Exception as e:
+                logging.error(f"❌ Post-write hook failed: {str(e)}")
@@ -0,0 +1,239 @@
+"""
+Conformance tests for the storage backends (STORAGE_BACKEND, see MemoryStore).
+
+The same endpoint cases run through the Flask test client against every
+backend, so the JSON contracts of /remember, /recall-or-search, /edit,
+/delete and /memory/<id> stay identical whichever store serves them.
+SQLite runs in a temporary file; Postgres runs against DATABASE_URL and is
+skipped when it is unset.
+
+    python -m pytest -q tests
+"""
+
+import importlib
+import os
+import random
+import string
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = "conformance"
+HEADERS = {"X-API-KEY": API_KEY}
+
+
+def load_main(monkeypatch, backend, tmp_path):
+    """Import a fresh main.py configured for `backend` (its settings are read at import)."""
+    monkeypatch.syspath_prepend(ROOT)
+    monkeypatch.setenv("API_KEY", API_KEY)
+    monkeypatch.setenv("STORAGE_BACKEND", backend)
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "memory.db"))
+    monkeypatch.setenv("BACKUP_ENABLED", "false")
+    monkeypatch.setenv("WRITE_BUFFER_ENABLED", "false")
+    monkeypatch.setenv("EMBEDDINGS_ENABLED", "false")
+    monkeypatch.setenv("ARCHIVE_ENABLED", "false")
+    monkeypatch.setenv("CACHE_LISTEN", "false")
+    monkeypatch.delenv("READ_REPLICA_URLS", raising=False)
+    for name in ("main", "sqlite_store"):
+        sys.modules.pop(name, None)
+    main = importlib.import_module("main")
+    main.safe_init_db()
+    return main
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def api(request, monkeypatch, tmp_path):
+    """(main module, Flask test client) for one backend; deletes the memories a test created."""
+    if request.param == "postgres" and not os.getenv("DATABASE_URL"):
+        pytest.skip("DATABASE_URL is not set")
+    main = load_main(monkeypatch, request.param, tmp_path)
+    client = main.app.test_client()
+    created = []
+    client.created = created
+    yield main, client
+    for memory_id in created:
+        client.delete(f"/memory/{memory_id}", headers=HEADERS)
+    main.close_db_pool()
+    for name in ("main", "sqlite_store"):
+        sys.modules.pop(name, None)
+
+
+@pytest.fixture
+def token():
+    """A made-up word, so searches only match this test's memories."""
+    return "zq" + "".join(random.choices(string.ascii_lowercase, k=10))
+
+
+def remember(client, title, details, categories, **params):
+    response = client.post("/remember", json={"title": title, "details": details, "categories": categories},
+                           headers=HEADERS, query_string=params)
+    if response.status_code == 200:
+        client.created.append(response.get_json()["id"])
+    return response
+
+
+def remember_batch(client, memories):
+    response = client.post("/remember/batch", json=memories, headers=HEADERS)
+    for result in response.get_json()["results"]:
+        if "id" in result:
+            client.created.append(result["id"])
+    return response
+
+
+def recall(client, **params):
+    return client.get("/recall-or-search", headers=HEADERS, query_string=params)
+
+
+def test_remember_and_get(api, token):
+    _, client = api
+    response = remember(client, f"Trip {token}", "Sailed to the island", ["adventure_and_travel", "miscellaneous"])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert set(body) == {"message", "id", "categories", "duplicate"}
+    assert body["categories"] == ["adventure_and_travel", "miscellaneous"]
+    assert body["duplicate"] is False
+
+    memory = client.get(f"/memory/{body['id']}", headers=HEADERS).get_json()
+    assert set(memory) == {"id", "title", "details", "categories", "timestamp"}
+    assert memory["title"] == f"Trip {token}"
+    assert memory["details"] == "Sailed to the island"
+    assert memory["categories"] == ["adventure_and_travel", "miscellaneous"]
+    assert memory["timestamp"].endswith(("-05:00", "-06:00"))  # Chicago time
+
+
+def test_remember_rejects_invalid(api):
+    _, client = api
+    assert client.post("/remember", json={"title": "x"}, headers=HEADERS).status_code == 400
+    response = remember(client, "x", "y", ["not_a_category"])
+    assert response.status_code == 400
+    assert "Invalid categories" in response.get_json()["error"]
+    assert client.post("/remember", json={"title": "x", "details": "y", "categories": ["miscellaneous"]},
+                       headers={"X-API-KEY": "wrong"}).status_code == 403
+
+
+def test_memory_not_found(api):
+    _, client = api
+    assert client.get("/memory/2000000000", headers=HEADERS).status_code == 404
+    assert client.put("/memory/2000000000", json={"title": "x"}, headers=HEADERS).status_code == 404
+    assert client.delete("/memory/2000000000", headers=HEADERS).status_code == 404
+
+
+def test_substring_recall_with_cursor(api, token):
+    _, client = api
+    response = remember_batch(client, [
+        {"title": f"Note {index} {token}", "details": f"Entry number {index}", "categories": ["miscellaneous"],
+         "timestamp": f"2024-01-0{index}T12:00:00+00:00"}
+        for index in range(1, 4)
+    ])
+    assert response.status_code == 200
+
+    first = recall(client, search=token.upper(), limit=2, count="exact")
+    assert first.status_code == 200
+    page = first.get_json()
+    assert [memory["title"] for memory in page["memories"]] == [f"Note 3 {token}", f"Note 2 {token}"]
+    assert page["total_found"] == 3
+    assert page["next_cursor"]
+
+    second = recall(client, search=token, limit=2, cursor=page["next_cursor"]).get_json()
+    assert [memory["title"] for memory in second["memories"]] == [f"Note 1 {token}"]
+    assert second["next_cursor"] is None
+
+    fields = recall(client, search=token, limit=1, fields="title").get_json()
+    assert set(fields["memories"][0]) == {"title"}
+
+
+def test_category_recall(api, token):
+    _, client = api
+    remember(client, f"Family {token}", "Dinner with family", ["friends_and_family"])
+    remember(client, f"Work {token}", "Shipped the release", ["work_and_military"])
+    page = recall(client, search=token, category="friends_and_family", limit=50).get_json()
+    titles = [memory["title"] for memory in page["memories"]]
+    # Search term and category are OR-ed, so both match the term
+    assert set(titles) >= {f"Family {token}", f"Work {token}"}
+
+
+def test_fulltext_recall(api, token):
+    _, client = api
+    remember(client, f"Harbor {token}", f"The {token} harbor was calm", ["adventure_and_travel"])
+    remember(client, "Unrelated", "Nothing to see here", ["miscellaneous"])
+    page = recall(client, search=token, mode="fulltext").get_json()
+    assert [memory["title"] for memory in page["memories"]] == [f"Harbor {token}"]
+    assert "rank" in page["memories"][0]
+    assert recall(client, search=f"nomatch{token}", mode="fulltext").status_code == 404
+
+
+def test_recall_etag(api, token):
+    _, client = api
+    remember(client, f"Cached {token}", "First version", ["miscellaneous"])
+    first = recall(client, search=token)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    unchanged = client.get("/recall-or-search", query_string={"search": token},
+                           headers={**HEADERS, "If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.headers["ETag"] == etag
+
+    remember(client, f"Cached again {token}", "Second memory", ["miscellaneous"])
+    changed = client.get("/recall-or-search", query_string={"search": token},
+                         headers={**HEADERS, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.get_json()["memories"]) == 2
+
+
+def test_edit(api, token):
+    _, client = api
+    memory_id = remember(client, f"Draft {token}", "Before", ["miscellaneous"]).get_json()["id"]
+
+    response = client.put("/edit", query_string={"original_title": f"Draft {token}"},
+                          json={"details": "After", "categories": ["personal_growth"]}, headers=HEADERS)
+    assert response.status_code == 200
+    assert response.get_json() == {"message": "Memory updated successfully", "id": memory_id}
+    memory = client.get(f"/memory/{memory_id}", headers=HEADERS).get_json()
+    assert (memory["details"], memory["categories"]) == ("After", ["personal_growth"])
+
+    response = client.put(f"/memory/{memory_id}", json={"title": f"Final {token}"}, headers=HEADERS)
+    assert response.get_json() == {"message": "Memory updated successfully", "id": memory_id}
+    assert client.get(f"/memory/{memory_id}", headers=HEADERS).get_json()["title"] == f"Final {token}"
+
+    assert client.put("/edit", query_string={"original_title": f"Draft {token}"}, json={"details": "x"},
+                      headers=HEADERS).status_code == 404
+    assert client.put(f"/memory/{memory_id}", json={"categories": ["bogus"]}, headers=HEADERS).status_code == 400
+
+
+def test_delete(api, token):
+    _, client = api
+    older = remember(client, f"Twin {token}", "Older", ["miscellaneous"]).get_json()["id"]
+    newer = remember(client, f"Twin {token}", "Newer", ["miscellaneous"]).get_json()["id"]
+
+    # /delete removes the most recent memory with the title
+    response = client.delete("/delete", query_string={"title": f"Twin {token}"}, headers=HEADERS)
+    assert response.get_json() == {"message": f"Memory deleted: 'Twin {token}'", "id": newer}
+    assert client.get(f"/memory/{newer}", headers=HEADERS).status_code == 404
+
+    response = client.delete(f"/memory/{older}", headers=HEADERS)
+    assert response.get_json() == {"message": "Memory deleted", "id": older}
+    assert client.delete("/delete", query_string={"title": f"Twin {token}"}, headers=HEADERS).status_code == 404
+    assert recall(client, search=token).status_code == 404
+
+
+def test_cache_sees_other_workers_writes(api, token):
+    main, client = api
+    if main.CACHE_LISTEN:
+        pytest.skip("cache invalidation reaches other workers through LISTEN")
+    remember(client, f"Shared {token}", "Seen by every worker", ["miscellaneous"])
+    assert len(recall(client, search=token).get_json()["memories"]) == 1
+    assert recall(client, search=token).headers.get("X-Cache") == "HIT"
+
+    # Another worker process: same database, but its writes don't touch this cache
+    store = main.get_memory_store()
+    other = type(store)(store.path, store.categories) if main.STORAGE_BACKEND == "sqlite" else store
+    memory, _ = main.validate_new_memory({"title": f"Elsewhere {token}", "details": "x", "categories": ["miscellaneous"]})
+    rows = other.insert([memory], main.datetime.now(main.DISPLAY_TZ))
+    client.created.append(rows[0][0])
+
+    page = recall(client, search=token)
+    assert page.headers.get("X-Cache") != "HIT"
+    assert len(page.get_json()["memories"]) == 2